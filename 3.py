@@ -1,167 +1,125 @@
-import requests
-import json
 import os
 import zipfile
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-from osgeo import gdal
+from osgeo import gdal, gdal_array
 import glob
 
-class CopernicusDownloader:
+from copernicus_client import CopernicusClient
+from instrumentation import RECORDER, measure
+from raster_cache import EXTENSION as RASTER_CACHE_EXTENSION, RasterCacheWriter, cache_path_for
+from safe_archive import open_sources
+from sar_preprocess import calibration_for, preprocess_sar
+
+class CopernicusDownloader(CopernicusClient):
     """
-    Download SAFE files from Copernicus Data Space Ecosystem
+    Download SAFE files from Copernicus Data Space Ecosystem, then extract them and
+    convert their bands to raster caches
     """
     
-    def __init__(self, client_id, client_secret):
-        self.client_id = client_id
-        self.client_secret = client_secret
-        self.access_token = None
-        self.base_url = "https://catalogue.dataspace.copernicus.eu/odata/v1"
-        self.download_url = "https://zipper.dataspace.copernicus.eu/odata/v1"
-        
-    def get_access_token(self):
-        """Get OAuth2 access token"""
-        token_url = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
-        
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret
-        }
-        
-        try:
-            response = requests.post(token_url, data=data)
-            response.raise_for_status()
-            self.access_token = response.json()["access_token"]
-            print("✓ Authentication successful")
-            return True
-        except Exception as e:
-            print(f"✗ Authentication failed: {e}")
-            return False
+    final_state = "converted"
     
-    def search_product(self, product_name):
-        """Search for a product by name"""
-        search_url = f"{self.base_url}/Products"
-        
-        # Search by product name
-        params = {
-            "$filter": f"Name eq '{product_name}'"
-        }
-        
-        try:
-            response = requests.get(search_url, params=params)
-            response.raise_for_status()
-            results = response.json()
-            
-            if results['value']:
-                product = results['value'][0]
-                print(f"✓ Found product: {product['Name']}")
-                return product
-            else:
-                print(f"✗ Product not found: {product_name}")
-                return None
-        except Exception as e:
-            print(f"✗ Search failed: {e}")
-            return None
+    def __init__(self, client_id, client_secret, keep_sources=False, keep_zip=False, **kwargs):
+        super().__init__(client_id, client_secret, **kwargs)
+        self.keep_sources = keep_sources  # also extract the rasters that could be read from the zip
+        self.keep_zip = keep_zip
     
-    def extract_zip(self, zip_path, output_dir):
-        """Extract zip file to a shortened directory name"""
+    def extract_zip(self, zip_path, output_dir, product_name):
+        """
+        Make the bands the pipeline uses available in the product's store directory.
+        
+        Only B02/B03/B04 (EO) or measurement TIFFs and calibration XMLs (SAR) are
+        touched; stored rasters are read in place from the zip (see safe_archive).
+        Returns (extract_dir, [(source, local_path), ...]) or (None, []).
+        """
         try:
-            # Create shortened directory name (first 50 chars + id)
-            base_name = Path(zip_path).stem
-            # Use first part before first underscore + timestamp hash
-            short_name = base_name.split('_')[0][:20] + '_' + str(hash(base_name))[-8:]
-            extract_dir = os.path.join(output_dir, short_name)
+            # Short directory name derived from the product name, identical on every run
+            extract_dir = self.store(output_dir).product_dir(product_name)
             
-            print(f"⟳ Extracting to: {short_name}/")
+            print(f"⟳ Extracting to: {os.path.basename(extract_dir)}/")
             
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
+                sources = open_sources(zip_ref, zip_path, product_name, extract_dir, self.keep_sources)
             
-            print(f"✓ Extraction complete")
-            
-            # Remove zip file after extraction
-            os.remove(zip_path)
-            print(f"✓ Removed zip file")
-            
-            return extract_dir
+            in_zip = sum(source.startswith("/vsizip/") for source, _ in sources)
+            print(f"✓ {len(sources)} rasters selected ({in_zip} read in place, {len(sources) - in_zip} extracted)")
+            return extract_dir, sources
             
         except Exception as e:
             print(f"✗ Extraction failed: {e}")
-            return None
+            return None, []
     
-    def tiff_to_numpy(self, tiff_path):
-        """Convert TIFF to numpy array and save as .npy"""
+    def raster_to_cache(self, raster_path, chunk=512, strip_rows=512, cache_path=None):
+        """
+        Convert a TIFF/JP2 band (a file or a /vsizip/ member) to a chunked, compressed
+        raster cache (.rc), written next to it unless cache_path is given
+        """
         try:
-            # Open the TIFF file
-            dataset = gdal.Open(tiff_path)
+            dataset = gdal.Open(raster_path)
             if dataset is None:
-                print(f"  ✗ Could not open: {os.path.basename(tiff_path)}")
+                print(f"  ✗ Could not open: {os.path.basename(raster_path)}")
                 return False
             
-            # Read all bands into numpy array
-            bands = []
-            for i in range(1, dataset.RasterCount + 1):
-                band = dataset.GetRasterBand(i)
-                bands.append(band.ReadAsArray())
-            
-            # Stack bands if multiple, otherwise use single band
-            if len(bands) > 1:
-                array = np.stack(bands, axis=0)
-            else:
-                array = bands[0]
-            
-            # Save as .npy file
-            npy_path = tiff_path.rsplit('.', 1)[0] + '.npy'
-            np.save(npy_path, array)
+            width, height, count = dataset.RasterXSize, dataset.RasterYSize, dataset.RasterCount
+            dtype = gdal_array.GDALTypeCodeToNumericTypeCode(dataset.GetRasterBand(1).DataType)
+            gt = dataset.GetGeoTransform()
+            metadata = {
+                "source": os.path.abspath(raster_path),
+                "crs": dataset.GetProjection() or None,
+                "transform": [gt[1], gt[2], gt[0], gt[4], gt[5], gt[3]],  # affine (a, b, c, d, e, f)
+            }
+            
+            # Decode full-width strips and stream them into the cache
+            cache_path = cache_path or cache_path_for(raster_path)
+            with measure("band_decode", scene=os.path.basename(raster_path), items=width * height * count), \
+                    RasterCacheWriter(cache_path, width, height, dtype, count, chunk, metadata=metadata) as writer:
+                for top in range(0, height, strip_rows):
+                    rows = min(strip_rows, height - top)
+                    strip = np.stack([dataset.GetRasterBand(i).ReadAsArray(0, top, width, rows)
+                                      for i in range(1, count + 1)])
+                    writer.write_rows(strip)
             
             # Get file sizes
-            tiff_size = os.path.getsize(tiff_path) / (1024**2)  # MB
-            npy_size = os.path.getsize(npy_path) / (1024**2)  # MB
+            source_size = gdal.VSIStatL(raster_path).size / (1024**2)  # MB
+            cache_size = os.path.getsize(cache_path) / (1024**2)  # MB
             
-            print(f"  ✓ {os.path.basename(tiff_path)} -> .npy ({tiff_size:.1f}MB -> {npy_size:.1f}MB)")
+            print(f"  ✓ {os.path.basename(raster_path)} -> {RASTER_CACHE_EXTENSION} "
+                  f"({source_size:.1f}MB -> {cache_size:.1f}MB)")
             
             dataset = None  # Close dataset
             return True
             
         except Exception as e:
-            print(f"  ✗ Conversion failed for {os.path.basename(tiff_path)}: {e}")
+            print(f"  ✗ Conversion failed for {os.path.basename(raster_path)}: {e}")
             return False
     
-    def jp2_to_numpy(self, jp2_path):
-        """Convert JP2 to numpy array and save as .npy"""
+    def sar_to_detector_input(self, tiff_path, local_path=None):
+        """
+        Calibrated, speckle-filtered 8-bit dB raster cache (<name>_db8.rc) plus CFAR candidates.
+        local_path names the output and locates the calibration XML when tiff_path is inside a zip.
+        """
+        local_path = local_path or tiff_path
         try:
-            # Open the JP2 file
-            dataset = gdal.Open(jp2_path)
-            if dataset is None:
-                print(f"  ✗ Could not open: {os.path.basename(jp2_path)}")
-                return False
-            
-            # Read the band into numpy array
-            band = dataset.GetRasterBand(1)
-            array = band.ReadAsArray()
-            
-            # Save as .npy file
-            npy_path = jp2_path.rsplit('.', 1)[0] + '.npy'
-            np.save(npy_path, array)
-            
-            # Get file sizes
-            jp2_size = os.path.getsize(jp2_path) / (1024**2)  # MB
-            npy_size = os.path.getsize(npy_path) / (1024**2)  # MB
-            
-            print(f"  ✓ {os.path.basename(jp2_path)} -> .npy ({jp2_size:.1f}MB -> {npy_size:.1f}MB)")
-            
-            dataset = None  # Close dataset
-            return True
-            
+            with measure("sar_preprocess", scene=os.path.basename(local_path)) as m:
+                result = preprocess_sar(tiff_path, os.path.splitext(local_path)[0] + "_db8.rc",
+                                        calibration=calibration_for(local_path))
+                m.set(candidates=len(result['candidates']))
+            print(f"  ✓ {os.path.basename(tiff_path)} -> {os.path.basename(result['output'])} "
+                  f"({len(result['candidates'])} CFAR candidates)")
+            return result
         except Exception as e:
-            print(f"  ✗ Conversion failed for {os.path.basename(jp2_path)}: {e}")
-            return False
+            print(f"  ✗ SAR preprocessing failed for {os.path.basename(tiff_path)}: {e}")
+            return None
     
-    def convert_images_to_numpy(self, extract_dir, product_name):
-        """Convert SAR TIFF and EO JP2 images to numpy arrays"""
-        print(f"⟳ Converting images to numpy arrays...")
+    def convert_images_to_cache(self, extract_dir, product_name, sources=None):
+        """
+        Convert SAR TIFF and EO JP2 images to raster cache files.
+        
+        sources: (source, local_path) pairs from extract_zip; if omitted, the rasters
+        are looked up in an already extracted SAFE under extract_dir.
+        """
+        print(f"⟳ Converting images to raster cache...")
         
         # Determine if this is SAR or EO data
         is_sar = product_name.startswith('S1')
@@ -169,7 +127,15 @@ class CopernicusDownloader:
         
         converted_count = 0
         
-        if is_sar:
+        if sources is not None:
+            print(f"  Found {len(sources)} {'TIFF' if is_sar else 'JP2'} files")
+            for source, local_path in sources:
+                if self.raster_to_cache(source, cache_path=cache_path_for(local_path)):
+                    converted_count += 1
+                if is_sar:
+                    self.sar_to_detector_input(source, local_path)
+        
+        elif is_sar:
             # SAR data: Find TIFF files in measurement folder
             measurement_dir = os.path.join(extract_dir, '**', 'measurement')
             tiff_files = glob.glob(os.path.join(measurement_dir, '*.tiff'), recursive=True)
@@ -181,8 +147,9 @@ class CopernicusDownloader:
             print(f"  Found {len(tiff_files)} TIFF files")
             
             for tiff_file in tiff_files:
-                if self.tiff_to_numpy(tiff_file):
+                if self.raster_to_cache(tiff_file):
                     converted_count += 1
+                self.sar_to_detector_input(tiff_file)
         
         elif is_eo:
             # EO data: Find JP2 files in GRANULE/*/IMG_DATA
@@ -196,116 +163,42 @@ class CopernicusDownloader:
             print(f"  Found {len(jp2_files)} JP2 files")
             
             for jp2_file in jp2_files:
-                if self.jp2_to_numpy(jp2_file):
+                if self.raster_to_cache(jp2_file):
                     converted_count += 1
         
-        print(f"✓ Converted {converted_count} images to numpy format")
+        print(f"✓ Converted {converted_count} images to raster cache format")
         return converted_count
     
-    def download_product(self, product_id, product_name, output_dir="downloads"):
-        """Download a product using its ID"""
-        if not self.access_token:
-            print("✗ No access token. Please authenticate first.")
-            return False
-        
-        # Create output directory
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        
-        # Download URL
-        download_endpoint = f"{self.download_url}/Products({product_id})/$value"
-        
-        headers = {
-            "Authorization": f"Bearer {self.access_token}"
-        }
-        
-        output_path = os.path.join(output_dir, f"{product_name}.zip")
-        
-        print(f"⟳ Downloading {product_name}...")
-        
-        try:
-            response = requests.get(download_endpoint, headers=headers, stream=True)
-            response.raise_for_status()
-            
-            # Get file size
-            total_size = int(response.headers.get('content-length', 0))
-            
-            # Download with progress
-            downloaded = 0
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            percent = (downloaded / total_size) * 100
-                            print(f"\r  Progress: {percent:.1f}%", end='')
-            
-            print(f"\n✓ Downloaded: {output_path}")
-            print(f"  Size: {os.path.getsize(output_path) / (1024**3):.2f} GB")
-            
-            # Extract the zip file
-            extract_dir = self.extract_zip(output_path, output_dir)
-            
-            if extract_dir:
-                # Convert images to numpy arrays
-                self.convert_images_to_numpy(extract_dir, product_name)
-            
+    def postprocess(self, zip_path, product_name, output_dir):
+        """
+        Convert the needed bands of the downloaded zip to chunked raster caches, then drop
+        the zip. Stages already recorded in the product store are skipped.
+        """
+        store = self.store(output_dir)
+        if store.reached(product_name, "converted"):
             return True
-            
-        except Exception as e:
-            print(f"\n✗ Download failed: {e}")
-            if os.path.exists(output_path):
-                os.remove(output_path)
-            return False
-    
-    def process_image_list(self, image_list, output_dir="downloads"):
-        """Process and download multiple images from list"""
-        
-        # Authenticate first
-        if not self.get_access_token():
-            return
         
-        results = []
-        
-        for idx, image_data in enumerate(image_list, 1):
-            image_name = image_data['image_name']
-            print(f"\n[{idx}/{len(image_list)}] Processing: {image_name}")
-            
-            # Search for product
-            product = self.search_product(image_name)
-            
-            if product:
-                # Download product
-                success = self.download_product(
-                    product['Id'], 
-                    image_name,
-                    output_dir
-                )
-                results.append({
-                    'id': image_data['id'],
-                    'image_name': image_name,
-                    'status': 'success' if success else 'failed'
-                })
-            else:
-                results.append({
-                    'id': image_data['id'],
-                    'image_name': image_name,
-                    'status': 'not_found'
-                })
+        if store.reached(product_name, "extracted"):
+            extract_dir, sources = store.product_dir(product_name), store.get(product_name)["sources"]
+        else:
+            extract_dir, sources = self.extract_zip(zip_path, output_dir, product_name)
+            if not extract_dir:
+                return False
+            store.mark(product_name, "extracted", sources=sources)
         
-        # Save results log
-        log_file = os.path.join(output_dir, "download_log.json")
-        with open(log_file, 'w') as f:
-            json.dump(results, f, indent=2)
+        outputs = [cache_path_for(local_path) for _, local_path in sources]
+        if product_name.startswith('S1'):
+            outputs += [os.path.splitext(local_path)[0] + "_db8.rc" for _, local_path in sources]
+        self.convert_images_to_cache(extract_dir, product_name, sources)
+        if not sources or not all(os.path.exists(path) for path in outputs):
+            print(f"✗ Conversion incomplete for {product_name}; rerun to retry")
+            return False
+        store.mark(product_name, "converted", outputs=outputs)
         
-        print(f"\n{'='*60}")
-        print("Download Summary:")
-        print(f"  Total: {len(results)}")
-        print(f"  Success: {sum(1 for r in results if r['status'] == 'success')}")
-        print(f"  Failed: {sum(1 for r in results if r['status'] == 'failed')}")
-        print(f"  Not Found: {sum(1 for r in results if r['status'] == 'not_found')}")
-        print(f"  Log saved to: {log_file}")
-        print(f"{'='*60}")
+        if not self.keep_zip and os.path.exists(zip_path):
+            os.remove(zip_path)
+            print(f"✓ Removed zip file")
+        return True
 
 
 # Main execution
@@ -349,7 +242,12 @@ if __name__ == "__main__":
     print("="*60)
     
     # Option 1: Download all images
-    downloader.process_image_list(IMAGE_LIST, output_dir="copernicus_data")
+    downloader.process_image_list(IMAGE_LIST, output_dir="copernicus_data", max_workers=4)
+    
+    # Decode / SAR preprocessing timings
+    print(RECORDER.summary())
+    RECORDER.write_jsonl(os.path.join("copernicus_data", "metrics.jsonl"))
+    RECORDER.write_prometheus(os.path.join("copernicus_data", "metrics.prom"))
     
     # Option 2: Download single image (uncomment to use)
     # downloader.get_access_token()
@@ -1,42 +1,35 @@
 import os
-import csv
+
+from scene_catalogue import SceneCatalogue, find_band_dir
 
 def get_folder_path(folder_path, data_type):
     """
     Returns the specific IMG_DATA or measurement folder path inside the given folder_path.
     """
-    for root, dirs, files in os.walk(folder_path):
-        if data_type == "EO" and "IMG_DATA" in dirs:
-            return os.path.join(root, "IMG_DATA")
-        elif data_type == "SAR" and "measurement" in dirs:
-            return os.path.join(root, "measurement")
-    return None
-
-def get_eo_sar_label_for_folders(data_folder, csv_file):
-    # Read CSV and create a lookup dictionary
-    lookup = {}
-    with open(csv_file, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            lookup[row['image_name']] = row['EO/SAR']
+    return find_band_dir(folder_path, data_type)
 
-    # List all subfolders in the data folder
-    folders = [d for d in os.listdir(data_folder) if os.path.isdir(os.path.join(data_folder, d))]
+def get_eo_sar_label_for_folders(data_folder, csv_file, catalogue=None):
+    # EO/SAR labels and band folders come from the scene catalogue; the CSV is only
+    # re-parsed and folders only re-resolved when they changed
+    catalogue = catalogue or SceneCatalogue()
+    catalogue.load_csv(csv_file)
+    catalogue.scan(data_folder)
+    data_folder = os.path.abspath(data_folder)
+    scenes = [scene for scene in catalogue.scenes(in_csv=False, on_disk=True)
+              if os.path.dirname(scene['folder']) == data_folder]
 
     result = {}
     eo_paths = set()
     sar_paths = set()
-    for folder in folders:
-        eo_sar = lookup.get(folder, None)
-        folder_full_path = os.path.join(data_folder, folder)
+    for scene in sorted(scenes, key=lambda scene: scene['image_name']):
+        folder = scene['image_name']
+        eo_sar = scene['kind'] if scene['row'] else None
         if eo_sar == "EO":
-            img_data_path = get_folder_path(folder_full_path, "EO")
-            eo_paths.add(img_data_path)
-            result[folder] = {'EO/SAR': eo_sar, 'folder_path': img_data_path}
+            eo_paths.add(scene['band_dir'])
+            result[folder] = {'EO/SAR': eo_sar, 'folder_path': scene['band_dir']}
         elif eo_sar == "SAR":
-            measurement_path = get_folder_path(folder_full_path, "SAR")
-            sar_paths.add(measurement_path)
-            result[folder] = {'EO/SAR': eo_sar, 'folder_path': measurement_path}
+            sar_paths.add(scene['band_dir'])
+            result[folder] = {'EO/SAR': eo_sar, 'folder_path': scene['band_dir']}
         else:
             result[folder] = {'EO/SAR': eo_sar, 'folder_path': None}
         print(f"Folder: {folder} => EO/SAR: {eo_sar}, Path: {result[folder]['folder_path']}")
@@ -57,8 +50,9 @@ def get_eo_sar_label_for_folders(data_folder, csv_file):
         print("No SAR (measurement) path found.")
     return result
 
-# Example usage:
-get_eo_sar_label_for_folders(
-    "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/copernicus_data",
-    "/PS-09---AI-tools-for-Maritime-Domain-Awareness-/converted_output.csv"
-)
\ No newline at end of file
+if __name__ == "__main__":
+    # Example usage:
+    get_eo_sar_label_for_folders(
+        "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/copernicus_data",
+        "/PS-09---AI-tools-for-Maritime-Domain-Awareness-/converted_output.csv"
+    )
\ No newline at end of file
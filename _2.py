@@ -1,162 +1,10 @@
-import requests
-import json
-import os
-from datetime import datetime
-from pathlib import Path
+from copernicus_client import CopernicusClient
 
-class CopernicusDownloader:
+
+class CopernicusDownloader(CopernicusClient):
     """
-    Download SAFE files from Copernicus Data Space Ecosystem
+    Download SAFE files from Copernicus Data Space Ecosystem (zip only, no extraction)
     """
-    
-    def __init__(self, client_id, client_secret):
-        self.client_id = client_id
-        self.client_secret = client_secret
-        self.access_token = None
-        self.base_url = "https://catalogue.dataspace.copernicus.eu/odata/v1"
-        self.download_url = "https://zipper.dataspace.copernicus.eu/odata/v1"
-        
-    def get_access_token(self):
-        """Get OAuth2 access token"""
-        token_url = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
-        
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret
-        }
-        
-        try:
-            response = requests.post(token_url, data=data)
-            response.raise_for_status()
-            self.access_token = response.json()["access_token"]
-            print("✓ Authentication successful")
-            return True
-        except Exception as e:
-            print(f"✗ Authentication failed: {e}")
-            return False
-    
-    def search_product(self, product_name):
-        """Search for a product by name"""
-        search_url = f"{self.base_url}/Products"
-        
-        # Search by product name
-        params = {
-            "$filter": f"Name eq '{product_name}'"
-        }
-        
-        try:
-            response = requests.get(search_url, params=params)
-            response.raise_for_status()
-            results = response.json()
-            
-            if results['value']:
-                product = results['value'][0]
-                print(f"✓ Found product: {product['Name']}")
-                return product
-            else:
-                print(f"✗ Product not found: {product_name}")
-                return None
-        except Exception as e:
-            print(f"✗ Search failed: {e}")
-            return None
-    
-    def download_product(self, product_id, product_name, output_dir="downloads"):
-        """Download a product using its ID"""
-        if not self.access_token:
-            print("✗ No access token. Please authenticate first.")
-            return False
-        
-        # Create output directory
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        
-        # Download URL
-        download_endpoint = f"{self.download_url}/Products({product_id})/$value"
-        
-        headers = {
-            "Authorization": f"Bearer {self.access_token}"
-        }
-        
-        output_path = os.path.join(output_dir, f"{product_name}.zip")
-        
-        print(f"⟳ Downloading {product_name}...")
-        
-        try:
-            response = requests.get(download_endpoint, headers=headers, stream=True)
-            response.raise_for_status()
-            
-            # Get file size
-            total_size = int(response.headers.get('content-length', 0))
-            
-            # Download with progress
-            downloaded = 0
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            percent = (downloaded / total_size) * 100
-                            print(f"\r  Progress: {percent:.1f}%", end='')
-            
-            print(f"\n✓ Downloaded: {output_path}")
-            print(f"  Size: {os.path.getsize(output_path) / (1024**3):.2f} GB")
-            return True
-            
-        except Exception as e:
-            print(f"\n✗ Download failed: {e}")
-            if os.path.exists(output_path):
-                os.remove(output_path)
-            return False
-    
-    def process_image_list(self, image_list, output_dir="downloads"):
-        """Process and download multiple images from list"""
-        
-        # Authenticate first
-        if not self.get_access_token():
-            return
-        
-        results = []
-        
-        for idx, image_data in enumerate(image_list, 1):
-            image_name = image_data['image_name']
-            print(f"\n[{idx}/{len(image_list)}] Processing: {image_name}")
-            
-            # Search for product
-            product = self.search_product(image_name)
-            
-            if product:
-                # Download product
-                success = self.download_product(
-                    product['Id'], 
-                    image_name,
-                    output_dir
-                )
-                results.append({
-                    'id': image_data['id'],
-                    'image_name': image_name,
-                    'status': 'success' if success else 'failed'
-                })
-            else:
-                results.append({
-                    'id': image_data['id'],
-                    'image_name': image_name,
-                    'status': 'not_found'
-                })
-        
-        # Save results log
-        log_file = os.path.join(output_dir, "download_log.json")
-        with open(log_file, 'w') as f:
-            json.dump(results, f, indent=2)
-        
-        print(f"\n{'='*60}")
-        print("Download Summary:")
-        print(f"  Total: {len(results)}")
-        print(f"  Success: {sum(1 for r in results if r['status'] == 'success')}")
-        print(f"  Failed: {sum(1 for r in results if r['status'] == 'failed')}")
-        print(f"  Not Found: {sum(1 for r in results if r['status'] == 'not_found')}")
-        print(f"  Log saved to: {log_file}")
-        print(f"{'='*60}")
 
 
 # Main execution
@@ -200,7 +48,7 @@ if __name__ == "__main__":
     print("="*60)
     
     # Option 1: Download all images
-    downloader.process_image_list(IMAGE_LIST, output_dir="copernicus_data")
+    downloader.process_image_list(IMAGE_LIST, output_dir="copernicus_data", max_workers=4)
     
     # Option 2: Download single image (uncomment to use)
     # downloader.get_access_token()
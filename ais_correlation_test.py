@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 import numpy as np
 from sklearn.metrics.pairwise import haversine_distances
 
+from instrumentation import measure
+
 def correlate_detections_to_ais(detections, ais, time_threshold_minutes=5, dist_threshold_km=1.0):
     """
     Correlates ship detections to AIS data.
@@ -80,6 +82,31 @@ def correlate_detections_to_ais(detections, ais, time_threshold_minutes=5, dist_
     
     return pd.DataFrame(results)
 
+def correlate_scenes_to_ais(detections, ais, time_threshold_minutes=5, dist_threshold_km=1.0):
+    """
+    correlate_detections_to_ais run scene by scene (grouped by 'image_name'), with each
+    scene's correlation timed. Rows come back in detection order, numbered as before.
+    """
+    scenes = {}
+    for position, det in enumerate(detections):
+        scenes.setdefault(det['image_name'], []).append(position)
+    if len(scenes) < 2:
+        with measure("ais_correlation", scene=next(iter(scenes), None), items=len(detections)):
+            return correlate_detections_to_ais(detections, ais, time_threshold_minutes, dist_threshold_km)
+
+    ais = ais.copy()
+    ais['timestamp'] = pd.to_datetime(ais['timestamp'])  # parsed once, not once per scene
+    frames = []
+    for image_name, positions in scenes.items():
+        with measure("ais_correlation", scene=image_name, items=len(positions)):
+            frame = correlate_detections_to_ais([detections[p] for p in positions], ais,
+                                                time_threshold_minutes, dist_threshold_km)
+        frame.index = positions
+        frames.append(frame)
+    results = pd.concat(frames).sort_index().reset_index(drop=True)
+    results['sl_no'] = range(1, len(results) + 1)
+    return results
+
 if __name__ == "__main__":
     # Sample detections (3 cases: match, match with multiple candidates, no-match)
     sample_detections = [
@@ -112,7 +139,7 @@ if __name__ == "__main__":
     sample_ais = pd.DataFrame(sample_ais_data)
 
     # Run the test
-    result_df = correlate_detections_to_ais(sample_detections, sample_ais)
+    result_df = correlate_scenes_to_ais(sample_detections, sample_ais)
 
     # Display results
     print("Test Results:")
@@ -0,0 +1,268 @@
+"""
+Offline detector throughput benchmark.
+
+Generates seeded synthetic scenes (bright ship-like blobs on sea texture, placed on
+a UTM grid), runs the same sliding-window -> NMS -> georeferencing path as
+final_json.py and the pipeline (georeference.SceneGeoreferencer) and reports
+tiles/sec, ms per stage and peak memory. Stages are timed in an untraced pass;
+peak memory comes from a second pass under tracemalloc, whose overhead would
+otherwise inflate the timings. Runs on a CPU-only box with no downloads: the stub
+model is pure OpenCV and the "tiny" model is a randomly initialised YOLOv8n built
+from its yaml.
+
+Usage:
+    python benchmark_detection.py --sizes 1280 2560 5120 --models stub tiny --output bench.jsonl
+    python benchmark_detection.py --models stub --adaptive   # multi-resolution tile plan
+    python benchmark_detection.py --models tiny --no-memory  # timings only, skip the traced pass
+"""
+import argparse
+import json
+import math
+import platform
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+import pyproj
+
+import final_json
+from detector_backends import DetectorBackend, box_iou, load_backend
+from georeference import SceneGeoreferencer
+
+# Synthetic scenes sit on UTM zone 20N at Sentinel-2's 10 m resolution
+SYNTHETIC_CRS_WKT = pyproj.CRS.from_epsg(32620).to_wkt()
+SYNTHETIC_PIXEL_SIZE = 10.0
+
+
+def synthetic_transform(width, height, pixel_size=SYNTHETIC_PIXEL_SIZE, center=(500000.0, 5000000.0)):
+    """North-up affine (a, b, c, d, e, f) placing a synthetic scene's centre at `center` (easting, northing)"""
+    return (pixel_size, 0.0, center[0] - width * pixel_size / 2,
+            0.0, -pixel_size, center[1] + height * pixel_size / 2)
+
+
+def make_synthetic_scene(size, n_ships=None, seed=0):
+    """
+    Sea texture with bright elongated ship blobs.
+
+    Returns:
+        (image, gt_boxes): BGR uint8 image of size x size and (N, 4) xyxy ground-truth boxes.
+    """
+    rng = np.random.default_rng(seed)
+    if n_ships is None:
+        n_ships = max(4, size * size // 400_000)
+
+    # Low-frequency swell plus per-pixel noise, in a dark blue-green range
+    coarse = rng.normal(0, 1, (size // 32 + 1, size // 32 + 1)).astype(np.float32)
+    swell = cv2.resize(coarse, (size, size), interpolation=cv2.INTER_CUBIC)
+    noise = rng.normal(0, 1, (size, size)).astype(np.float32)
+    sea = 40 + 6 * swell + 3 * noise
+    image = np.empty((size, size, 3), dtype=np.uint8)
+    image[..., 0] = np.clip(sea + 25, 0, 255)  # B
+    image[..., 1] = np.clip(sea + 10, 0, 255)  # G
+    image[..., 2] = np.clip(sea, 0, 255)       # R
+
+    gt_boxes = []
+    margin = 40
+    for _ in range(n_ships):
+        cx, cy = rng.integers(margin, size - margin, size=2)
+        length = int(rng.integers(12, 40))
+        width = max(3, int(length * rng.uniform(0.15, 0.3)))
+        angle = float(rng.uniform(0, 180))
+        brightness = int(rng.integers(170, 250))
+        cv2.ellipse(image, (int(cx), int(cy)), (length // 2, width // 2), angle, 0, 360,
+                    (brightness, brightness, brightness), -1)
+
+        # axis-aligned bounds of the rotated ellipse
+        theta = math.radians(angle)
+        a, b = length / 2, width / 2
+        half_w = math.sqrt((a * math.cos(theta)) ** 2 + (b * math.sin(theta)) ** 2)
+        half_h = math.sqrt((a * math.sin(theta)) ** 2 + (b * math.cos(theta)) ** 2)
+        gt_boxes.append([cx - half_w, cy - half_h, cx + half_w, cy + half_h])
+    return image, np.array(gt_boxes, dtype=np.float32).reshape(-1, 4)
+
+
+class StubBackend(DetectorBackend):
+    """Deterministic bright-blob detector with the DetectorBackend interface"""
+
+    kind = "stub"
+
+    def __init__(self, threshold=140, min_area=12):
+        super().__init__()
+        self.names = {0: "boat"}
+        self.threshold = threshold
+        self.min_area = min_area
+
+    def predict(self, tile, conf_threshold=0.25):
+        gray = cv2.cvtColor(tile, cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        stats = stats[1:count]
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.min_area]
+
+        x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+        w, h = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+        boxes = np.stack([x, y, x + w, y + h], axis=1).astype(np.float32).reshape(-1, 4)
+        # larger blobs score higher; deterministic for a given tile
+        scores = np.clip(0.5 + stats[:, cv2.CC_STAT_AREA] / 400.0, 0, 0.99).astype(np.float32)
+        keep = scores >= conf_threshold
+        return boxes[keep], scores[keep], np.zeros(int(keep.sum()), dtype=np.int64)
+
+
+def make_backend(model):
+    if model == "stub":
+        return StubBackend()
+    if model == "tiny":
+        # Randomly initialised YOLOv8n: real network cost, no weight download
+        return load_backend("torch", "yolov8n.yaml")
+    kind, _, path = model.partition(":")
+    return load_backend(kind, path)
+
+
+class StageTimer:
+    """Wall time for one benchmark stage"""
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.report[f"{self.name}_ms"] = (time.perf_counter() - self.start) * 1000
+
+
+class StageMemory:
+    """Traced peak memory for one benchmark stage; tracemalloc must be running"""
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exc):
+        self.report[f"{self.name}_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024**2
+
+
+def recall_at(final_detections, gt_boxes, iou=0.3):
+    """Fraction of ground-truth ships overlapped by a final detection"""
+    if len(gt_boxes) == 0:
+        return 1.0
+    boxes = np.array([d["bbox"] for d in final_detections], dtype=np.float32).reshape(-1, 4)
+    return float((box_iou(gt_boxes, boxes).max(axis=1, initial=0) >= iou).mean())
+
+
+def run_stages(image, backend, stage, tile_size, stride, conf_threshold, iou_threshold,
+               crs_wkt, transform, adaptive):
+    """
+    pad -> (schedule) -> sliding window -> NMS -> georeference, each stage inside `stage(name)`.
+
+    Returns:
+        (windows, detections, final_detections)
+    """
+    from tiling_scheduler import schedule
+
+    H, W = image.shape[:2]
+    with stage("pad"):
+        image_padded = final_json.pad_image(image, tile_size, stride)
+    if adaptive:
+        with stage("schedule"):
+            windows = schedule(image_padded, tile_size=tile_size, fine_stride=stride).windows()
+    else:
+        windows = final_json.sliding_windows(*image_padded.shape[:2], tile_size, stride)
+
+    with stage("inference"):
+        detections = final_json.run_sliding_window(image_padded, backend, tile_size, stride, conf_threshold,
+                                                   windows=windows)
+
+    with stage("nms"):
+        final_detections = final_json.apply_nms(detections, backend.names, conf_threshold, iou_threshold)
+
+    # as the pipeline does: one georeferencer per scene from its CRS + geotransform
+    with stage("georef"):
+        SceneGeoreferencer(W, H, crs_wkt=crs_wkt, transform=transform).georeference_detections(final_detections)
+    return windows, detections, final_detections
+
+
+def benchmark_scene(image, gt_boxes, backend, tile_size=final_json.tile_size, stride=final_json.stride,
+                    conf_threshold=final_json.conf_threshold, iou_threshold=final_json.iou_threshold,
+                    crs_wkt=SYNTHETIC_CRS_WKT, transform=None, adaptive=False, trace_memory=True):
+    """
+    Run pad -> sliding window -> NMS -> georeference on one scene and time each stage.
+    With `adaptive`, tiles come from tiling_scheduler instead of the dense grid.
+    `transform` defaults to synthetic_transform() for the scene's size. With
+    `trace_memory`, the stages run a second time under tracemalloc for their peak memory.
+    """
+    H, W = image.shape[:2]
+    if transform is None:
+        transform = synthetic_transform(W, H)
+    report = {"height": H, "width": W, "model": backend.kind, "tile_size": tile_size, "stride": stride,
+              "tiling": "adaptive" if adaptive else "dense"}
+    settings = (tile_size, stride, conf_threshold, iou_threshold, crs_wkt, transform, adaptive)
+
+    windows, detections, final_detections = run_stages(
+        image, backend, lambda name: StageTimer(report, name), *settings)
+    report["tiles"] = len(windows)
+
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            run_stages(image, backend, lambda name: StageMemory(report, name), *settings)
+        finally:
+            tracemalloc.stop()
+
+    report["tiles_per_sec"] = report["tiles"] / (report["inference_ms"] / 1000) if report["inference_ms"] else 0.0
+    report["total_ms"] = sum(v for k, v in report.items() if k.endswith("_ms"))
+    report["detections_pre_nms"] = len(detections)
+    report["detections_post_nms"] = len(final_detections)
+    report["recall"] = recall_at(final_detections, gt_boxes)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report["max_rss_mb"] = maxrss / 1024**2 if platform.system() == "Darwin" else maxrss / 1024
+    return report
+
+
+def run_benchmark(sizes, models, seed=0, stride=final_json.stride, output=None, adaptive=False, trace_memory=True):
+    results = []
+    for model in models:
+        try:
+            backend = make_backend(model)
+        except ImportError as e:
+            print(f"⚠️  Skipping model '{model}': {e}")
+            continue
+        for size in sizes:
+            image, gt_boxes = make_synthetic_scene(size, seed=seed)
+            report = benchmark_scene(image, gt_boxes, backend, stride=stride, adaptive=adaptive,
+                                     trace_memory=trace_memory)
+            report.update({"size": size, "seed": seed, "model": model})
+            results.append(report)
+            peak = f", peak {report['inference_peak_mb']:7.1f} MB" if trace_memory else ""
+            print(f"{model:>6} {size:>6}px: {report['tiles']:>5} tiles, {report['tiles_per_sec']:8.1f} tiles/s, "
+                  f"inference {report['inference_ms']:9.1f} ms, nms {report['nms_ms']:7.1f} ms, "
+                  f"georef {report['georef_ms']:7.1f} ms{peak}, recall {report['recall']:.2f}")
+            if output:
+                with open(output, "a") as f:
+                    f.write(json.dumps(report) + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic-scene detector benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1280, 2560, 5120])
+    parser.add_argument("--models", nargs="+", default=["stub", "tiny"],
+                        help="'stub', 'tiny' or '<backend>:<path>' (e.g. onnx:yolov8s.onnx)")
+    parser.add_argument("--stride", type=int, default=final_json.stride)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--adaptive", action="store_true", help="Use the multi-resolution tiling scheduler")
+    parser.add_argument("--output", help="Append one JSON line per run to this file")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced pass that measures peak memory")
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.models, seed=args.seed, stride=args.stride, output=args.output,
+                  adaptive=args.adaptive, trace_memory=not args.no_memory)
@@ -0,0 +1,225 @@
+"""
+Streaming read/write of COCO-style prediction files (output.json and friends).
+
+StreamingJSONWriter emits a top-level object key by key, with large arrays
+(images, annotations) written item by item. The bytes are identical to
+json.dump(obj, f, indent=2) of the equivalent dict. iter_coco walks such a file
+and yields the small top-level values whole and the large arrays one element at
+a time, so memory stays bounded by the largest single element rather than the
+file.
+"""
+import json
+import re
+
+CHUNK_SIZE = 1 << 20
+STREAMED_KEYS = ("images", "annotations")
+COCO_KEYS = ("info", "licenses", "images", "categories", "annotations")
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+def _indented(value, level):
+    """json.dumps(value, indent=2) as it appears nested `level` spaces deep"""
+    return json.dumps(value, indent=2).replace("\n", "\n" + " " * level)
+
+
+class StreamingJSONWriter:
+    """
+    Writes a top-level JSON object incrementally. Keys are written in call order;
+    write_value writes a whole value, write_item appends one element to an array
+    (consecutive write_item calls for the same key build one array).
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self._keys = 0
+        self._array = None
+        self._items = 0
+        self._closed = False
+        f.write("{")
+
+    def _close_array(self):
+        if self._array is not None:
+            self.f.write("\n  ]")
+            self._array = None
+
+    def _start_key(self, key):
+        self._close_array()
+        self.f.write(("," if self._keys else "") + "\n  " + json.dumps(key) + ": ")
+        self._keys += 1
+
+    def write_value(self, key, value):
+        self._start_key(key)
+        self.f.write(_indented(value, 2))
+
+    def write_item(self, key, item):
+        if self._array != key:
+            self._start_key(key)
+            self.f.write("[")
+            self._array, self._items = key, 0
+        self.f.write(("," if self._items else "") + "\n    " + _indented(item, 4))
+        self._items += 1
+
+    def write_items(self, key, items):
+        """Write an iterable as the array `key` (an empty iterable gives [])"""
+        count = 0
+        for item in items:
+            self.write_item(key, item)
+            count += 1
+        if not count:
+            self.write_value(key, [])
+        return count
+
+    def close(self):
+        if not self._closed:
+            self._close_array()
+            self.f.write("\n}" if self._keys else "}")
+            self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+
+
+def write_coco(path, info, licenses, images, categories, annotations):
+    """
+    Stream a COCO file with the same layout and bytes as json.dump(..., indent=2) of
+    {"info", "licenses", "images", "categories", "annotations"}. images and annotations
+    may be any iterables (e.g. generators); returns (n_images, n_annotations).
+    """
+    with open(path, "w") as f, StreamingJSONWriter(f) as writer:
+        writer.write_value("info", info)
+        writer.write_value("licenses", licenses)
+        n_images = writer.write_items("images", images)
+        writer.write_value("categories", categories)
+        n_annotations = writer.write_items("annotations", annotations)
+    return n_images, n_annotations
+
+
+class _Scanner:
+    """Incremental JSON tokenizer over a text file, decoding one value at a time"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.pos > self.chunk_size:  # drop what has been consumed
+            self.buf, self.pos = self.buf[self.pos:], 0
+        data = self.f.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+        self.buf += data
+
+    def peek(self):
+        """Next non-whitespace character, without consuming it ('' at end of file)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # a number ending exactly at the buffer end may continue in the next chunk
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_coco(path, streamed_keys=STREAMED_KEYS, chunk_size=CHUNK_SIZE):
+    """
+    Walk a top-level JSON object in file order, yielding (key, value) for ordinary
+    keys and (key, element) for every element of the arrays in streamed_keys.
+    An empty streamed array yields nothing for its key.
+    """
+    with open(path, "r") as f:
+        scanner = _Scanner(f, chunk_size)
+        scanner.expect("{")
+        if scanner.peek() == "}":
+            return
+        while True:
+            key = scanner.value()
+            scanner.expect(":")
+            if key in streamed_keys and scanner.peek() == "[":
+                scanner.expect("[")
+                if scanner.peek() != "]":
+                    while True:
+                        yield key, scanner.value()
+                        if scanner.expect(",]") == "]":
+                            break
+                else:
+                    scanner.expect("]")
+            else:
+                yield key, scanner.value()
+            if scanner.expect(",}") == "}":
+                return
+
+
+def filter_coco(input_path, output_path, keep_image):
+    """
+    Copy a COCO file keeping only images for which keep_image(image) is true and the
+    annotations that refer to them, in one streaming pass. Images and annotations that
+    end up empty are written as [] in their usual COCO position, so the output is
+    byte-identical to json.dump(indent=2) of the filtered dict, provided images precede
+    annotations in the input (as in files written by write_coco or json.dump).
+
+    Returns:
+        (n_images, n_annotations) written.
+    """
+    kept_ids = set()
+    counts = dict.fromkeys(STREAMED_KEYS, 0)
+    written = set()
+
+    def fill_empty(before):
+        # streamed arrays that precede `before` in COCO order but got no items
+        stop = len(COCO_KEYS) if before is None else COCO_KEYS.index(before) if before in COCO_KEYS else 0
+        for key in COCO_KEYS[:stop]:
+            if key in STREAMED_KEYS and key not in written:
+                writer.write_value(key, [])
+                written.add(key)
+
+    with open(output_path, "w") as f, StreamingJSONWriter(f) as writer:
+        for key, value in iter_coco(input_path):
+            if key == "images":
+                keep = keep_image(value)
+                if keep:
+                    kept_ids.add(value["id"])
+            elif key == "annotations":
+                keep = value["image_id"] in kept_ids
+            else:
+                fill_empty(key)
+                writer.write_value(key, value)
+                written.add(key)
+                continue
+            if keep:
+                fill_empty(key)
+                writer.write_item(key, value)
+                written.add(key)
+                counts[key] += 1
+        fill_empty(None)
+    return counts["images"], counts["annotations"]
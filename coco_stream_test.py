@@ -0,0 +1,82 @@
+# COCO streaming test script
+# Checks that the streamed writer and filter produce byte-for-byte what json.dump(indent=2)
+# writes (including empty images/annotations), and that the reader yields every value
+# for any chunk size.
+# Run with: python -m pytest coco_stream_test.py  (or python coco_stream_test.py)
+
+import json
+import os
+import random
+import tempfile
+
+from coco_stream import COCO_KEYS, STREAMED_KEYS, filter_coco, iter_coco, write_coco
+
+SIZES = [(0, 0), (1, 0), (3, 1), (20, 300)]
+
+
+def make_coco(n_images, n_annotations, seed=0):
+    rng = random.Random(seed)
+    images = [{"id": i, "file_name": f"S2A_{i}.SAFE", "width": rng.choice([10980, None]), "height": 10980,
+               "date_captured": "2024-09-04 15:16:51"} for i in range(1, n_images + 1)]
+    annotations = [{"id": j, "image_id": rng.randint(1, max(n_images, 1)), "category_id": 1,
+                    "bbox": f"POLYGON(({rng.random()} {rng.random()}, 1e-07 -3.5))", "score": rng.random(),
+                    "extra": {"text": "ü \"quoted\"\n", "empty": {}}} for j in range(1, n_annotations + 1)]
+    return {"info": {"description": "Grand challenge MDA", "version": "1.0", "year": 2025},
+            "licenses": [], "images": images, "categories": [{"id": 1, "name": "ship"}],
+            "annotations": annotations}
+
+
+def write_reference(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_write_matches_json_dump():
+    with tempfile.TemporaryDirectory() as tmp:
+        reference, streamed = os.path.join(tmp, "reference.json"), os.path.join(tmp, "streamed.json")
+        for n_images, n_annotations in SIZES:
+            data = make_coco(n_images, n_annotations)
+            write_reference(reference, data)
+            write_coco(streamed, data["info"], data["licenses"], iter(data["images"]), data["categories"],
+                       (ann for ann in data["annotations"]))
+            assert read(streamed) == read(reference), (n_images, n_annotations)
+
+
+def test_iter_yields_every_value():
+    with tempfile.TemporaryDirectory() as tmp:
+        reference = os.path.join(tmp, "reference.json")
+        for n_images, n_annotations in SIZES:
+            data = make_coco(n_images, n_annotations)
+            write_reference(reference, data)
+            for chunk_size in (1, 7, 4096):
+                events = list(iter_coco(reference, chunk_size=chunk_size))
+                for key in COCO_KEYS:
+                    values = [value for k, value in events if k == key]
+                    assert values == (data[key] if key in STREAMED_KEYS else [data[key]]), (key, chunk_size)
+
+
+def test_filter_matches_json_dump():
+    with tempfile.TemporaryDirectory() as tmp:
+        reference, streamed = os.path.join(tmp, "reference.json"), os.path.join(tmp, "streamed.json")
+        for n_images, n_annotations in SIZES:
+            data = make_coco(n_images, n_annotations)
+            write_reference(reference, data)
+            for keep_image in (lambda img: img["id"] % 3 == 0, lambda img: False, lambda img: True):
+                images = [img for img in data["images"] if keep_image(img)]
+                ids = {img["id"] for img in images}
+                expected = dict(data, images=images,
+                                annotations=[ann for ann in data["annotations"] if ann["image_id"] in ids])
+                filter_coco(reference, streamed, keep_image)
+                assert read(streamed) == json.dumps(expected, indent=2)
+
+
+if __name__ == "__main__":
+    test_write_matches_json_dump()
+    test_iter_yields_every_value()
+    test_filter_matches_json_dump()
+    print("✅ Streamed output matches json.dump(indent=2), including empty images/annotations")
@@ -0,0 +1,475 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from product_store import ProductStore
+
+CHUNK_SIZE = 4 * 1024 * 1024  # bytes per read/write while streaming a product
+MIN_RANGE_SIZE = 64 * 1024 * 1024  # smallest byte range worth its own connection
+SEARCH_BATCH = 20  # product names per catalogue query
+TOKEN_MARGIN = 60  # seconds before expiry at which the access token is renewed
+MISSING_TTL = 24 * 3600  # seconds a "not in the catalogue" answer is trusted
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".json"  # sidecar next to the .part file
+
+
+def byte_ranges(size, parts):
+    """Split [0, size) into `parts` contiguous inclusive (start, end) ranges"""
+    step = -(-size // parts)
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+def _load_state(state_path, product_id, size):
+    """Sidecar state of a partial download, or None if missing or for a different product/size"""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("product_id") != product_id or (size and state.get("size") != size):
+        return None
+    return state
+
+
+def _save_state(state_path, state):
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, state_path)
+
+
+def product_checksums(product):
+    """Catalogue Checksum entries hashlib can compute, as {algorithm: hex digest}"""
+    checksums = {}
+    for entry in (product or {}).get("Checksum") or []:
+        algorithm = (entry.get("Algorithm") or "").lower()
+        if entry.get("Value") and algorithm in hashlib.algorithms_available:
+            checksums[algorithm] = entry["Value"].lower()
+    return checksums
+
+
+def verify_file(path, size=None, checksums=None, block_size=CHUNK_SIZE):
+    """None if the file matches the expected size and checksums, else a description of the mismatch"""
+    actual_size = os.path.getsize(path)
+    if size is not None and actual_size != size:
+        return f"size {actual_size} != expected {size}"
+    if checksums:
+        digests = {algorithm: hashlib.new(algorithm) for algorithm in checksums}
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                for digest in digests.values():
+                    digest.update(block)
+        for algorithm, expected in checksums.items():
+            if digests[algorithm].hexdigest() != expected:
+                return f"{algorithm} {digests[algorithm].hexdigest()} != expected {expected}"
+    return None
+
+
+def make_session(pool_size=8):
+    """One pooled session reused for every token, search and download request"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class HostLimiter:
+    """Caps the number of concurrent requests per host (CDSE allows a few downloads per user)"""
+
+    def __init__(self, max_per_host=4):
+        self.max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        with semaphore:
+            yield
+
+
+class ProgressReporter:
+    """Thread-safe download progress, printed at most once per `interval` seconds"""
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._last_print = 0.0
+
+    def update(self, name, done, total):
+        with self._lock:
+            self._active[name] = (done, total)
+            now = time.monotonic()
+            if now - self._last_print < self.interval:
+                return
+            self._last_print = now
+            parts = []
+            for active_name, (active_done, active_total) in self._active.items():
+                if active_total:
+                    parts.append(f"{active_name[:32]} {active_done / active_total * 100:5.1f}%")
+                else:
+                    parts.append(f"{active_name[:32]} {active_done / 1024**2:.0f}MB")
+            print("  Progress: " + " | ".join(parts))
+
+    def finish(self, name):
+        with self._lock:
+            self._active.pop(name, None)
+
+
+class CopernicusClient:
+    """
+    Token, catalogue search and product download for the Copernicus Data Space Ecosystem.
+
+    All requests go through one pooled session; downloads stream in large chunks and
+    hold a per-host slot, so process_image_list can run several products at once
+    without exceeding the service's per-user concurrency. Downloads are resumable and
+    verified against the catalogue's size and checksum.
+    """
+
+    final_state = "downloaded"  # stage after which process_image_list skips a product
+
+    token_url = "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token"
+    base_url = "https://catalogue.dataspace.copernicus.eu/odata/v1"
+    download_url = "https://zipper.dataspace.copernicus.eu/odata/v1"
+
+    def __init__(self, client_id, client_secret, max_workers=4, max_per_host=4, chunk_size=CHUNK_SIZE,
+                 session=None, token_url=None, base_url=None, download_url=None, progress_interval=2.0,
+                 range_workers=1, min_range_size=MIN_RANGE_SIZE, retries=3, retry_delay=2.0,
+                 search_batch=SEARCH_BATCH, token_margin=TOKEN_MARGIN, missing_ttl=MISSING_TTL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.access_token = None
+        self.token_expires_at = 0.0
+        self.token_margin = token_margin
+        self._token_lock = threading.Lock()
+        self.search_batch = search_batch
+        self.missing_ttl = missing_ttl
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.range_workers = range_workers
+        self.min_range_size = min_range_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.session = session or make_session(pool_size=max(max_workers, max_per_host) * 2)
+        self.limiter = HostLimiter(max_per_host)
+        self._stores = {}
+        self._stores_lock = threading.Lock()
+        self.progress = ProgressReporter(progress_interval)
+        self.token_url = token_url or self.token_url
+        self.base_url = base_url or self.base_url
+        self.download_url = download_url or self.download_url
+
+    def store(self, output_dir):
+        """The ProductStore rooted at output_dir, shared by all worker threads"""
+        key = os.path.abspath(output_dir)
+        with self._stores_lock:
+            if key not in self._stores:
+                self._stores[key] = ProductStore(output_dir)
+            return self._stores[key]
+
+    def get_access_token(self):
+        """Get OAuth2 access token"""
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        }
+
+        try:
+            with self.limiter.slot(self.token_url):
+                response = self.session.post(self.token_url, data=data)
+            response.raise_for_status()
+            token = response.json()
+            self.access_token = token["access_token"]
+            self.token_expires_at = time.monotonic() + token.get("expires_in", 600)
+            print("✓ Authentication successful")
+            return True
+        except Exception as e:
+            print(f"✗ Authentication failed: {e}")
+            return False
+
+    def ensure_token(self):
+        """
+        Access token that is valid for at least token_margin more seconds, renewed
+        proactively (and only once across threads) when it is missing or about to expire.
+        Returns None if authentication fails.
+        """
+        with self._token_lock:
+            if not self.access_token or time.monotonic() > self.token_expires_at - self.token_margin:
+                if not self.get_access_token():
+                    return None
+            return self.access_token
+
+    def search_products(self, product_names):
+        """
+        Catalogue entries for many product names, search_batch names per OData query
+        (Name eq '...' or Name eq '...'). Returns {name: product}; names not in the
+        catalogue are absent. Raises on HTTP errors.
+        """
+        search_url = f"{self.base_url}/Products"
+        found = {}
+        for start in range(0, len(product_names), self.search_batch):
+            batch = product_names[start:start + self.search_batch]
+            params = {
+                "$filter": " or ".join(f"Name eq '{name}'" for name in batch),
+                "$top": len(batch)
+            }
+            with self.limiter.slot(search_url):
+                response = self.session.get(search_url, params=params)
+            response.raise_for_status()
+            for product in response.json()['value']:
+                found[product['Name']] = product
+        print(f"✓ Found {len(found)} of {len(product_names)} products "
+              f"in {-(-len(product_names) // self.search_batch)} catalogue queries")
+        return found
+
+    def search_product(self, product_name):
+        """Search for a product by name"""
+        search_url = f"{self.base_url}/Products"
+        params = {
+            "$filter": f"Name eq '{product_name}'"
+        }
+
+        try:
+            with self.limiter.slot(search_url):
+                response = self.session.get(search_url, params=params)
+            response.raise_for_status()
+            results = response.json()
+
+            if results['value']:
+                product = results['value'][0]
+                print(f"✓ Found product: {product['Name']}")
+                return product
+            else:
+                print(f"✗ Product not found: {product_name}")
+                return None
+        except Exception as e:
+            print(f"✗ Search failed: {e}")
+            return None
+
+    def _fetch_range(self, url, part_path, segment, state, state_path, name, lock):
+        """Download one [start, end] segment into the .part file, checkpointing after every chunk"""
+        start, end, done = segment
+        headers = {"Authorization": f"Bearer {self.ensure_token()}"}
+        if end is not None or done:
+            headers["Range"] = f"bytes={start + done}-{'' if end is None else end}"
+        with self.limiter.slot(url):
+            with self.session.get(url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                if "Range" in headers and response.status_code != 206:
+                    if len(state["segments"]) > 1:
+                        raise IOError("Server ignored the Range header; cannot fetch byte ranges in parallel")
+                    segment[2] = done = 0  # whole body again from byte 0
+                elif response.status_code == 206:
+                    content_range = response.headers.get("Content-Range", "")
+                    if not content_range.startswith(f"bytes {start + done}-"):
+                        raise IOError(f"Unexpected Content-Range {content_range!r} for bytes={start + done}-")
+                with open(part_path, "r+b") as f:
+                    f.seek(start + done)
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            f.flush()
+                            with lock:
+                                segment[2] += len(chunk)
+                                _save_state(state_path, state)
+                                self.progress.update(name, sum(s[2] for s in state["segments"]), state["size"])
+        if end is None:
+            segment[1] = start + segment[2] - 1
+            with lock:
+                _save_state(state_path, state)
+
+    def _download_resumable(self, url, part_path, product_id, name, size=None):
+        """
+        Fill part_path from url, resuming from the sidecar state if a previous attempt was
+        interrupted. Products of at least 2 * min_range_size are split into up to
+        range_workers byte ranges fetched in parallel. Network errors are retried `retries`
+        times, each retry resuming where the last one stopped.
+        """
+        state_path = part_path + STATE_SUFFIX
+        state = _load_state(state_path, product_id, size) if os.path.exists(part_path) else None
+        if state is None:
+            parts = min(self.range_workers, size // self.min_range_size) if size else 1
+            segments = byte_ranges(size, max(1, parts)) if size else [(0, None)]
+            state = {"product_id": product_id, "size": size, "segments": [[s, e, 0] for s, e in segments]}
+            with open(part_path, "wb") as f:
+                if size:
+                    f.truncate(size)
+            _save_state(state_path, state)
+        else:
+            print(f"⟳ Resuming {name} from {sum(s[2] for s in state['segments']) / 1024**2:.1f} MB")
+
+        lock = threading.Lock()
+        for attempt in range(self.retries + 1):
+            pending = [s for s in state["segments"] if s[1] is None or s[0] + s[2] <= s[1]]
+            if not pending:
+                break
+            try:
+                if len(pending) == 1:
+                    self._fetch_range(url, part_path, pending[0], state, state_path, name, lock)
+                else:
+                    with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+                        futures = [pool.submit(self._fetch_range, url, part_path, segment, state, state_path,
+                                               name, lock) for segment in pending]
+                        for future in futures:
+                            future.result()
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"⟳ {name}: {e}; retrying from {sum(s[2] for s in state['segments']) / 1024**2:.1f} MB")
+                time.sleep(self.retry_delay * 2 ** attempt)
+        self.progress.finish(name)
+
+    def download_product(self, product_id, product_name, output_dir="downloads", product=None):
+        """
+        Download a product using its ID, then hand it to postprocess().
+
+        Data goes to <name>.zip.part with a .part.json sidecar; a failed or interrupted
+        download keeps both, and the next call resumes with Range requests. When the
+        catalogue entry is passed as `product`, its ContentLength and Checksum are verified
+        before the file is renamed to <name>.zip.
+        """
+        if not self.ensure_token():
+            print("✗ No access token. Please authenticate first.")
+            return False
+
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        store = self.store(output_dir)
+        download_endpoint = f"{self.download_url}/Products({product_id})/$value"
+        output_path = store.zip_path(product_name)
+        part_path = output_path + PART_SUFFIX
+
+        if store.reached(product_name, "downloaded"):
+            print(f"✓ Already downloaded: {output_path}")
+            return self.postprocess(output_path, product_name, output_dir)
+        size = product.get("ContentLength") if product else None
+
+        print(f"⟳ Downloading {product_name}...")
+
+        try:
+            self._download_resumable(download_endpoint, part_path, product_id, product_name, size)
+        except Exception as e:
+            self.progress.finish(product_name)
+            print(f"✗ Download failed for {product_name}: {e} (partial data kept, rerun to resume)")
+            return False
+
+        problem = verify_file(part_path, size, product_checksums(product))
+        if problem:
+            print(f"✗ Verification failed for {product_name}: {problem}")
+            for path in (part_path, part_path + STATE_SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
+            return False
+        os.replace(part_path, output_path)
+        os.remove(part_path + STATE_SUFFIX)
+        store.mark(product_name, "downloaded", zip=os.path.basename(output_path))
+        print(f"✓ Downloaded: {output_path} ({os.path.getsize(output_path) / (1024**3):.2f} GB)")
+        return self.postprocess(output_path, product_name, output_dir)
+
+    def postprocess(self, zip_path, product_name, output_dir):
+        """Hook run after a successful download (extraction/conversion in subclasses)"""
+        return True
+
+    def _process_image(self, idx, total, image_data, output_dir, searched):
+        image_name = image_data['image_name']
+        print(f"[{idx}/{total}] Processing: {image_name}")
+
+        store = self.store(output_dir)
+        if store.reached(image_name, self.final_state):
+            print(f"✓ Already {store.state(image_name)}: {image_name}")
+            return {'id': image_data['id'], 'image_name': image_name, 'status': 'skipped'}
+
+        product = store.product(image_name) if store.reached(image_name, "searched") else None
+        if product is None:
+            if image_name in searched:
+                product = searched[image_name]
+            else:
+                product = self.search_product(image_name)
+                if not product:
+                    store.mark_missing(image_name)
+            if not product:
+                return {'id': image_data['id'], 'image_name': image_name, 'status': 'not_found'}
+            store.mark(image_name, "searched", product=product)
+
+        success = self.download_product(product['Id'], image_name, output_dir, product)
+        return {'id': image_data['id'], 'image_name': image_name, 'status': 'success' if success else 'failed'}
+
+    def _resolve_products(self, image_names, store):
+        """
+        Batch-search every name the store has no catalogue entry for. Names found
+        missing within missing_ttl are not asked again. Returns {name: product or None};
+        names left out (after a failed query) fall back to search_product.
+        """
+        pending, searched = [], {}
+        for name in image_names:
+            if store.reached(name, "searched"):
+                continue
+            if store.missing_for(name) < self.missing_ttl:
+                searched[name] = None
+            else:
+                pending.append(name)
+        if pending:
+            try:
+                found = self.search_products(pending)
+            except Exception as e:
+                print(f"✗ Batched search failed, searching one by one: {e}")
+                return searched
+            for name in pending:
+                searched[name] = found.get(name)
+                if name not in found:
+                    print(f"✗ Product not found: {name}")
+                    store.mark_missing(name)
+        return searched
+
+    def process_image_list(self, image_list, output_dir="downloads", max_workers=None):
+        """
+        Search and download every image in the list, up to max_workers products at a time
+        (1 = sequential). Stages recorded in output_dir's product store are not repeated,
+        and products already at final_state are reported as 'skipped'; missing catalogue
+        entries are looked up search_batch names per query, so a rerun over finished or
+        already-searched products makes no catalogue calls. Writes download_log.json and
+        returns the per-image results.
+        """
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        store = self.store(output_dir)
+        names = [image_data['image_name'] for image_data in image_list]
+        todo = [name for name in names if not store.reached(name, self.final_state)]
+        searched = self._resolve_products(todo, store)
+        # authenticate only if something is left to download (found, or still to be searched)
+        if any(searched.get(name, True) for name in todo) and not self.ensure_token():
+            return None
+
+        workers = max(1, min(max_workers or self.max_workers, len(image_list) or 1))
+        total = len(image_list)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda item: self._process_image(item[0], total, item[1], output_dir, searched),
+                                    enumerate(image_list, 1)))
+
+        log_file = os.path.join(output_dir, "download_log.json")
+        with open(log_file, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        print(f"\n{'='*60}")
+        print("Download Summary:")
+        print(f"  Total: {len(results)} ({workers} concurrent, {time.perf_counter() - start:.1f}s)")
+        print(f"  Success: {sum(1 for r in results if r['status'] == 'success')}")
+        print(f"  Skipped (already done): {sum(1 for r in results if r['status'] == 'skipped')}")
+        print(f"  Failed: {sum(1 for r in results if r['status'] == 'failed')}")
+        print(f"  Not Found: {sum(1 for r in results if r['status'] == 'not_found')}")
+        print(f"  Log saved to: {log_file}")
+        print(f"{'='*60}")
+        return results
@@ -0,0 +1,353 @@
+# Copernicus client test script
+# Runs CopernicusClient against a local HTTP server standing in for the identity,
+# catalogue and zipper endpoints, and offline against a mocked session (FakeSession).
+# Run with: python -m pytest copernicus_client_test.py  (or python copernicus_client_test.py)
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import requests
+
+from copernicus_client import PART_SUFFIX, STATE_SUFFIX, CopernicusClient
+
+
+class FakeCopernicus:
+    """
+    Local stand-in for CDSE. products maps product name -> payload bytes.
+    Records how many downloads were in flight at once and how many TCP connections were opened.
+    """
+
+    def __init__(self, products, delay_per_mb=0.05, ranges=True, fail_after=None):
+        self.products = {name: {"Id": f"id-{i}", "Name": name, "ContentLength": len(data), "data": data,
+                                "Checksum": [{"Value": hashlib.md5(data).hexdigest(), "Algorithm": "MD5"},
+                                             {"Value": "0" * 64, "Algorithm": "BLAKE3"}]}
+                         for i, (name, data) in enumerate(products.items())}
+        self.by_id = {p["Id"]: p for p in self.products.values()}
+        self.delay_per_mb = delay_per_mb
+        self.ranges = ranges
+        self.fail_after = fail_after  # drop the connection once after this many body bytes
+        self.bytes_sent = 0
+        self.range_headers = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+        self.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **kwargs):
+        return CopernicusClient("id", "secret", token_url=f"{self.url}/token",
+                                base_url=f"{self.url}/odata/v1", download_url=f"{self.url}/zipper/odata/v1", **kwargs)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake.lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.requests.append(("POST", self.path))
+                self._send_json({"access_token": "token-1", "expires_in": 600})
+
+            def do_GET(self):
+                fake.requests.append(("GET", self.path))
+                url = urlsplit(self.path)
+                if url.path == "/odata/v1/Products":
+                    names = re.findall(r"Name eq '([^']*)'", parse_qs(url.query)["$filter"][0])
+                    self._send_json({"value": [{k: v for k, v in fake.products[name].items() if k != "data"}
+                                               for name in names if name in fake.products]})
+                elif url.path.startswith("/zipper/odata/v1/Products("):
+                    if self.headers.get("Authorization") != "Bearer token-1":
+                        return self._send_json({"detail": "unauthorized"}, 401)
+                    product = fake.by_id[unquote(url.path).split("(")[1].split(")")[0]]
+                    self._send_product(product["data"], self.headers.get("Range"))
+                else:
+                    self._send_json({"detail": "not found"}, 404)
+
+            def _send_product(self, data, range_header):
+                with fake.lock:
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    fake.range_headers.append(range_header)
+                try:
+                    first, last = 0, len(data) - 1
+                    if fake.ranges and range_header:
+                        first, _, last = range_header.split("=")[1].partition("-")
+                        first, last = int(first), int(last) if last else len(data) - 1
+                        self.send_response(206)
+                        self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+                    else:
+                        self.send_response(200)
+                    body = data[first:last + 1]
+                    self.send_header("Content-Type", "application/zip")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    step = 1 << 20
+                    for start in range(0, len(body), step):
+                        piece = body[start:start + step]
+                        with fake.lock:
+                            if fake.fail_after is not None and fake.bytes_sent + len(piece) > fake.fail_after:
+                                piece = piece[:fake.fail_after - fake.bytes_sent]
+                                fake.fail_after = None
+                                fake.bytes_sent += len(piece)
+                                self.wfile.write(piece)
+                                self.close_connection = True
+                                return
+                            fake.bytes_sent += len(piece)
+                        self.wfile.write(piece)
+                        time.sleep(fake.delay_per_mb)
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+        return Handler
+
+
+class FakeSession:
+    """
+    Offline stand-in for requests.Session (no sockets): answers token, catalogue and
+    zipper requests for `products` (name -> bytes) and records every call.
+    """
+
+    def __init__(self, products, expires_in=600):
+        self.products = {name: {"Id": f"id-{i}", "Name": name, "ContentLength": len(data),
+                                "Checksum": [{"Value": hashlib.md5(data).hexdigest(), "Algorithm": "MD5"}]}
+                         for i, (name, data) in enumerate(products.items())}
+        self.data = {self.products[name]["Id"]: data for name, data in products.items()}
+        self.expires_in = expires_in
+        self.calls = []
+        self.tokens_issued = 0
+
+    @staticmethod
+    def _response(status, body, headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response._content = body
+        response._content_consumed = True
+        response.headers.update(headers or {})
+        return response
+
+    def post(self, url, data=None, **kwargs):
+        self.calls.append(("token", url))
+        self.tokens_issued += 1
+        return self._response(200, json.dumps({"access_token": f"token-{self.tokens_issued}",
+                                               "expires_in": self.expires_in}).encode())
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        if "/Products(" in url:
+            self.calls.append(("download", url))
+            data = self.data[url.split("(")[1].split(")")[0]]
+            first, _, last = (headers or {}).get("Range", "bytes=0-").split("=")[1].partition("-")
+            first, last = int(first), int(last) if last else len(data) - 1
+            return self._response(206, data[first:last + 1],
+                                  {"Content-Range": f"bytes {first}-{last}/{len(data)}"})
+        self.calls.append(("search", url))
+        names = re.findall(r"Name eq '([^']*)'", params["$filter"])
+        return self._response(200, json.dumps(
+            {"value": [self.products[name] for name in names if name in self.products]}).encode())
+
+    def count(self, kind):
+        return sum(1 for call_kind, _ in self.calls if call_kind == kind)
+
+
+def make_products(count, size):
+    return {f"S2A_MSIL1C_TEST_{i:02d}.SAFE": os.urandom(size) for i in range(count)}
+
+
+def check_downloads(output_dir, products, results):
+    assert all(r["status"] == "success" for r in results if r["image_name"] in products), results
+    for name, data in products.items():
+        with open(os.path.join(output_dir, f"{name}.zip"), "rb") as f:
+            assert f.read() == data, f"{name}: downloaded bytes differ"
+
+
+PRODUCTS = make_products(6, 3 * 1024 * 1024)
+IMAGE_LIST = [{"id": i + 1, "image_name": name} for i, name in enumerate(PRODUCTS)]
+IMAGE_LIST.append({"id": len(IMAGE_LIST) + 1, "image_name": "S1A_IW_GRDH_MISSING.SAFE"})
+NAME, DATA = next(iter(PRODUCTS.items()))
+
+
+def test_concurrent_downloads():
+    timings = {}
+    for workers in (1, 4):
+        with FakeCopernicus(PRODUCTS) as fake, tempfile.TemporaryDirectory() as output_dir:
+            client = fake.client(max_workers=workers, max_per_host=2, progress_interval=0.5)
+            start = time.perf_counter()
+            results = client.process_image_list(IMAGE_LIST, output_dir)
+            timings[workers] = time.perf_counter() - start
+
+            check_downloads(output_dir, PRODUCTS, results)
+            assert results[-1]["status"] == "not_found"
+            assert [r["id"] for r in results] == [item["id"] for item in IMAGE_LIST], "results out of order"
+            with open(os.path.join(output_dir, "download_log.json")) as f:
+                assert json.load(f) == results
+            # per-host limit holds, and the pooled session reuses connections instead of one per request
+            assert fake.max_in_flight <= 2, fake.max_in_flight
+            assert fake.connections < len(fake.requests), (fake.connections, len(fake.requests))
+            print(f"✅ workers={workers}: {len(fake.requests)} requests over {fake.connections} connections, "
+                  f"max {fake.max_in_flight} concurrent downloads, {timings[workers]:.2f}s")
+
+    assert timings[4] < timings[1], timings
+    print(f"✅ Concurrent mode {timings[1] / timings[4]:.1f}x faster than sequential")
+
+
+def test_rejected_download():
+    # A rejected download is reported as failed and leaves no finished zip behind
+    with FakeCopernicus(PRODUCTS) as fake, tempfile.TemporaryDirectory() as output_dir:
+        client = fake.client()
+        client.access_token, client.token_expires_at = "expired", float("inf")
+        assert client.download_product("id-0", "S2A_MSIL1C_TEST_00.SAFE", output_dir) is False
+        assert not os.path.exists(os.path.join(output_dir, "S2A_MSIL1C_TEST_00.SAFE.zip"))
+        print("✅ Rejected download reported as failed")
+
+
+def test_resume_on_next_call():
+    # The connection drops mid-body, no retries in this run; the next call continues with Range
+    # from the last whole chunk written before the drop
+    fail_after, chunk_size = len(DATA) // 2 + 12345, 64 * 1024
+    resume_from = fail_after // chunk_size * chunk_size
+    with FakeCopernicus(PRODUCTS, fail_after=fail_after) as fake, tempfile.TemporaryDirectory() as output_dir:
+        client = fake.client(retries=0, chunk_size=chunk_size)
+        client.get_access_token()
+        product = fake.products[NAME]
+        part_path = os.path.join(output_dir, f"{NAME}.zip{PART_SUFFIX}")
+        assert client.download_product(product["Id"], NAME, output_dir, product) is False
+        assert os.path.exists(part_path) and os.path.exists(part_path + STATE_SUFFIX)
+        assert client.download_product(product["Id"], NAME, output_dir, product) is True
+        check_downloads(output_dir, {NAME: DATA}, [])
+        assert fake.range_headers[-1] == f"bytes={resume_from}-{len(DATA) - 1}", fake.range_headers
+        assert fake.bytes_sent == fail_after + len(DATA) - resume_from, (fake.bytes_sent, len(DATA))
+        assert not os.path.exists(part_path) and not os.path.exists(part_path + STATE_SUFFIX)
+        print(f"✅ Resumed with {fake.range_headers[-1]}, {fake.bytes_sent} bytes sent in total")
+
+
+def test_retry_within_call():
+    # Same drop, retried within the call
+    with FakeCopernicus(PRODUCTS, fail_after=1000000) as fake, tempfile.TemporaryDirectory() as output_dir:
+        client = fake.client(retry_delay=0)
+        client.get_access_token()
+        assert client.download_product(fake.products[NAME]["Id"], NAME, output_dir, fake.products[NAME])
+        check_downloads(output_dir, {NAME: DATA}, [])
+        print("✅ Interrupted download retried and resumed in one call")
+
+
+def test_parallel_ranges():
+    # Parallel byte ranges, including one range interrupted and resumed
+    big = {"S1A_IW_GRDH_TEST_BIG.SAFE": os.urandom(10 * 1024 * 1024 + 17)}
+    with FakeCopernicus(big, fail_after=3 * 1024 * 1024) as fake, tempfile.TemporaryDirectory() as output_dir:
+        client = fake.client(range_workers=4, min_range_size=2 * 1024 * 1024, retry_delay=0)
+        results = client.process_image_list([{"id": 1, "image_name": "S1A_IW_GRDH_TEST_BIG.SAFE"}], output_dir)
+        check_downloads(output_dir, big, results)
+        assert fake.max_in_flight == 4 and len(fake.range_headers) == 5, fake.range_headers
+        print(f"✅ Parallel ranges: {fake.range_headers}")
+
+
+def test_rangeless_server():
+    # Server without Range support: an interrupted download restarts from byte 0 and still completes
+    with FakeCopernicus(PRODUCTS, ranges=False, fail_after=1000000) as fake, \
+            tempfile.TemporaryDirectory() as output_dir:
+        client = fake.client(retry_delay=0)
+        client.get_access_token()
+        assert client.download_product(fake.products[NAME]["Id"], NAME, output_dir, fake.products[NAME])
+        check_downloads(output_dir, {NAME: DATA}, [])
+        print("✅ Range-less server handled by restarting")
+
+
+def test_product_store_rerun():
+    # A rerun skips finished products, and only repeats the stages whose outputs are gone
+    with FakeCopernicus(PRODUCTS) as fake, tempfile.TemporaryDirectory() as output_dir:
+        fake.client().process_image_list(IMAGE_LIST, output_dir)
+        first_run = len(fake.requests)
+        results = fake.client().process_image_list(IMAGE_LIST, output_dir)
+        rerun = fake.requests[first_run:]
+        assert [r["status"] for r in results] == ["skipped"] * len(PRODUCTS) + ["not_found"], results
+        assert [path for method, path in rerun if "/zipper/" in path] == [], rerun
+        assert rerun == [], rerun  # not even a token: nothing left to download, the missing name is cached
+        os.remove(os.path.join(output_dir, f"{NAME}.zip"))
+        count = len(fake.requests)
+        results = fake.client().process_image_list(IMAGE_LIST, output_dir)
+        again = [path for method, path in fake.requests[count:] if method == "GET"]
+        assert results[0]["status"] == "success" and len(again) == 1 and "/zipper/" in again[0], again
+        check_downloads(output_dir, PRODUCTS, [])
+        print(f"✅ Rerun skipped {len(PRODUCTS)} finished products; a deleted zip was downloaded again without a search")
+
+
+def test_checksum_mismatch():
+    # The corrupt file is discarded, never renamed to .zip
+    with FakeCopernicus(PRODUCTS) as fake, tempfile.TemporaryDirectory() as output_dir:
+        client = fake.client()
+        client.get_access_token()
+        product = dict(fake.products[NAME], Checksum=[{"Value": "0" * 32, "Algorithm": "MD5"}])
+        assert client.download_product(product["Id"], NAME, output_dir, product) is False
+        assert [f for f in os.listdir(output_dir) if f != "product_index.json"] == [], os.listdir(output_dir)
+        print("✅ Checksum mismatch rejected")
+
+
+def test_batched_search_offline():
+    # Through a mocked session: batched search, and a rerun with zero catalogue calls
+    offline = make_products(40, 1024)
+    offline_list = [{"id": i + 1, "image_name": name} for i, name in enumerate(offline)]
+    offline_list += [{"id": 41 + i, "image_name": f"S1A_IW_GRDH_MISSING_{i}.SAFE"} for i in range(5)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        session = FakeSession(offline)
+        client = CopernicusClient("id", "secret", session=session, search_batch=20)
+        results = client.process_image_list(offline_list, output_dir)
+        check_downloads(output_dir, offline, results)
+        assert session.count("search") == 3 and session.count("download") == 40, session.calls[:5]
+        assert sum(r["status"] == "not_found" for r in results) == 5
+
+        session = FakeSession(offline)
+        results = CopernicusClient("id", "secret", session=session).process_image_list(offline_list, output_dir)
+        assert session.calls == [], session.calls
+        assert [r["status"] for r in results] == ["skipped"] * 40 + ["not_found"] * 5
+        print("✅ 45 names resolved in 3 catalogue queries; rerun made no HTTP calls at all")
+
+
+def test_token_renewal():
+    session = FakeSession(make_products(1, 1024), expires_in=120)
+    client = CopernicusClient("id", "secret", session=session, token_margin=60)
+    assert client.ensure_token() == client.ensure_token() == "token-1"
+    client.token_expires_at = time.monotonic() + 30  # inside the renewal margin
+    assert client.ensure_token() == "token-2" and session.tokens_issued == 2
+    print("✅ Token reused while valid and renewed before it expires")
+
+
+if __name__ == "__main__":
+    for test in (test_concurrent_downloads, test_rejected_download, test_resume_on_next_call,
+                 test_retry_within_call, test_parallel_ranges, test_rangeless_server, test_product_store_rerun,
+                 test_checksum_mismatch, test_batched_search_offline, test_token_renewal):
+        test()
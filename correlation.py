@@ -1,47 +1,39 @@
-import json
-import csv
-
-# File paths
-output_json_path = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output.json"
-converted_csv_path = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/converted_output.csv"
-correlation_json_path = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output_correlation.json"
-
-# Step 1: Read output.json
-with open(output_json_path, "r") as f:
-    data = json.load(f)
-
-# Step 2: Build lookup from converted_output.csv
-remarks_lookup = {}
-with open(converted_csv_path, newline='', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        remarks_lookup[row["image_name"]] = row["Remarks"]
-
-# Step 3: Filter images list
-filtered_images = [
-    img for img in data["images"]
-    if remarks_lookup.get(img["file_name"], "0") == "1"
-]
-
-# Step 4: Build set of kept image IDs
-kept_image_ids = set(img["id"] for img in filtered_images)
-
-# Step 5: Filter annotations for those image IDs only
-filtered_annotations = [
-    ann for ann in data.get("annotations", [])
-    if ann["image_id"] in kept_image_ids
-]
-
-# Step 6: Compose output_correlation.json
-filtered_data = {
-    "info": data["info"],
-    "licenses": data["licenses"],
-    "images": filtered_images,
-    "categories": data["categories"],
-    "annotations": filtered_annotations
-}
-
-with open(correlation_json_path, "w") as f:
-    json.dump(filtered_data, f, indent=2)
-
-print(f"output_correlation.json created with {len(filtered_images)} images and {len(filtered_annotations)} annotations.")
\ No newline at end of file
+from coco_stream import filter_coco
+from scene_catalogue import SceneCatalogue
+
+def filter_correlation_images(output_json_path, converted_csv_path, correlation_json_path, catalogue=None):
+    """
+    Keeps only the images marked for AIS correlation (Remarks == 1) and their annotations.
+
+    Parameters:
+        output_json_path (str): Detection output (COCO-style output.json).
+        converted_csv_path (str): Imagery CSV with the Remarks column (converted_output.csv or the original).
+        correlation_json_path (str): Where to write output_correlation.json.
+        catalogue (SceneCatalogue): Scene catalogue holding the remarks; the CSV is parsed into it
+            only if it changed since it was last loaded.
+
+    Returns:
+        (n_images, n_annotations) written to correlation_json_path.
+    """
+    # Step 1: Scenes marked for AIS correlation, from the scene catalogue
+    catalogue = catalogue or SceneCatalogue()
+    catalogue.load_csv(converted_csv_path)
+    correlation_images = set(catalogue.lookup(remarks=1, csv_path=converted_csv_path))
+
+    # Step 2: Stream output.json into output_correlation.json, keeping those images and
+    # their annotations (output.json is never held in memory as a whole)
+    n_images, n_annotations = filter_coco(
+        output_json_path, correlation_json_path,
+        lambda img: img["file_name"] in correlation_images
+    )
+
+    print(f"output_correlation.json created with {n_images} images and {n_annotations} annotations.")
+    return n_images, n_annotations
+
+if __name__ == "__main__":
+    # File paths
+    output_json_path = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output.json"
+    converted_csv_path = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/converted_output.csv"
+    correlation_json_path = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output_correlation.json"
+
+    filter_correlation_images(output_json_path, converted_csv_path, correlation_json_path)
\ No newline at end of file
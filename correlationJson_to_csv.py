@@ -1,34 +1,51 @@
-import json
-import csv
-import re
-
-# Input/output files
-input_json = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output_correlation.json"
-output_csv = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output_correlation_csv.csv"
-
-# Load the JSON
-with open(input_json, 'r') as f:
-    data = json.load(f)
-
-# Build a lookup from image_id to (image_name, timestamp)
-image_lookup = {img['id']: (img['file_name'], img['date_captured']) for img in data['images']}
-
-# Prepare CSV
-with open(output_csv, 'w', newline='', encoding='utf-8') as f:
-    writer = csv.writer(f)
-    writer.writerow(['timestamp', 'lat', 'lon', 'image_name'])
-
-    for ann in data.get('annotations', []):
-        image_id = ann['image_id']
-        image_name, timestamp = image_lookup.get(image_id, ("", ""))
-        bbox = ann['bbox']
-        # Extract last coordinate from POLYGON string
-        coords = re.findall(r"([-+]?\d*\.\d+|\d+)\s+([-+]?\d*\.\d+|\d+)", bbox)
-        if coords:
-            lat, lon = coords[-1]
-            writer.writerow([timestamp, lat, lon, image_name])
-        else:
-            # If cannot parse, write empty line (optional)
-            writer.writerow([timestamp, '', '', image_name])
-
-print(f"CSV saved to {output_csv}")
\ No newline at end of file
+import pandas as pd
+
+from coco_stream import iter_coco
+from wkt_geometry import parse_polygons
+
+def correlation_frame(input_json):
+    """
+    One row per annotation of a COCO-style file: timestamp, lat, lon and image_name,
+    with the vessel position taken as the centroid of the annotation polygon.
+
+    Parameters:
+        input_json (str): output_correlation.json (or any output.json-style file).
+
+    Returns:
+        DataFrame with columns timestamp, lat, lon, image_name (lat/lon are NaN
+        where the polygon could not be parsed).
+    """
+    # Stream the file: image lookup from image_id to (image_name, timestamp), and the
+    # annotation columns needed for the CSV
+    image_lookup = {}
+    image_ids, polygons = [], []
+    for key, value in iter_coco(input_json):
+        if key == 'images':
+            image_lookup[value['id']] = (value['file_name'], value['date_captured'])
+        elif key == 'annotations':
+            image_ids.append(value['image_id'])
+            polygons.append(value['bbox'])
+
+    # Parse every POLYGON at once; WKT vertices are (lon, lat)
+    centroids = parse_polygons(polygons).centroids()
+    names, timestamps = zip(*(image_lookup.get(image_id, ("", "")) for image_id in image_ids)) if image_ids else ((), ())
+    return pd.DataFrame({
+        'timestamp': list(timestamps),
+        'lat': centroids[:, 1],
+        'lon': centroids[:, 0],
+        'image_name': list(names),
+    })
+
+def correlation_json_to_csv(input_json, output_csv):
+    """Write correlation_frame(input_json) to output_csv (unparseable positions are left empty)"""
+    frame = correlation_frame(input_json)
+    frame.to_csv(output_csv, index=False, encoding='utf-8')
+    return frame
+
+if __name__ == "__main__":
+    # Input/output files
+    input_json = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output_correlation.json"
+    output_csv = "/Users/devanshkedia/Desktop/NCCIPCCC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/output_correlation_csv.csv"
+
+    correlation_json_to_csv(input_json, output_csv)
+    print(f"CSV saved to {output_csv}")
\ No newline at end of file
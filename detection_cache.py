@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+class DetectionCache:
+    """
+    Persistent cache of raw per-tile detector outputs.
+
+    Entries are keyed by scene ID, tile window, model fingerprint and preprocessing
+    parameters, and store the model output at a low confidence floor so that later
+    runs with a higher `conf_threshold` or a different `iou_threshold` replay from the
+    cache instead of re-running inference. A digest of the tile pixels is kept with
+    each entry and a mismatch is treated as a miss. The cache is bounded by
+    `max_bytes` and evicts least recently used entries.
+    """
+
+    def __init__(self, db_path, max_bytes=2 * 1024**3, conf_floor=0.05, verify_content=True):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.conf_floor = conf_floor
+        self.verify_content = verify_content
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tiles (
+                key TEXT PRIMARY KEY,
+                scene_id TEXT,
+                content_hash TEXT,
+                conf REAL,
+                boxes BLOB,
+                scores BLOB,
+                class_ids BLOB,
+                nbytes INTEGER,
+                last_access REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS tiles_last_access ON tiles (last_access)")
+        self.conn.commit()
+
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM tiles").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._pending = 0
+
+    @staticmethod
+    def make_key(scene_id, window, model_hash, preprocessing):
+        """Hash of everything that determines the raw model output for a tile"""
+        payload = json.dumps({
+            "scene_id": scene_id,
+            "window": list(window),
+            "model": model_hash,
+            "preprocessing": preprocessing or {},
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def content_hash(tile):
+        return hashlib.blake2b(np.ascontiguousarray(tile).data, digest_size=16).hexdigest()
+
+    def get(self, key, tile=None, conf_threshold=None):
+        """Return cached (boxes, scores, class_ids) or None on a miss"""
+        row = self.conn.execute(
+            "SELECT content_hash, conf, boxes, scores, class_ids FROM tiles WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        content_hash, conf, boxes, scores, class_ids = row
+        if conf_threshold is not None and conf_threshold < conf:
+            # cached output was thresholded higher than what is asked for now
+            self.misses += 1
+            return None
+        if tile is not None and self.verify_content and content_hash != self.content_hash(tile):
+            self.stale += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE tiles SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._maybe_commit()
+        return (np.frombuffer(boxes, dtype=np.float32).reshape(-1, 4),
+                np.frombuffer(scores, dtype=np.float32),
+                np.frombuffer(class_ids, dtype=np.uint16).astype(np.int64))
+
+    def put(self, key, result, scene_id="", tile=None, conf=None):
+        """Store raw output for a tile and evict old entries if over budget"""
+        boxes, scores, class_ids = result
+        boxes = np.ascontiguousarray(boxes, dtype=np.float32).tobytes()
+        scores = np.ascontiguousarray(scores, dtype=np.float32).tobytes()
+        class_ids = np.ascontiguousarray(class_ids, dtype=np.uint16).tobytes()
+        nbytes = len(boxes) + len(scores) + len(class_ids) + 128  # rough per-row overhead
+        content_hash = self.content_hash(tile) if tile is not None else None
+
+        old = self.conn.execute("SELECT nbytes FROM tiles WHERE key = ?", (key,)).fetchone()
+        if old:
+            self.total_bytes -= old[0]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, scene_id, content_hash, self.conf_floor if conf is None else conf,
+             boxes, scores, class_ids, nbytes, time.time())
+        )
+        self.total_bytes += nbytes
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        self._maybe_commit()
+
+    def predict(self, backend, tile, scene_id, window, conf_threshold, preprocessing=None, model_hash=None):
+        """
+        Cached equivalent of `backend.predict(tile, conf_threshold)`.
+
+        On a miss the backend runs at `min(conf_floor, conf_threshold)` and the raw
+        output is stored; the returned detections are always filtered to `conf_threshold`.
+        """
+        if model_hash is None:
+            model_hash = self._model_hash(backend)
+        key = self.make_key(scene_id, window, model_hash, preprocessing)
+        result = self.get(key, tile, conf_threshold)
+        if result is None:
+            run_conf = min(self.conf_floor, conf_threshold)
+            result = backend.predict(tile, run_conf)
+            self.put(key, result, scene_id, tile, run_conf)
+
+        boxes, scores, class_ids = result
+        keep = scores >= conf_threshold
+        return boxes[keep], scores[keep], class_ids[keep]
+
+    def _model_hash(self, backend):
+        # the backend hashes its weights once and adds its current settings on every call
+        return backend.fingerprint()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in `max_bytes`"""
+        target = int(self.max_bytes * 0.9)  # evict a little extra to avoid thrashing
+        rows = self.conn.execute("SELECT key, nbytes FROM tiles ORDER BY last_access").fetchall()
+        doomed = []
+        for key, nbytes in rows:
+            if self.total_bytes <= target:
+                break
+            doomed.append((key,))
+            self.total_bytes -= nbytes
+        self.conn.executemany("DELETE FROM tiles WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def invalidate_scene(self, scene_id):
+        """Remove every entry belonging to a scene"""
+        freed = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM tiles WHERE scene_id = ?",
+                                  (scene_id,)).fetchone()[0]
+        self.conn.execute("DELETE FROM tiles WHERE scene_id = ?", (scene_id,))
+        self.total_bytes -= freed
+        self.conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        entries = self.conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _maybe_commit(self):
+        # committing per tile dominates the cost of a warm run, so batch it
+        self._pending += 1
+        if self._pending >= 256:
+            self.flush()
+
+    def flush(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,183 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# File layout (little-endian):
+#   8 bytes   magic b"MDADET\x00\x01" (last byte = format version)
+#   4 bytes   uint32 length of the JSON header
+#   ...       JSON header (scene info, class names, column table), padded to 64 bytes
+#   ...       columns, each starting on a 64-byte boundary
+#
+# Core columns are boxes (N, 4) float32 xyxy, scores (N,) float32 and
+# class_ids (N,) uint16. Extra columns (e.g. georeferenced centroids) may follow.
+
+MAGIC = b"MDADET\x00\x01"
+ALIGN = 64
+EXTENSION = ".mdd"
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_detections(path, boxes, scores, class_ids, class_names, scene=None, stage="pre_nms",
+                     bbox_int=False, extra=None):
+    """
+    Write detections to a compact columnar file.
+
+    Parameters:
+        boxes (array): (N, 4) xyxy boxes in scene pixels.
+        scores (array): (N,) confidences.
+        class_ids (array): (N,) integer class ids.
+        class_names (dict): class id -> name.
+        scene (dict): Scene header (scene_id, image_name, width, height, ...).
+        stage (str): 'pre_nms' or 'post_nms'; selects the JSON record layout on export.
+        bbox_int (bool): Boxes are integral pixels (post-NMS boxes are written as ints in JSON).
+        extra (dict): Optional name -> array columns with N rows.
+    """
+    boxes = np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 4)
+    count = len(boxes)
+    columns = {
+        "boxes": boxes,
+        "scores": np.ascontiguousarray(scores, dtype=np.float32).reshape(count),
+        "class_ids": np.ascontiguousarray(class_ids, dtype=np.uint16).reshape(count),
+    }
+    for name, values in (extra or {}).items():
+        values = np.ascontiguousarray(values)
+        if len(values) != count:
+            raise ValueError(f"Column '{name}' has {len(values)} rows, expected {count}")
+        columns[name] = values
+
+    table = []
+    for name, values in columns.items():
+        table.append({"name": name, "dtype": values.dtype.str, "shape": list(values.shape)})
+
+    header = {
+        "scene": scene or {},
+        "stage": stage,
+        "bbox_format": "xyxy",
+        "bbox_int": bool(bbox_int),
+        "count": count,
+        "class_names": {str(k): v for k, v in class_names.items()},
+        "columns": table,
+    }
+
+    # Offsets depend on the header length, which depends on the offsets; the
+    # header is padded, so two passes settle it
+    offset = 0
+    for _ in range(2):
+        header_bytes = json.dumps(header).encode("utf-8")
+        offset = _align(len(MAGIC) + 4 + len(header_bytes))
+        for entry, values in zip(table, columns.values()):
+            entry["offset"] = offset
+            offset = _align(offset + values.nbytes)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for entry, values in zip(table, columns.values()):
+            f.write(b"\x00" * (entry["offset"] - f.tell()))
+            f.write(values.tobytes())
+    return path
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a detection file")
+        (length,) = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+class DetectionTable:
+    """Columns of one detection file; arrays are memory-mapped unless read with mmap=False"""
+
+    def __init__(self, header, columns):
+        self.header = header
+        self.columns = columns
+        self.names = {int(k): v for k, v in header["class_names"].items()}
+
+    @property
+    def boxes(self):
+        return self.columns["boxes"]
+
+    @property
+    def scores(self):
+        return self.columns["scores"]
+
+    @property
+    def class_ids(self):
+        return self.columns["class_ids"]
+
+    @property
+    def scene(self):
+        return self.header["scene"]
+
+    def __len__(self):
+        return self.header["count"]
+
+    def to_records(self):
+        """Rebuild the JSON records final_json.py used to write (pre- or post-NMS layout)"""
+        boxes = self.boxes.astype(np.float64)
+        if self.header["bbox_int"]:
+            boxes = boxes.astype(np.int64)
+        boxes = boxes.tolist()
+        scores = self.scores.astype(np.float64).tolist()
+        classes = [self.names[int(c)] for c in self.class_ids]
+
+        if self.header["stage"] == "post_nms":
+            return [{"class": c, "confidence": s, "bbox": b}
+                    for b, s, c in zip(boxes, scores, classes)]
+        return [{"global_bbox": b, "confidence": s, "class": c}
+                for b, s, c in zip(boxes, scores, classes)]
+
+    def export_json(self, path, indent=4):
+        with open(path, "w") as f:
+            json.dump(self.to_records(), f, indent=indent)
+        return path
+
+
+def read_detections(path, mmap=True):
+    """Open a detection file; columns are np.memmap views by default"""
+    header = read_header(path)
+    columns = {}
+    for entry in header["columns"]:
+        dtype = np.dtype(entry["dtype"])
+        shape = tuple(entry["shape"])
+        if int(np.prod(shape)) == 0:
+            columns[entry["name"]] = np.zeros(shape, dtype=dtype)
+        elif mmap:
+            columns[entry["name"]] = np.memmap(path, dtype=dtype, mode="r", offset=entry["offset"], shape=shape)
+        else:
+            columns[entry["name"]] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                                                 offset=entry["offset"]).reshape(shape)
+    return DetectionTable(header, columns)
+
+
+def records_to_arrays(records, class_names):
+    """Convert final_json.py style records (pre- or post-NMS) into column arrays"""
+    name_to_id = {name: int(cls) for cls, name in class_names.items()}
+    key = "global_bbox" if records and "global_bbox" in records[0] else "bbox"
+    boxes = np.array([r[key] for r in records], dtype=np.float32).reshape(-1, 4)
+    scores = np.array([r["confidence"] for r in records], dtype=np.float32)
+    class_ids = np.array([name_to_id[r["class"]] for r in records], dtype=np.uint16)
+    return boxes, scores, class_ids
+
+
+def write_records(path, records, class_names, scene=None, stage="pre_nms"):
+    """Write final_json.py style records to the binary format"""
+    boxes, scores, class_ids = records_to_arrays(records, class_names)
+    bbox_int = stage == "post_nms" and all(isinstance(v, int) for r in records for v in r["bbox"])
+    return write_detections(path, boxes, scores, class_ids, class_names, scene, stage, bbox_int)
+
+
+def load_detections(path):
+    """Load detection records from either a binary detection file or the legacy JSON dump"""
+    if os.path.splitext(path)[1] == EXTENSION:
+        return read_detections(path).to_records()
+    with open(path, "r") as f:
+        return json.load(f)
@@ -0,0 +1,456 @@
+import ast
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import cv2
+
+
+class DetectorBackend:
+    """
+    Base class for tile detectors used by the sliding-window loop.
+
+    Every backend returns raw detections for a single BGR tile as three arrays:
+    boxes (N, 4) float32 in tile pixel xyxy, scores (N,) float32 and class ids (N,) int.
+    """
+
+    kind = "base"
+
+    def __init__(self):
+        self.names = {}
+        self.model_path = None
+        self._weights_digest = None
+
+    def settings(self):
+        """Options besides the weights that change the raw outputs (part of the fingerprint)"""
+        return {}
+
+    def fingerprint(self):
+        """Stable identity of the backend, model weights and settings, used to key cached outputs"""
+        if self._weights_digest is None:
+            # hashing weights is expensive, so it is done once per backend object
+            digest = hashlib.sha256(self.kind.encode())
+            if self.model_path and os.path.isfile(self.model_path):
+                with open(self.model_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(chunk)
+            elif self.model_path:
+                digest.update(str(self.model_path).encode())
+            self._weights_digest = digest
+        digest = self._weights_digest.copy()
+        settings = self.settings()
+        if settings:
+            digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def predict(self, tile, conf_threshold=0.25):
+        raise NotImplementedError
+
+    def predict_batch(self, tiles, conf_threshold=0.25):
+        """Run `predict` over a list of tiles"""
+        return [self.predict(tile, conf_threshold) for tile in tiles]
+
+    def class_id(self, class_name):
+        """Map a class name back to its id"""
+        for cls, name in self.names.items():
+            if name == class_name:
+                return int(cls)
+        raise KeyError(class_name)
+
+
+def _empty_result():
+    return (np.zeros((0, 4), dtype=np.float32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.int64))
+
+
+class TorchBackend(DetectorBackend):
+    """PyTorch eager inference through ultralytics.YOLO"""
+
+    kind = "torch"
+
+    def __init__(self, weights, device="cpu", num_threads=None):
+        super().__init__()
+        # torch is only needed for this backend, so keep the import (and the
+        # safe-globals registration needed to unpickle old checkpoints) here
+        import torch
+        from torch.nn.modules.container import Sequential
+        from ultralytics import YOLO
+
+        torch.serialization.add_safe_globals([Sequential])
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.weights = weights
+        self.model_path = weights
+        self.device = device
+        self.model = YOLO(weights)
+        self.names = dict(self.model.names)
+
+    def predict(self, tile, conf_threshold=0.25):
+        results = self.model(tile, conf=conf_threshold, device=self.device, verbose=False)
+        boxes = results[0].boxes
+        if len(boxes) == 0:
+            return _empty_result()
+        return (boxes.xyxy.cpu().numpy().astype(np.float32),
+                boxes.conf.cpu().numpy().astype(np.float32),
+                boxes.cls.cpu().numpy().astype(np.int64))
+
+    def predict_batch(self, tiles, conf_threshold=0.25):
+        if not tiles:
+            return []
+        results = self.model(list(tiles), conf=conf_threshold, device=self.device, verbose=False)
+        outputs = []
+        for result in results:
+            boxes = result.boxes
+            if len(boxes) == 0:
+                outputs.append(_empty_result())
+                continue
+            outputs.append((boxes.xyxy.cpu().numpy().astype(np.float32),
+                            boxes.conf.cpu().numpy().astype(np.float32),
+                            boxes.cls.cpu().numpy().astype(np.int64)))
+        return outputs
+
+
+class ExportedGraphBackend(DetectorBackend):
+    """
+    Shared pre/post-processing for YOLOv8 graphs exported to ONNX or OpenVINO.
+
+    The exported graph has no NMS, so raw (1, 4 + num_classes, anchors) output is
+    decoded here and reduced with class-aware NMS, matching ultralytics defaults.
+    """
+
+    max_wh = 7680  # class offset used for class-aware NMS, same as ultralytics
+
+    def __init__(self, names=None, imgsz=640, iou_threshold=0.7, max_det=300):
+        super().__init__()
+        self.names = dict(names or {})
+        self.imgsz = imgsz
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+    def settings(self):
+        return {"imgsz": self.imgsz, "iou_threshold": self.iou_threshold, "max_det": self.max_det}
+
+    def preprocess(self, tile):
+        h, w = tile.shape[:2]
+        if (h, w) != (self.imgsz, self.imgsz):
+            tile = cv2.resize(tile, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        blob = cv2.cvtColor(tile, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None]
+        blob = np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+        return blob, (w / self.imgsz, h / self.imgsz)
+
+    def postprocess(self, output, scale, conf_threshold):
+        preds = np.asarray(output)[0].T  # (anchors, 4 + nc)
+        class_scores = preds[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(preds)), class_ids]
+        keep = scores > conf_threshold
+        if not np.any(keep):
+            return _empty_result()
+
+        preds, scores, class_ids = preds[keep], scores[keep], class_ids[keep]
+        cx, cy, bw, bh = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+        boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+
+        # Offset boxes by class so one NMS call never suppresses across classes
+        offset = class_ids[:, None] * self.max_wh
+        shifted = boxes + offset
+        xywh = np.column_stack([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]])
+        indices = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(),
+                                   score_threshold=conf_threshold, nms_threshold=self.iou_threshold)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:self.max_det]
+
+        sx, sy = scale
+        boxes = boxes[indices] * np.array([sx, sy, sx, sy], dtype=np.float32)
+        return (boxes.astype(np.float32),
+                scores[indices].astype(np.float32),
+                class_ids[indices].astype(np.int64))
+
+    def run_graph(self, blob):
+        raise NotImplementedError
+
+    def predict(self, tile, conf_threshold=0.25):
+        blob, scale = self.preprocess(tile)
+        return self.postprocess(self.run_graph(blob), scale, conf_threshold)
+
+
+def _names_from_metadata(metadata):
+    """Ultralytics stores class names in exported graph metadata as a dict literal"""
+    names = metadata.get("names")
+    if not names:
+        return {}
+    try:
+        return {int(k): v for k, v in ast.literal_eval(names).items()}
+    except (ValueError, SyntaxError):
+        return {}
+
+
+class OnnxBackend(ExportedGraphBackend):
+    """ONNX Runtime CPU inference on an exported (optionally int8) graph"""
+
+    kind = "onnx"
+
+    def __init__(self, onnx_path, names=None, imgsz=640, num_threads=None, **kwargs):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        if names is None:
+            names = _names_from_metadata(self.session.get_modelmeta().custom_metadata_map)
+        super().__init__(names=names, imgsz=imgsz, **kwargs)
+        self.path = self.model_path = onnx_path
+
+    def run_graph(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINOBackend(ExportedGraphBackend):
+    """OpenVINO CPU inference on an exported IR model (.xml)"""
+
+    kind = "openvino"
+
+    def __init__(self, xml_path, names=None, imgsz=640, num_threads=None, **kwargs):
+        import openvino as ov
+
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if num_threads:
+            config["INFERENCE_NUM_THREADS"] = num_threads
+        self.compiled = core.compile_model(xml_path, "CPU", config)
+        self.output = self.compiled.output(0)
+        if names is None:
+            names = self._read_names(xml_path)
+        super().__init__(names=names, imgsz=imgsz, **kwargs)
+        self.path = xml_path
+        # the weights live in the .bin next to the .xml
+        self.model_path = xml_path.rsplit(".", 1)[0] + ".bin"
+
+    @staticmethod
+    def _read_names(xml_path):
+        # ultralytics writes metadata.yaml next to the IR files
+        metadata_path = os.path.join(os.path.dirname(xml_path), "metadata.yaml")
+        if not os.path.exists(metadata_path):
+            return {}
+        import yaml
+        with open(metadata_path) as f:
+            metadata = yaml.safe_load(f) or {}
+        return {int(k): v for k, v in (metadata.get("names") or {}).items()}
+
+    def run_graph(self, blob):
+        return self.compiled([blob])[self.output]
+
+
+BACKENDS = {
+    "torch": TorchBackend,
+    "onnx": OnnxBackend,
+    "openvino": OpenVINOBackend,
+}
+
+
+def load_backend(kind, path, **kwargs):
+    """
+    Create a detector backend by name.
+
+    Parameters:
+        kind (str): One of 'torch', 'onnx' or 'openvino'.
+        path (str): Weights (.pt/.yaml), ONNX graph (.onnx) or OpenVINO IR (.xml).
+    """
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown backend '{kind}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[kind](path, **kwargs)
+
+
+class _TileCalibrationReader:
+    """Feeds sample tiles to onnxruntime static quantization"""
+
+    def __init__(self, input_name, tiles, imgsz):
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.tiles = iter(tiles)
+
+    def get_next(self):
+        tile = next(self.tiles, None)
+        if tile is None:
+            return None
+        if tile.shape[:2] != (self.imgsz, self.imgsz):
+            tile = cv2.resize(tile, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        blob = cv2.cvtColor(tile, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None]
+        return {self.input_name: np.ascontiguousarray(blob, dtype=np.float32) / 255.0}
+
+
+def _openvino_xml(export_path):
+    """IR .xml inside the *_openvino_model/ directory ultralytics exports to"""
+    if str(export_path).endswith(".xml"):
+        return str(export_path)
+    xml_files = sorted(f for f in os.listdir(export_path) if f.endswith(".xml"))
+    if len(xml_files) != 1:
+        raise FileNotFoundError(f"Expected one .xml in {export_path}, found {xml_files}")
+    return os.path.join(export_path, xml_files[0])
+
+
+def export_model(weights, kind="onnx", int8=False, imgsz=640, calibration_tiles=None, data=None):
+    """
+    Export YOLO weights to an exported-graph backend and return the path load_backend
+    takes (the .onnx graph, or the .xml of the OpenVINO IR).
+
+    Parameters:
+        weights (str): Path to the .pt weights.
+        kind (str): 'onnx' or 'openvino'.
+        int8 (bool): Quantize weights/activations to int8.
+        calibration_tiles (list): BGR tiles for ONNX static int8 calibration. Without
+            them ONNX falls back to dynamic (weight-only) quantization.
+        data (str): Dataset yaml used by ultralytics for OpenVINO int8 calibration.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    if kind == "openvino":
+        return _openvino_xml(model.export(format="openvino", imgsz=imgsz, int8=int8, data=data))
+    if kind != "onnx":
+        raise ValueError(f"Cannot export to '{kind}'")
+
+    onnx_path = model.export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+    if not int8:
+        return onnx_path
+
+    from onnxruntime.quantization import (QuantFormat, QuantType, quantize_dynamic,
+                                          quantize_static)
+    import onnxruntime as ort
+
+    int8_path = onnx_path.rsplit(".", 1)[0] + "_int8.onnx"
+    if calibration_tiles:
+        input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        quantize_static(onnx_path, int8_path,
+                        _TileCalibrationReader(input_name, calibration_tiles, imgsz),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    else:
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    return int8_path
+
+
+# ---------------------------------------------------------------------------
+# Accuracy / latency comparison
+# ---------------------------------------------------------------------------
+
+def box_iou(a, b):
+    """Pairwise IoU between two sets of xyxy boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _match_count(ref_boxes, boxes, iou_match):
+    """Greedy one-to-one matching, highest IoU first"""
+    iou = box_iou(ref_boxes, boxes)
+    matched = 0
+    while iou.size and iou.max() >= iou_match:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return matched
+
+
+def compare_backends(backends, tiles, reference, ship_class="boat", conf_threshold=0.25,
+                     iou_match=0.5, warmup=2):
+    """
+    Time every backend on the same tiles and measure agreement with a reference backend.
+
+    Parameters:
+        backends (dict): name -> DetectorBackend.
+        tiles (list): BGR tiles (e.g. sampled from a real scene).
+        reference (str): Name of the backend treated as ground truth (usually torch eager).
+        ship_class (str): Class name whose detections are compared.
+
+    Returns:
+        dict: name -> {ms_per_tile, p90_ms, tiles_per_sec, recall, precision, detections}
+    """
+    outputs = {}
+    report = {}
+    for name, backend in backends.items():
+        for tile in tiles[:warmup]:
+            backend.predict(tile, conf_threshold)
+
+        try:
+            ship_id = backend.class_id(ship_class)
+        except KeyError:
+            ship_id = None
+
+        latencies = []
+        per_tile = []
+        for tile in tiles:
+            start = time.perf_counter()
+            boxes, scores, class_ids = backend.predict(tile, conf_threshold)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if ship_id is not None:
+                boxes = boxes[class_ids == ship_id]
+            per_tile.append(boxes)
+        outputs[name] = per_tile
+
+        latencies = np.array(latencies)
+        report[name] = {
+            "ms_per_tile": float(latencies.mean()),
+            "p90_ms": float(np.percentile(latencies, 90)),
+            "tiles_per_sec": float(1000.0 / latencies.mean()) if latencies.mean() > 0 else float("inf"),
+            "detections": int(sum(len(b) for b in per_tile)),
+        }
+
+    ref_outputs = outputs[reference]
+    ref_total = sum(len(b) for b in ref_outputs)
+    for name, per_tile in outputs.items():
+        matched = sum(_match_count(r, b, iou_match) for r, b in zip(ref_outputs, per_tile))
+        total = sum(len(b) for b in per_tile)
+        report[name]["recall"] = matched / ref_total if ref_total else 1.0
+        report[name]["precision"] = matched / total if total else 1.0
+    return report
+
+
+def select_backend(report, min_recall=0.98, min_precision=0.95):
+    """Return the fastest backend name whose agreement stays within tolerance"""
+    eligible = [name for name, r in report.items()
+                if r["recall"] >= min_recall and r["precision"] >= min_precision]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda name: report[name]["ms_per_tile"])
+
+
+def sample_tiles(image, tile_size=640, count=32, seed=0):
+    """Pick random full-size tiles from a scene for comparison runs"""
+    rng = np.random.default_rng(seed)
+    H, W = image.shape[:2]
+    ys = rng.integers(0, max(H - tile_size, 0) + 1, size=count)
+    xs = rng.integers(0, max(W - tile_size, 0) + 1, size=count)
+    return [image[y:y + tile_size, x:x + tile_size].copy() for y, x in zip(ys, xs)]
+
+
+if __name__ == "__main__":
+    # Example: compare eager torch with exported fp32 / int8 ONNX on tiles from one scene
+    image_path = "RGB_outputs/S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720_RGB.jpg"
+    weights = "yolov8s.pt"
+
+    tiles = sample_tiles(cv2.imread(image_path), count=32)
+    backends = {
+        "torch": load_backend("torch", weights),
+        "onnx": load_backend("onnx", export_model(weights, "onnx")),
+        "onnx_int8": load_backend("onnx", export_model(weights, "onnx", int8=True,
+                                                       calibration_tiles=tiles[:16])),
+    }
+    report = compare_backends(backends, tiles, reference="torch", ship_class="boat")
+    for name, r in report.items():
+        print(f"{name:>10}: {r['ms_per_tile']:.1f} ms/tile ({r['tiles_per_sec']:.1f} tiles/s), "
+              f"recall={r['recall']:.3f}, precision={r['precision']:.3f}")
+    print(f"✅ Fastest within tolerance: {select_backend(report)}")
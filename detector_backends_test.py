@@ -0,0 +1,80 @@
+# Detector backend test script
+# Checks that backend fingerprints (the DetectionCache key) follow the settings that change the
+# raw outputs, and that OpenVINO exports resolve to the .xml load_backend expects.
+# Run with: python -m pytest detector_backends_test.py  (or python detector_backends_test.py)
+
+import os
+import tempfile
+
+import numpy as np
+
+from detection_cache import DetectionCache
+from detector_backends import ExportedGraphBackend, _openvino_xml
+
+
+class ConstantGraph(ExportedGraphBackend):
+    """Exported-graph backend whose 'graph' always returns the same two overlapping boxes"""
+    kind = "constant"
+
+    def __init__(self, model_path, **kwargs):
+        super().__init__(names={0: "boat"}, imgsz=64, **kwargs)
+        self.model_path = model_path
+        self.graph_runs = 0
+
+    def run_graph(self, blob):
+        self.graph_runs += 1
+        # (1, 4 + nc, anchors): cx, cy, w, h, score
+        return np.array([[[20.0, 24.0], [20.0, 20.0], [10.0, 10.0], [10.0, 10.0], [0.9, 0.8]]])
+
+
+def test_fingerprint_follows_settings():
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "model.onnx")
+        with open(weights, "wb") as f:
+            f.write(b"weights")
+        backend = ConstantGraph(weights)
+        base = backend.fingerprint()
+        assert ConstantGraph(weights).fingerprint() == base
+        for name, value in (("imgsz", 320), ("iou_threshold", 0.1), ("max_det", 1)):
+            other = ConstantGraph(weights)
+            setattr(other, name, value)
+            assert other.fingerprint() != base, name
+        # a setting changed after the first fingerprint still changes it
+        backend.iou_threshold = 0.1
+        assert backend.fingerprint() != base
+
+
+def test_cache_does_not_replay_other_settings():
+    tile = np.zeros((64, 64, 3), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "model.onnx")
+        with open(weights, "wb") as f:
+            f.write(b"weights")
+        with DetectionCache(os.path.join(tmp, "cache.sqlite")) as cache:
+            loose = ConstantGraph(weights, iou_threshold=0.9)
+            boxes, _, _ = cache.predict(loose, tile, "scene", (0, 0, 64, 64), 0.25)
+            assert len(boxes) == 2
+            boxes, _, _ = cache.predict(ConstantGraph(weights, iou_threshold=0.9), tile, "scene",
+                                        (0, 0, 64, 64), 0.25)
+            assert len(boxes) == 2 and cache.stats()["hits"] == 1
+
+            strict = ConstantGraph(weights, iou_threshold=0.1)
+            boxes, _, _ = cache.predict(strict, tile, "scene", (0, 0, 64, 64), 0.25)
+            assert strict.graph_runs == 1 and len(boxes) == 1
+
+
+def test_openvino_export_resolves_to_xml():
+    with tempfile.TemporaryDirectory() as tmp:
+        export_dir = os.path.join(tmp, "yolov8s_openvino_model")
+        os.makedirs(export_dir)
+        for name in ("yolov8s.xml", "yolov8s.bin", "metadata.yaml"):
+            open(os.path.join(export_dir, name), "w").close()
+        assert _openvino_xml(export_dir) == os.path.join(export_dir, "yolov8s.xml")
+        assert _openvino_xml(os.path.join(export_dir, "yolov8s.xml")) == os.path.join(export_dir, "yolov8s.xml")
+
+
+if __name__ == "__main__":
+    test_fingerprint_follows_settings()
+    test_cache_does_not_replay_other_settings()
+    test_openvino_export_resolves_to_xml()
+    print("✅ Fingerprints include imgsz/iou/max_det; OpenVINO exports resolve to their .xml")
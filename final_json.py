@@ -1,118 +1,214 @@
-import numpy as np
-import cv2
-from ultralytics import YOLO
-import matplotlib.pyplot as plt
-import torch
-from torch.nn.modules.container import Sequential
-import math
-import json
-import os
-
-# --------- Load your large image ----------
-image_path = "/Users/devanshkedia/Desktop/NCCIPC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/RGB_outputs/S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720_RGB.jpg"
-image = cv2.imread(image_path)
-H, W, _ = image.shape
-print(f"Original size: {H}x{W}")
-
-# --------- Model setup ----------
-torch.serialization.add_safe_globals([Sequential])
-model = YOLO("/Users/devanshkedia/Desktop/NCCIPC/yolov8s.pt")
-
-tile_size = 640
-stride = 128
-conf_threshold = 0.25
-iou_threshold = 0.0000005
-
-# --------- Pad image globally ----------
-pad_h = (math.ceil((H - tile_size) / stride) + 1) * stride + tile_size - H - stride
-pad_w = (math.ceil((W - tile_size) / stride) + 1) * stride + tile_size - W - stride
-image_padded = cv2.copyMakeBorder(image, 0, pad_h, 0, pad_w, cv2.BORDER_CONSTANT, value=0)
-H_pad, W_pad, _ = image_padded.shape
-
-# --------- Calculate number of sliding windows ----------
-num_rows = math.ceil((H_pad - tile_size) / stride) + 1
-num_cols = math.ceil((W_pad - tile_size) / stride) + 1
-total_windows = num_rows * num_cols
-print(f"Number of sliding windows along height: {num_rows}")
-print(f"Number of sliding windows along width: {num_cols}")
-print(f"Total number of sliding windows: {total_windows}")
-
-detections = []  # pre-NMS detections
-
-# --------- Sliding window loop ----------
-for y in range(0, H_pad - tile_size + 1, stride):
-    for x in range(0, W_pad - tile_size + 1, stride):
-        tile = image_padded[y:y+tile_size, x:x+tile_size].copy()
-
-        # Run YOLO on this tile
-        results = model(tile, conf=conf_threshold, verbose=False)
-
-        # Collect detections in global coordinates
-        for b in results[0].boxes:
-            x1, y1, x2, y2 = b.xyxy[0].cpu().numpy()
-            conf = float(b.conf)
-            cls = int(b.cls)
-            detections.append({
-                "global_bbox": [float(x1 + x), float(y1 + y), float(x2 + x), float(y2 + y)],
-                "confidence": conf,
-                "class": model.names[cls]
-            })
-
-print(f"Total detections before NMS: {len(detections)}")
-
-# --------- Apply OpenCV NMS ----------
-boxes = []
-confidences = []
-class_ids = []
-
-for det in detections:
-    x1, y1, x2, y2 = det["global_bbox"]
-    boxes.append([int(x1), int(y1), int(x2 - x1), int(y2 - y1)])  # x, y, w, h
-    confidences.append(det["confidence"])
-    # map class name back to id
-    class_ids.append(list(model.names.values()).index(det["class"]))
-
-indices = cv2.dnn.NMSBoxes(boxes, confidences, score_threshold=conf_threshold, nms_threshold=iou_threshold)
-
-final_detections = []
-if len(indices) > 0:
-    for i in indices.flatten():
-        x, y, w, h = boxes[i]
-        final_detections.append({
-            "class": model.names[class_ids[i]],
-            "confidence": confidences[i],
-            "bbox": [x, y, x + w, y + h]
-        })
-
-print(f"Total detections after NMS: {len(final_detections)}")
-
-
-
-# --------- Save detections as JSON ----------
-output_dir = os.path.dirname(image_path)
-pre_nms_path = os.path.join(output_dir, "detections_preNMS, S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.json")
-post_nms_path = os.path.join(output_dir, "detections_postNMS,S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.json")
-
-with open(pre_nms_path, "w") as f:
-    json.dump(detections, f, indent=4)
-
-with open(post_nms_path, "w") as f:
-    json.dump(final_detections, f, indent=4)
-
-print(f"✅ Saved detections_preNMS,S2C_MSIL1C_20250311T161121_N0511_R140_T16RGT_20250311T181252_RGB.json and detections_postNMS, S2C_MSIL1C_20250311T161121_N0511_R140_T16RGT_20250311T181252_RGB.json to:\n{output_dir}")
-
-
-# --------- Visualization of final detections ----------
-annotated_full = image.copy()
-for det in final_detections:
-    x1, y1, x2, y2 = map(int, det['bbox'])
-    cv2.rectangle(annotated_full, (x1, y1), (x2, y2), (0, 255, 0), 2)
-    cv2.putText(annotated_full, f"{det['class']}:{det['confidence']:.2f}",
-                (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-
-plt.figure(figsize=(12, 12))
-plt.imshow(cv2.cvtColor(annotated_full, cv2.COLOR_BGR2RGB))
-plt.axis('off')
-plt.title("Detections across large image after NMS")
-plt.show()
-
+import numpy as np
+import cv2
+import math
+import json
+import os
+import time
+
+from detector_backends import load_backend
+from detection_cache import DetectionCache
+from detection_format import records_to_arrays, write_detections, write_records
+from instrumentation import RECORDER, measure
+from vessel_geometry import estimate_vessel_geometry
+
+tile_size = 640
+stride = 128
+conf_threshold = 0.25
+iou_threshold = 0.0000005
+pixel_size_m = 10.0  # Sentinel-2 10 m bands
+adaptive_tiling = False  # screen at low resolution and only tile densely around candidates
+
+
+def pad_image(image, tile_size=tile_size, stride=stride):
+    """Pad the image bottom/right so the sliding windows cover it exactly"""
+    H, W = image.shape[:2]
+    pad_h = (math.ceil((H - tile_size) / stride) + 1) * stride + tile_size - H - stride
+    pad_w = (math.ceil((W - tile_size) / stride) + 1) * stride + tile_size - W - stride
+    return cv2.copyMakeBorder(image, 0, pad_h, 0, pad_w, cv2.BORDER_CONSTANT, value=0)
+
+
+def sliding_windows(H_pad, W_pad, tile_size=tile_size, stride=stride):
+    """Top-left (x, y) of every sliding window over the padded image"""
+    return [(x, y)
+            for y in range(0, H_pad - tile_size + 1, stride)
+            for x in range(0, W_pad - tile_size + 1, stride)]
+
+
+def run_sliding_window(image_padded, backend, tile_size=tile_size, stride=stride,
+                       conf_threshold=conf_threshold, cache=None, scene_id=None, preprocessing=None,
+                       windows=None):
+    """
+    Run the detector backend on every tile and collect pre-NMS detections in global coordinates.
+
+    With a DetectionCache, tiles already seen for this scene/model/preprocessing are
+    replayed from the cache instead of being run through the model again. `windows`
+    overrides the dense sliding-window grid (e.g. a tiling_scheduler.TilePlan).
+    """
+    H_pad, W_pad = image_padded.shape[:2]
+    if windows is None:
+        windows = sliding_windows(H_pad, W_pad, tile_size, stride)
+    detections = []
+    with measure("tile_inference", scene=scene_id, items=len(windows)) as m:
+        predict_s = 0.0  # model (or cache replay) time, without tile slicing and record building
+        for x, y in windows:
+            tile = image_padded[y:y+tile_size, x:x+tile_size].copy()
+            started = time.perf_counter()
+            if cache is not None:
+                boxes, scores, class_ids = cache.predict(backend, tile, scene_id, (x, y, tile_size, tile_size),
+                                                         conf_threshold, preprocessing)
+            else:
+                boxes, scores, class_ids = backend.predict(tile, conf_threshold)
+            predict_s += time.perf_counter() - started
+            for (x1, y1, x2, y2), conf, cls in zip(boxes, scores, class_ids):
+                detections.append({
+                    "global_bbox": [float(x1 + x), float(y1 + y), float(x2 + x), float(y2 + y)],
+                    "confidence": float(conf),
+                    "class": backend.names[int(cls)]
+                })
+        m.set(predict_s=round(predict_s, 6), detections=len(detections), backend=backend.kind)
+    return detections
+
+
+def apply_nms(detections, names, conf_threshold=conf_threshold, iou_threshold=iou_threshold, scene_id=None):
+    """Global OpenCV NMS over the pre-NMS detections"""
+    boxes = []
+    confidences = []
+    class_ids = []
+
+    for det in detections:
+        x1, y1, x2, y2 = det["global_bbox"]
+        boxes.append([int(x1), int(y1), int(x2 - x1), int(y2 - y1)])  # x, y, w, h
+        confidences.append(det["confidence"])
+        # map class name back to id
+        class_ids.append(list(names.values()).index(det["class"]))
+
+    with measure("nms", scene=scene_id, items=len(boxes)) as m:
+        indices = cv2.dnn.NMSBoxes(boxes, confidences, score_threshold=conf_threshold, nms_threshold=iou_threshold)
+        m.set(kept=len(indices))
+
+    final_detections = []
+    if len(indices) > 0:
+        for i in np.asarray(indices).flatten():
+            x, y, w, h = boxes[i]
+            final_detections.append({
+                "class": names[class_ids[i]],
+                "confidence": confidences[i],
+                "bbox": [x, y, x + w, y + h]
+            })
+    return final_detections
+
+
+def show_detections(image, final_detections, max_size=2048):
+    """
+    Draw the final detections over the image. `image` may also be a raster_cache.RasterCache
+    of the RGB composite, in which case the plot uses its smallest overview level that is
+    still at least `max_size` px across.
+    """
+    import matplotlib.pyplot as plt
+
+    scale = 1
+    if not isinstance(image, np.ndarray):
+        rgb, scale = image.quicklook(max_size)
+        image = cv2.cvtColor(np.ascontiguousarray(rgb.transpose(1, 2, 0)), cv2.COLOR_RGB2BGR)
+
+    annotated_full = image.copy()
+    for det in final_detections:
+        x1, y1, x2, y2 = (int(v / scale) for v in det['bbox'])
+        cv2.rectangle(annotated_full, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(annotated_full, f"{det['class']}:{det['confidence']:.2f}",
+                    (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+
+    plt.figure(figsize=(12, 12))
+    plt.imshow(cv2.cvtColor(annotated_full, cv2.COLOR_BGR2RGB))
+    plt.axis('off')
+    plt.title("Detections across large image after NMS")
+    plt.show()
+
+
+if __name__ == "__main__":
+    # --------- Load your large image ----------
+    image_path = "/Users/devanshkedia/Desktop/NCCIPC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/RGB_outputs/S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720_RGB.jpg"
+    image = cv2.imread(image_path)
+    H, W, _ = image.shape
+    print(f"Original size: {H}x{W}")
+
+    # --------- Model setup ----------
+    # "torch" runs ultralytics eagerly; "onnx"/"openvino" take an exported graph
+    # (see detector_backends.export_model / compare_backends)
+    backend = load_backend("torch", "/Users/devanshkedia/Desktop/NCCIPC/yolov8s.pt")
+
+    # --------- Pad image globally ----------
+    image_padded = pad_image(image, tile_size, stride)
+    H_pad, W_pad, _ = image_padded.shape
+
+    # --------- Calculate number of sliding windows ----------
+    num_rows = math.ceil((H_pad - tile_size) / stride) + 1
+    num_cols = math.ceil((W_pad - tile_size) / stride) + 1
+    total_windows = num_rows * num_cols
+    print(f"Number of sliding windows along height: {num_rows}")
+    print(f"Number of sliding windows along width: {num_cols}")
+    print(f"Total number of sliding windows: {total_windows}")
+
+    windows = None
+    if adaptive_tiling:
+        from tiling_scheduler import schedule
+        plan = schedule(image_padded, backend, tile_size=tile_size, fine_stride=stride)
+        plan.save(os.path.splitext(image_path)[0] + "_tile_plan.json")
+        windows = plan.windows()
+        print(f"Adaptive tile plan: {plan.summary()}")
+
+    # --------- Sliding window loop ----------
+    # Raw tile outputs are cached, so re-running with another conf/iou threshold skips inference
+    scene_id = os.path.splitext(os.path.basename(image_path))[0]
+    with DetectionCache(os.path.join(os.path.dirname(image_path), "detection_cache.sqlite")) as cache:
+        detections = run_sliding_window(image_padded, backend, tile_size, stride, conf_threshold,
+                                        cache=cache, scene_id=scene_id,
+                                        preprocessing={"tile_size": tile_size, "pad": "constant0"},
+                                        windows=windows)
+        stats = cache.stats()
+    print(f"Total detections before NMS: {len(detections)}")
+    print(f"Tile cache: {stats['hits']} hits / {stats['misses']} misses "
+          f"(hit rate {stats['hit_rate']:.1%}, {stats['bytes'] / 1024**2:.1f} MB)")
+
+    # --------- Apply OpenCV NMS ----------
+    final_detections = apply_nms(detections, backend.names, conf_threshold, iou_threshold, scene_id=scene_id)
+    print(f"Total detections after NMS: {len(final_detections)}")
+
+    # --------- Length / width / heading from image chips ----------
+    final_boxes, final_scores, final_class_ids = records_to_arrays(final_detections, backend.names)
+    geometry = estimate_vessel_geometry(image, final_boxes, pixel_size=pixel_size_m)
+    for det, length, width, heading in zip(final_detections, geometry["length_m"].tolist(),
+                                           geometry["width_m"].tolist(), geometry["heading_deg"].tolist()):
+        det["length_m"] = None if math.isnan(length) else round(length, 1)
+        det["width_m"] = None if math.isnan(width) else round(width, 1)
+        det["heading_deg"] = None if math.isnan(heading) else round(heading, 1)
+
+    # --------- Save detections ----------
+    # Pre/post-NMS dumps use the compact columnar format (detection_format.py); the
+    # post-NMS detections are also exported as JSON for the submission tooling
+    output_dir = os.path.dirname(image_path)
+    scene = {"scene_id": scene_id, "image_name": os.path.basename(image_path), "width": W, "height": H,
+             "tile_size": tile_size, "stride": stride,
+             "conf_threshold": conf_threshold, "iou_threshold": iou_threshold}
+    pre_nms_path = os.path.join(output_dir, "detections_preNMS,S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.mdd")
+    post_nms_path = os.path.join(output_dir, "detections_postNMS,S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.mdd")
+    post_nms_json_path = os.path.join(output_dir, "detections_postNMS,S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.json")
+
+    write_records(pre_nms_path, detections, backend.names, scene, stage="pre_nms")
+    write_detections(post_nms_path, final_boxes, final_scores, final_class_ids, backend.names, scene,
+                     stage="post_nms", bbox_int=True,
+                     extra={key: geometry[key] for key in ("length_m", "width_m", "heading_deg")})
+
+    with open(post_nms_json_path, "w") as f:
+        json.dump(final_detections, f, indent=4)
+
+    print(f"✅ Saved {os.path.basename(pre_nms_path)}, {os.path.basename(post_nms_path)} and "
+          f"{os.path.basename(post_nms_json_path)} to:\n{output_dir}")
+
+    # --------- Timings ----------
+    print(RECORDER.summary())
+    RECORDER.write_jsonl(os.path.join(output_dir, "metrics.jsonl"))
+    RECORDER.write_prometheus(os.path.join(output_dir, "metrics.prom"))
+
+    # --------- Visualization of final detections ----------
+    show_detections(image, final_detections)
@@ -0,0 +1,129 @@
+import functools
+
+import numpy as np
+import pyproj
+
+CORNER_NAMES = ("top_left", "top_right", "bottom_left", "bottom_right")
+
+
+@functools.lru_cache(maxsize=None)
+def _transformer_to_wgs84(crs_wkt):
+    return pyproj.Transformer.from_crs(pyproj.CRS.from_wkt(crs_wkt), "EPSG:4326", always_xy=True)
+
+
+class _GridInterpolator:
+    """Bilinear interpolation of lon/lat over a regular (line, pixel) GCP grid, extrapolating at the edges"""
+
+    def __init__(self, rows, cols, lon, lat):
+        from scipy.interpolate import RegularGridInterpolator
+
+        self.lon = RegularGridInterpolator((rows, cols), lon, bounds_error=False, fill_value=None)
+        self.lat = RegularGridInterpolator((rows, cols), lat, bounds_error=False, fill_value=None)
+
+    def __call__(self, px, py):
+        points = np.column_stack([py, px])
+        return self.lon(points), self.lat(points)
+
+
+class _PolynomialInterpolator:
+    """Least-squares bivariate polynomial fit, used when the GCPs are not on a regular grid"""
+
+    def __init__(self, px, py, lon, lat, degree=3):
+        self.degree = degree
+        self.scale = (max(np.ptp(px), 1.0), max(np.ptp(py), 1.0))
+        A = self._design(px, py)
+        self.lon_coef = np.linalg.lstsq(A, lon, rcond=None)[0]
+        self.lat_coef = np.linalg.lstsq(A, lat, rcond=None)[0]
+
+    def _design(self, px, py):
+        u = np.asarray(px, dtype=np.float64) / self.scale[0]
+        v = np.asarray(py, dtype=np.float64) / self.scale[1]
+        return np.column_stack([u ** i * v ** j
+                                for i in range(self.degree + 1)
+                                for j in range(self.degree + 1 - i)])
+
+    def __call__(self, px, py):
+        A = self._design(px, py)
+        return A @ self.lon_coef, A @ self.lat_coef
+
+
+class SceneGeoreferencer:
+    """
+    Pixel -> WGS84 conversion for one scene, built once and reused for every detection.
+
+    Sentinel-2 bands carry a CRS and affine geotransform; Sentinel-1 GRD measurement
+    TIFFs carry a GCP grid instead, which is fitted once into an interpolator.
+    """
+
+    def __init__(self, width, height, crs_wkt=None, transform=None, gcps=None, gcp_crs_wkt=None):
+        self.width = width
+        self.height = height
+        self.transform = tuple(transform) if transform is not None else None
+        self.crs_wkt = crs_wkt
+        self._transformer = None
+        self._gcp_fit = None
+
+        if self.transform is not None and crs_wkt:
+            self._transformer = _transformer_to_wgs84(crs_wkt)
+        elif gcps:
+            self._gcp_fit = self._fit_gcps(gcps, gcp_crs_wkt)
+        else:
+            raise ValueError("Need either a CRS + geotransform or ground control points")
+
+    @staticmethod
+    def _fit_gcps(gcps, gcp_crs_wkt):
+        """gcps: iterable of (row, col, x, y)"""
+        gcps = np.asarray(gcps, dtype=np.float64).reshape(-1, 4)
+        rows, cols, x, y = gcps.T
+        if gcp_crs_wkt and not pyproj.CRS.from_wkt(gcp_crs_wkt).equals(pyproj.CRS.from_epsg(4326)):
+            x, y = _transformer_to_wgs84(gcp_crs_wkt).transform(x, y)
+            x, y = np.asarray(x), np.asarray(y)
+
+        unique_rows, unique_cols = np.unique(rows), np.unique(cols)
+        if len(unique_rows) * len(unique_cols) == len(gcps) and len(unique_rows) > 1 and len(unique_cols) > 1:
+            order = np.lexsort((cols, rows))
+            shape = (len(unique_rows), len(unique_cols))
+            return _GridInterpolator(unique_rows, unique_cols,
+                                     x[order].reshape(shape), y[order].reshape(shape))
+        return _PolynomialInterpolator(cols, rows, x, y)
+
+    def pixels_to_lonlat(self, px, py):
+        """Vectorized pixel (col, row) -> (lon, lat) arrays"""
+        px = np.asarray(px, dtype=np.float64).ravel()
+        py = np.asarray(py, dtype=np.float64).ravel()
+        if self._gcp_fit is not None:
+            lon, lat = self._gcp_fit(px, py)
+            return np.asarray(lon), np.asarray(lat)
+
+        a, b, c, d, e, f = self.transform
+        x = a * px + b * py + c
+        y = d * px + e * py + f
+        lon, lat = self._transformer.transform(x, y)
+        return np.asarray(lon), np.asarray(lat)
+
+    def georeference_boxes(self, bboxes):
+        """
+        Georeferences an (N, 4) array of xyxy pixel boxes.
+
+        Returns:
+            (centroids, corners): (N, 2) and (N, 4, 2) arrays of [lat, lon]; corners are
+            ordered top_left, top_right, bottom_left, bottom_right.
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        x_min, y_min, x_max, y_max = bboxes.T
+        px = np.stack([(x_min + x_max) / 2.0, x_min, x_max, x_min, x_max], axis=1)
+        py = np.stack([(y_min + y_max) / 2.0, y_min, y_min, y_max, y_max], axis=1)
+        lon, lat = self.pixels_to_lonlat(px, py)
+        points = np.stack([lat, lon], axis=1).reshape(-1, 5, 2)
+        return points[:, 0], points[:, 1:]
+
+    def georeference_detections(self, detections, bbox_key="bbox"):
+        """Adds 'geo_centroid_wgs84' and 'geo_corners_wgs84' ([lat, lon]) to every detection"""
+        centroids, corners = self.georeference_boxes([d[bbox_key] for d in detections])
+        new_detections = []
+        for detection, centroid, corner in zip(detections, centroids.tolist(), corners.tolist()):
+            new_detection = detection.copy()
+            new_detection['geo_centroid_wgs84'] = centroid
+            new_detection['geo_corners_wgs84'] = dict(zip(CORNER_NAMES, corner))
+            new_detections.append(new_detection)
+        return new_detections
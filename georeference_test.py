@@ -0,0 +1,55 @@
+# Georeferencing test script
+# Georeferences the same xyxy boxes through the exact path (SceneGeoreferencer, CRS + geotransform)
+# and the approximate fallback in test.py (image centre + standard tile extent) and checks they agree.
+# Run with: python -m pytest georeference_test.py  (or python georeference_test.py)
+
+import numpy as np
+import pyproj
+
+from georeference import SceneGeoreferencer
+from test import STANDARD_GEO_WIDTH_METERS, georeference_boxes
+
+WIDTH = HEIGHT = 10980
+PIXEL_SIZE = STANDARD_GEO_WIDTH_METERS / WIDTH
+CRS = pyproj.CRS.from_epsg(32620)  # UTM 20N; the tile is centred on its central meridian (500000 E)
+ORIGIN_X, ORIGIN_Y = 500000 - STANDARD_GEO_WIDTH_METERS / 2, 5000000 + STANDARD_GEO_WIDTH_METERS / 2
+
+# far from the image centre and clearly not square, so swapped axes would land kilometres away
+BOXES = np.array([[1000.0, 3000.0, 1100.0, 3050.0],
+                  [8000.0, 500.0, 8040.0, 620.0],
+                  [5480.0, 5480.0, 5500.0, 5500.0]])
+
+
+def exact_georeferencer():
+    return SceneGeoreferencer(WIDTH, HEIGHT, crs_wkt=CRS.to_wkt(),
+                              transform=(PIXEL_SIZE, 0.0, ORIGIN_X, 0.0, -PIXEL_SIZE, ORIGIN_Y))
+
+
+def test_fallback_matches_exact_path():
+    geo = exact_georeferencer()
+    (center_lon,), (center_lat,) = geo.pixels_to_lonlat([WIDTH / 2], [HEIGHT / 2])
+    exact_centroids, exact_corners = geo.georeference_boxes(BOXES)
+    approx_centroids, approx_corners = georeference_boxes(BOXES, center_lon, center_lat, WIDTH, HEIGHT)
+
+    # the fallback ignores projection distortion (up to ~200 m near the tile edge); swapped axes
+    # would put these boxes ~20 km (0.2 deg) off
+    assert np.abs(exact_centroids - approx_centroids).max() < 5e-3, (exact_centroids, approx_centroids)
+    assert np.abs(exact_corners - approx_corners).max() < 5e-3, (exact_corners, approx_corners)
+
+
+def test_boxes_are_xyxy():
+    geo = exact_georeferencer()
+    centroids, corners = geo.georeference_boxes(BOXES[:1])
+    x_min, y_min, x_max, y_max = BOXES[0]
+    lon, lat = geo.pixels_to_lonlat([(x_min + x_max) / 2, x_min, x_max], [(y_min + y_max) / 2, y_min, y_max])
+    assert np.allclose(centroids[0], [lat[0], lon[0]])
+    assert np.allclose(corners[0, 0], [lat[1], lon[1]])  # top_left
+    assert np.allclose(corners[0, 3], [lat[2], lon[2]])  # bottom_right
+    # x grows east, y grows south
+    assert corners[0, 1, 1] > corners[0, 0, 1] and corners[0, 2, 0] < corners[0, 0, 0]
+
+
+if __name__ == "__main__":
+    test_fallback_matches_exact_path()
+    test_boxes_are_xyxy()
+    print("✅ Exact and fallback georeferencing agree on xyxy boxes")
@@ -0,0 +1,321 @@
+"""
+Lightweight timing and resource records for the hot paths.
+
+    with measure("nms", scene=scene_id, items=len(detections)) as m:
+        ...
+        m.set(kept=len(final))
+
+    @timed("band_decode")
+    def decode(...): ...
+
+Each measurement becomes one record in the process-wide RECORDER with the stage,
+scene, wall time, CPU time, item count, the peak RSS so far, and any extra fields.
+`cpu_s` is the CPU time of the measuring thread, so concurrent per-scene
+measurements on a worker pool do not count each other's work and can be summed.
+It misses native threads started by GDAL/OpenCV/torch; `process_cpu_s` (all
+threads) covers those, but is only recorded for measurements that did not overlap
+a measurement in another thread, and is None otherwise.
+Measurements nest, and a record names its enclosing stage as `parent`. The
+overhead is a few microseconds per measurement, so measure per stage or per
+scene, not per tile: inner loops should accumulate a perf_counter total and
+report it with m.set().
+
+Records can be written as JSON lines (write_jsonl) or as a Prometheus text
+exposition (write_prometheus, for node_exporter's textfile collector or a
+pushgateway). SamplingProfiler is an optional stack sampler that writes
+collapsed stacks for flamegraph.pl / speedscope.
+"""
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+
+def peak_rss_bytes():
+    """High-water mark of this process's resident set size"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # bytes on macOS, KiB on Linux
+
+
+class Recorder:
+    """Thread-safe in-memory list of measurement records"""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._running = set()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def _enter(self, measurement):
+        """Track a started measurement; it and any running measurement of another thread overlap"""
+        with self._lock:
+            others = [m for m in self._running if m._thread != measurement._thread]
+            for other in others:
+                other._overlapped = True
+            measurement._overlapped = bool(others)
+            self._running.add(measurement)
+
+    def _exit(self, measurement):
+        with self._lock:
+            self._running.discard(measurement)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def totals(self):
+        """stage -> {calls, wall_s, cpu_s, items, peak_rss_bytes}, summed over scenes (cpu_s is per thread)"""
+        totals = defaultdict(lambda: {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "items": 0, "peak_rss_bytes": 0})
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            total = totals[record["stage"]]
+            total["calls"] += 1
+            total["wall_s"] += record["wall_s"]
+            total["cpu_s"] += record["cpu_s"]
+            total["items"] += record.get("items") or 0
+            total["peak_rss_bytes"] = max(total["peak_rss_bytes"], record["peak_rss_bytes"])
+        return dict(totals)
+
+    def summary(self):
+        """Per-stage table: calls, wall, CPU, items, throughput and peak RSS"""
+        lines = [f"{'stage':<24}{'calls':>7}{'wall s':>10}{'cpu s':>10}{'items':>12}{'items/s':>12}{'peak MB':>9}"]
+        for stage, total in sorted(self.totals().items(), key=lambda item: -item[1]["wall_s"]):
+            rate = total["items"] / total["wall_s"] if total["items"] and total["wall_s"] else 0
+            lines.append(f"{stage:<24}{total['calls']:>7}{total['wall_s']:>10.2f}{total['cpu_s']:>10.2f}"
+                         f"{total['items']:>12}{rate:>12.1f}{total['peak_rss_bytes'] / 2**20:>9.0f}")
+        return "\n".join(lines)
+
+    def write_jsonl(self, path, append=True):
+        """Append (or write) one JSON object per record"""
+        with self._lock:
+            records = list(self.records)
+        with open(path, "a" if append else "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        return len(records)
+
+    def write_prometheus(self, path, prefix="mda"):
+        """
+        Prometheus text exposition of the records, summed per (stage, scene). Written to a
+        temporary file and renamed, as the textfile collector expects.
+        """
+        series = defaultdict(lambda: {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "items": 0})
+        peak = 0
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            labels = (("stage", record["stage"]),) + ((("scene", str(record["scene"])),) if record["scene"] else ())
+            total = series[labels]
+            total["calls"] += 1
+            total["wall_s"] += record["wall_s"]
+            total["cpu_s"] += record["cpu_s"]
+            total["items"] += record.get("items") or 0
+            peak = max(peak, record["peak_rss_bytes"])
+
+        metrics = [
+            ("stage_calls_total", "calls", "Measured calls of a stage"),
+            ("stage_wall_seconds_total", "wall_s", "Wall-clock seconds spent in a stage"),
+            ("stage_cpu_seconds_total", "cpu_s", "CPU seconds of the measuring thread spent in a stage"),
+            ("stage_items_total", "items", "Items (tiles, detections, pixels, points) processed by a stage"),
+        ]
+        lines = []
+        for name, field, help_text in metrics:
+            lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} counter"]
+            for labels, total in series.items():
+                lines.append(f"{prefix}_{name}{_labels(labels)} {total[field]!r}")
+        lines += [f"# HELP {prefix}_peak_rss_bytes Peak resident set size of the process",
+                  f"# TYPE {prefix}_peak_rss_bytes gauge", f"{prefix}_peak_rss_bytes {peak}"]
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+
+def _labels(labels):
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+RECORDER = Recorder()
+
+
+class Measurement:
+    """One running measurement; see measure()"""
+
+    def __init__(self, stage, scene=None, items=None, recorder=None, **fields):
+        self.stage = stage
+        self.scene = scene
+        self.items = items
+        self.fields = fields
+        self.recorder = recorder or RECORDER
+        self.record = None
+
+    def add(self, items=1):
+        self.items = (self.items or 0) + items
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def start(self):
+        stack = self.recorder._stack()
+        self._parent = stack[-1].stage if stack else None
+        stack.append(self)
+        self._thread = threading.get_ident()
+        self.recorder._enter(self)
+        self._started_at = datetime.now(timezone.utc)
+        self._cpu = time.thread_time()
+        self._process_cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def stop(self, items=None, **fields):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        process_cpu = time.process_time() - self._process_cpu
+        self.recorder._exit(self)
+        stack = self.recorder._stack()
+        if self in stack:
+            stack.remove(self)
+        if items is not None:
+            self.items = items
+        self.fields.update(fields)
+        self.record = {
+            "stage": self.stage,
+            "scene": self.scene,
+            "parent": self._parent,
+            "start": self._started_at.isoformat(timespec="milliseconds"),
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "process_cpu_s": None if self._overlapped else round(process_cpu, 6),
+            "items": self.items,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "thread": threading.current_thread().name,
+            **self.fields,
+        }
+        self.recorder.add(self.record)
+        return self.record
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.fields["error"] = f"{exc_type.__name__}: {exc}"
+        self.stop()
+
+
+def measure(stage, scene=None, items=None, **fields):
+    """Context manager recording one measurement of `stage` (for `scene`) into RECORDER"""
+    return Measurement(stage, scene, items, **fields)
+
+
+def start(stage, scene=None, items=None, **fields):
+    """Begin a measurement explicitly, for code that is not a single block; call .stop() on the result"""
+    return Measurement(stage, scene, items, **fields).start()
+
+
+def timed(stage=None, items=None, scene=None):
+    """
+    Decorator measuring every call of a function.
+
+    Parameters:
+        stage (str): Stage name (default: the function name).
+        items (callable): result -> item count.
+        scene (callable): (args, kwargs) -> scene label.
+    """
+    def decorate(func):
+        name = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(name, scene(args, kwargs) if scene else None) as m:
+                result = func(*args, **kwargs)
+                if items is not None:
+                    m.items = items(result)
+                return result
+        return wrapper
+    return decorate
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread samples every thread's Python stack
+    each `interval` seconds. Time inside native code (GDAL, OpenCV, torch) shows up
+    under the Python frame that called it. Cheap enough to leave on for a whole run
+    at the default 10 ms.
+
+        with SamplingProfiler("run.folded"):
+            ...
+        # flamegraph.pl run.folded > run.svg, or open run.folded in speedscope
+    """
+
+    def __init__(self, path=None, interval=0.01):
+        self.path = path
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.path:
+            with open(self.path, "w") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        return self
+
+    def top(self, n=10):
+        """Functions most often on top of a stack: [(function, share of samples), ...]"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(function, count / total) for function, count in leaves.most_common(n)]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
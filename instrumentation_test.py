@@ -0,0 +1,75 @@
+# Instrumentation test script
+# Checks nesting, the JSON lines / Prometheus exports and the sampling profiler, and that
+# concurrent per-scene measurements on a thread pool do not count each other's CPU time.
+# Run with: python -m pytest instrumentation_test.py  (or python instrumentation_test.py)
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from instrumentation import RECORDER, SamplingProfiler, measure, timed
+
+
+@timed("matmul", items=len)
+def matmul(n):
+    a = np.random.default_rng(0).random((n, n))
+    return a @ a
+
+
+def busy_python(n):
+    return sum(i * i for i in range(n))
+
+
+def test_nested_records_and_exports():
+    RECORDER.clear()
+    with SamplingProfiler(interval=0.002) as profiler:
+        with measure("scene", scene="S2A_TEST.SAFE") as m:
+            for _ in range(3):
+                matmul(300)
+            with measure("python_loop", scene="S2A_TEST.SAFE", items=2_000_000):
+                busy_python(2_000_000)
+            m.set(note="demo")
+    print(RECORDER.summary())
+
+    records = {record["stage"]: record for record in RECORDER.records}
+    assert records["matmul"]["parent"] == "scene" and records["matmul"]["items"] == 300
+    assert records["scene"]["wall_s"] >= records["python_loop"]["wall_s"] and records["scene"]["note"] == "demo"
+    # nothing ran alongside, so the process CPU is recorded too
+    assert records["scene"]["process_cpu_s"] >= records["scene"]["cpu_s"] > 0
+    assert any("instrumentation_test.py:busy_python" in stack for stack in profiler.stacks)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        assert RECORDER.write_jsonl(os.path.join(tmp, "metrics.jsonl")) == len(RECORDER.records)
+        RECORDER.write_prometheus(os.path.join(tmp, "metrics.prom"))
+        with open(os.path.join(tmp, "metrics.prom")) as f:
+            prom = f.read()
+    assert 'mda_stage_items_total{stage="python_loop",scene="S2A_TEST.SAFE"} 2000000' in prom
+
+
+def test_concurrent_scenes_do_not_share_cpu():
+    RECORDER.clear()
+
+    def scene(i):
+        with measure("scene", scene=f"S2A_{i}.SAFE"):
+            busy_python(1_000_000)
+
+    cpu = time.process_time()
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(scene, range(4)))
+    used = time.process_time() - cpu
+
+    records = [record for record in RECORDER.records if record["stage"] == "scene"]
+    assert len(records) == 4
+    # each record only holds its own thread's CPU, so the records add up to at most what the process used
+    assert sum(record["cpu_s"] for record in records) <= used * 1.05 + 0.01, (records, used)
+    assert RECORDER.totals()["scene"]["cpu_s"] <= used * 1.05 + 0.01
+    assert all(record["process_cpu_s"] is None for record in records)
+
+
+if __name__ == "__main__":
+    test_nested_records_and_exports()
+    test_concurrent_scenes_do_not_share_cpu()
+    print("✅ Records nest, export and keep per-thread CPU apart")
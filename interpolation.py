@@ -4,6 +4,8 @@ from scipy.interpolate import CubicSpline
 import matplotlib.pyplot as plt
 import os
 
+from instrumentation import RECORDER, start
+
 # ============================================================
 # STEP 1: LOAD DATA
 # ============================================================
@@ -43,6 +45,7 @@ for path_id_to_use in unique_paths:
     print("\n============================================================")
     print(f"Processing Path ID: {path_id_to_use}")
     print("============================================================")
+    timing = start("interpolate_path", scene=str(path_id_to_use))
 
     # ============================================================
     # STEP 2: SELECT PATH_ID
@@ -135,6 +138,7 @@ for path_id_to_use in unique_paths:
     # Interpolate each numeric column
     for col in ["point_latitude", "point_longitude", "speed_on_ground", "course_on_ground"]:
         data[col] = adaptive_interpolation(data[col], timestamps, is_turning)
+    timing.stop(items=len(data), missing=int(original['is_missing'].sum()))
 
     # ============================================================
     # STEP 6: PLOT LAT-LONG TRAJECTORY
@@ -179,3 +183,7 @@ final_df.to_csv(output_path, index=False)
 
 print(f"\n🎯 All Path IDs processed successfully!")
 print(f"✅ Final combined CSV saved to: {output_path}")
+
+# Per-path timings (plots excluded)
+print(RECORDER.summary())
+RECORDER.write_jsonl(os.path.join(os.path.dirname(output_path), "metrics.jsonl"))
@@ -0,0 +1,256 @@
+"""
+The end-to-end workflow as pipeline stages (see pipeline.py).
+
+    converted_csv -> downloads -> scenes -> rgb -> detections -> georeferenced
+        -> predictions (output.json) -> correlation_json -> positions -> ais_matches
+
+The stages call the same functions as the standalone scripts (Data_Pipeline.py,
+3.py, preprocess/rgb_composite, final_json.py, scene_metadata, Json_Format.py,
+correlation.py, correlationJson_to_csv.py, ais_correlation_test.py). Paths come
+from the command line instead of being hardcoded. Detections, positions and AIS
+matches are passed in memory, and only the files the submission needs are written
+to work_dir. rgb, detections and georeferenced run per scene, in parallel. Every
+stage is cached under work_dir/.pipeline_cache, so a rerun after adding a scene
+only processes that scene and redoes the cheap aggregate stages.
+
+Timings of every stage and of the hot paths inside them (band decoding, tile
+inference, NMS, AIS correlation) are printed at the end; --metrics and
+--prometheus export them, and --profile samples the stacks of every thread into a
+collapsed-stack file for a flame graph.
+
+Detection runs on the EO true-colour composites, as final_json.py does; SAR scenes
+stay in the CSV/JSON bookkeeping but get no detections here.
+
+Usage:
+    python mda_pipeline.py Imagery_details_for_vessel_detection_and_AIS_correlation.csv copernicus_data \\
+        --work-dir work --weights yolov8s.pt --ais-csv ais_with_locations.csv --workers 4
+"""
+import argparse
+import functools
+import importlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+from Data_Pipeline import convert_eo_sar_csv
+from Json_Format import write_json_from_folders
+from correlation import filter_correlation_images
+from instrumentation import RECORDER, SamplingProfiler
+from pipeline import Pipeline
+from product_store import ProductStore
+from scene_catalogue import DB_NAME, SceneCatalogue
+from scene_metadata import SceneMetadataCache
+
+# The detector is shared by the scene threads; model inference is serialized (the
+# backends are not thread-safe and already use every core), decoding and
+# georeferencing of other scenes carry on meanwhile
+_inference_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _catalogue(work_dir):
+    os.makedirs(work_dir, exist_ok=True)
+    return SceneCatalogue(os.path.join(work_dir, DB_NAME))
+
+
+def corners_to_wkt(corners):
+    """POLYGON WKT (lon lat order, closed) from geo_corners_wgs84 ([lat, lon] per corner)"""
+    ring = [corners[name] for name in ("top_left", "top_right", "bottom_right", "bottom_left", "top_left")]
+    return "POLYGON((" + ", ".join(f"{lon!r} {lat!r}" for lat, lon in ring) + "))"
+
+
+def converted_csv(imagery_csv, work_dir):
+    path = os.path.join(work_dir, "converted_output.csv")
+    convert_eo_sar_csv(imagery_csv, path, catalogue=_catalogue(work_dir))
+    return path
+
+
+def downloads(converted_csv, data_dir, credentials, work_dir):
+    """Fetch and convert missing products with 3.py's downloader; without credentials, use what is on disk"""
+    if credentials:
+        downloader_module = importlib.import_module("3")
+        # rgb and georeferenced read the JP2 bands, so they are extracted rather than read from the zip
+        downloader = downloader_module.CopernicusDownloader(credentials["client_id"], credentials["client_secret"],
+                                                            keep_sources=True)
+        catalogue = _catalogue(work_dir)
+        catalogue.load_csv(converted_csv)
+        downloader.process_image_list(catalogue.image_list(converted_csv), output_dir=data_dir, max_workers=4)
+    return data_dir
+
+
+def scenes(downloads, converted_csv, work_dir):
+    """SAFE folders of the CSV's EO scenes, directly under data_dir or inside the product store"""
+    catalogue = _catalogue(work_dir)
+    catalogue.load_csv(converted_csv)
+    store = ProductStore(downloads)
+    folders = []
+    for scene in catalogue.scenes(kind="EO", csv_path=converted_csv):
+        for folder in (os.path.join(downloads, scene["image_name"]),
+                       os.path.join(store.product_dir(scene["image_name"]), scene["image_name"])):
+            if os.path.isdir(folder):
+                folders.append(folder)
+                break
+    return folders
+
+
+def rgb(scene, rgb_dir):
+    from preprocess import OUTPUT_NAME, find_img_data_dirs
+    from rgb_composite import RGB_BANDS, compose_rgb, rgb_band_files
+
+    for img_data_path in find_img_data_dirs(scene):
+        band_paths = rgb_band_files(img_data_path)
+        if None not in band_paths.values():
+            break
+    else:
+        raise FileNotFoundError(f"No IMG_DATA folder with B02/B03/B04 in {scene}")
+    output_path = os.path.join(rgb_dir, os.path.basename(scene), OUTPUT_NAME)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    compose_rgb({band: band_paths[band] for band in RGB_BANDS}, output_path)
+    return output_path
+
+
+def detector(backend_kind, weights):
+    from detector_backends import load_backend
+    return load_backend(backend_kind, weights)
+
+
+def detections(scene, rgb, detector, tile_size, stride, conf_threshold, iou_threshold):
+    """Post-NMS detections of one scene, as final_json.py produces them"""
+    import cv2
+    from final_json import apply_nms, pad_image, run_sliding_window
+
+    image = cv2.imread(rgb)
+    image_padded = pad_image(image, tile_size, stride)
+    scene_id = os.path.basename(scene)
+    with _inference_lock:
+        pre_nms = run_sliding_window(image_padded, detector, tile_size, stride, conf_threshold, scene_id=scene_id)
+    return apply_nms(pre_nms, detector.names, conf_threshold, iou_threshold, scene_id=scene_id)
+
+
+def georeferenced(scene, detections, work_dir):
+    metadata_cache = SceneMetadataCache(os.path.join(work_dir, "scene_metadata.sqlite"))
+    try:
+        return metadata_cache.georeferencer(scene).georeference_detections(detections)
+    finally:
+        metadata_cache.close()
+
+
+def predictions(georeferenced, data_dir, converted_csv, participant_name, work_dir):
+    """output.json for every scene, streamed to disk"""
+    bbox_input = [
+        {"image_name": os.path.basename(scene),
+         "bboxes": [{"bbox": corners_to_wkt(d["geo_corners_wgs84"]), "score": d["confidence"]}
+                    for d in scene_detections]}
+        for scene, scene_detections in georeferenced.items()
+    ]
+    output_path = os.path.join(work_dir, "output.json")
+    write_json_from_folders(output_path, data_dir, converted_csv, bbox_input, participant_name,
+                            catalogue=_catalogue(work_dir))
+    return output_path
+
+
+def correlation_json(predictions, converted_csv, work_dir):
+    output_path = os.path.join(work_dir, "output_correlation.json")
+    filter_correlation_images(predictions, converted_csv, output_path, catalogue=_catalogue(work_dir))
+    return output_path
+
+
+def positions(correlation_json):
+    """Detections to correlate (timestamp, lat, lon, image_name), kept in memory"""
+    from correlationJson_to_csv import correlation_frame
+    return correlation_frame(correlation_json)
+
+
+def ais_matches(positions, ais_csv, work_dir):
+    from ais_correlation_test import correlate_scenes_to_ais
+
+    located = positions.dropna(subset=["lat", "lon"])
+    if located.empty:
+        matches = pd.DataFrame(columns=["sl_no", "time_stamp", "image_name", "vessel_latitude",
+                                        "vessel_longitude", "mmsi"])
+    else:
+        matches = correlate_scenes_to_ais(located.to_dict("records"), pd.read_csv(ais_csv))
+    matches.to_csv(os.path.join(work_dir, "ais_correlation.csv"), index=False)
+    return matches
+
+
+def build_pipeline(work_dir, workers=4, use_hash=False):
+    pipeline = Pipeline(os.path.join(work_dir, ".pipeline_cache"), workers=workers, use_hash=use_hash)
+    for func in (converted_csv, downloads, scenes, predictions, correlation_json, positions, ais_matches):
+        pipeline.add(func)
+    pipeline.add(detector, persist=False)
+    for func in (rgb, detections, georeferenced):
+        pipeline.add(func, per_scene=True)
+    return pipeline
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the maritime workflow with cached, per-scene parallel stages")
+    parser.add_argument("imagery_csv", help="Imagery CSV (sectioned original or converted_output.csv)")
+    parser.add_argument("data_dir", help="Folder holding (or receiving) the SAFE folders")
+    parser.add_argument("--work-dir", default="work", help="Outputs and stage cache")
+    parser.add_argument("--rgb-dir", help="RGB composites (default: <work-dir>/rgb)")
+    parser.add_argument("--weights", default="yolov8s.pt")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "openvino"])
+    parser.add_argument("--ais-csv", default="ais_with_locations.csv")
+    parser.add_argument("--participant", default="YourName")
+    parser.add_argument("--credentials", help="JSON file with client_id/client_secret to download missing scenes")
+    parser.add_argument("--tile-size", type=int, default=640)
+    parser.add_argument("--stride", type=int, default=128)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.0000005)
+    parser.add_argument("--workers", type=int, default=4, help="Scenes processed in parallel")
+    parser.add_argument("--hash", action="store_true", help="Fingerprint files by content instead of mtime")
+    parser.add_argument("--force", nargs="*", help="Recompute these stages (all if none are named)")
+    parser.add_argument("--targets", nargs="*", default=["ais_matches"])
+    parser.add_argument("--report", help="Write per-stage/per-scene status and timings as JSON lines")
+    parser.add_argument("--metrics", help="Append the stage and hot-path measurements as JSON lines")
+    parser.add_argument("--prometheus", help="Write the measurements in Prometheus text format "
+                                             "(e.g. into node_exporter's textfile directory)")
+    parser.add_argument("--profile", help="Sample all threads' stacks into this collapsed-stack file")
+    args = parser.parse_args()
+
+    credentials = None
+    if args.credentials:
+        with open(args.credentials) as f:
+            credentials = json.load(f)
+
+    profiler = SamplingProfiler(args.profile).start() if args.profile else None
+    pipeline = build_pipeline(args.work_dir, args.workers, args.hash)
+    results = pipeline.run(
+        args.targets,
+        force=True if args.force == [] else args.force,
+        imagery_csv=args.imagery_csv,
+        data_dir=args.data_dir,
+        work_dir=args.work_dir,
+        rgb_dir=args.rgb_dir or os.path.join(args.work_dir, "rgb"),
+        credentials=credentials,
+        backend_kind=args.backend,
+        weights=args.weights,
+        tile_size=args.tile_size,
+        stride=args.stride,
+        conf_threshold=args.conf,
+        iou_threshold=args.iou,
+        participant_name=args.participant,
+        ais_csv=args.ais_csv,
+    )
+    if profiler:
+        profiler.stop()
+        print("Most sampled functions: " + ", ".join(f"{name} {share:.0%}" for name, share in profiler.top(5)))
+    if args.report:
+        with open(args.report, "w") as f:
+            for entry in pipeline.report:
+                f.write(json.dumps(entry) + "\n")
+    counts = {status: sum(e["status"] == status for e in pipeline.report)
+              for status in ("computed", "cached", "failed", "skipped")}
+    print(f"✅ {counts['computed']} computed, {counts['cached']} from cache, "
+          f"{counts['failed']} failed, {counts['skipped']} skipped")
+    print(RECORDER.summary())
+    if args.metrics:
+        RECORDER.write_jsonl(args.metrics)
+    if args.prometheus:
+        RECORDER.write_prometheus(args.prometheus)
+    if "ais_matches" in results:
+        print(results["ais_matches"].to_string(index=False))
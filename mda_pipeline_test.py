@@ -0,0 +1,92 @@
+# End-to-end pipeline test script
+# Runs mda_pipeline from the imagery CSV to the AIS matches with a stand-in for 3.py's
+# downloader (it lays the scene out as the product store does: data/S2A_<sha1[:8]>/<name>.SAFE)
+# and a stand-in detector, so no network, weights or GDAL are needed.
+# Run with: python -m pytest mda_pipeline_test.py  (or python mda_pipeline_test.py)
+
+import json
+import os
+import sys
+import tempfile
+import types
+
+import numpy as np
+import pandas as pd
+
+import mda_pipeline
+from scene_catalogue_test import STORE_SCENE, make_store_scene, write_converted_csv
+
+
+class FakeDownloader:
+    """Stand-in for 3.py's CopernicusDownloader; records its options and 'downloads' into the store layout"""
+    created = []
+
+    def __init__(self, client_id, client_secret, keep_sources=False, keep_zip=False, **kwargs):
+        self.keep_sources = keep_sources
+        FakeDownloader.created.append(self)
+
+    def process_image_list(self, image_list, output_dir, max_workers=4):
+        # with keep_sources=False the bands are read from the zip, which is deleted after conversion
+        if self.keep_sources:
+            for item in image_list:
+                make_store_scene(output_dir, item["image_name"])
+
+
+class FakeBackend:
+    """One 'ship' per tile, at a fixed spot in the tile"""
+    kind = "fake"
+    names = {0: "ship"}
+
+    def predict(self, tile, conf_threshold):
+        return np.array([[10.0, 12.0, 20.0, 30.0]]), np.array([0.9]), np.array([0])
+
+
+def fake_detector(backend_kind, weights):
+    return FakeBackend()
+
+
+def run_pipeline(tmp):
+    work_dir, data_dir = os.path.join(tmp, "work"), os.path.join(tmp, "data")
+    os.makedirs(data_dir)
+    csv_path = os.path.join(tmp, "converted_output.csv")
+    write_converted_csv(csv_path, [STORE_SCENE], correlate=[STORE_SCENE])
+    ais_csv = os.path.join(tmp, "ais.csv")
+    pd.DataFrame({"timestamp": ["2024-09-04T15:17:00"], "lat": [45.12], "lon": [-63.5], "mmsi": [123456789]}) \
+        .to_csv(ais_csv, index=False)
+
+    pipeline = mda_pipeline.build_pipeline(work_dir, workers=2)
+    pipeline.stages["detector"].func = fake_detector
+    results = pipeline.run(
+        ["ais_matches"], imagery_csv=csv_path, data_dir=data_dir, work_dir=work_dir,
+        rgb_dir=os.path.join(work_dir, "rgb"), credentials={"client_id": "id", "client_secret": "secret"},
+        backend_kind="fake", weights="none", tile_size=32, stride=32, conf_threshold=0.25,
+        iou_threshold=0.5, participant_name="test", ais_csv=ais_csv,
+    )
+    return pipeline, results, work_dir, data_dir
+
+
+def test_store_layout_end_to_end():
+    sys.modules["3"] = types.SimpleNamespace(CopernicusDownloader=FakeDownloader)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            pipeline, results, work_dir, data_dir = run_pipeline(tmp)
+            failed = [entry for entry in pipeline.report if entry["status"] in ("failed", "skipped")]
+            assert not failed, failed
+            assert FakeDownloader.created[-1].keep_sources
+
+            with open(os.path.join(work_dir, "output.json")) as f:
+                output = json.load(f)
+            assert [image["file_name"] for image in output["images"]] == [STORE_SCENE], output["images"]
+            assert (output["images"][0]["width"], output["images"][0]["height"]) == (64, 48)
+            assert output["annotations"], "no detections reached output.json"
+            with open(os.path.join(work_dir, "output_correlation.json")) as f:
+                assert [image["file_name"] for image in json.load(f)["images"]] == [STORE_SCENE]
+            matches = results["ais_matches"]
+            assert len(matches) == len(output["annotations"]) and set(matches["image_name"]) == {STORE_SCENE}
+    finally:
+        sys.modules.pop("3", None)
+
+
+if __name__ == "__main__":
+    test_store_layout_end_to_end()
+    print("✅ Downloaded store-layout scene went through every stage into output.json and the AIS matches")
@@ -0,0 +1,401 @@
+"""
+In-process DAG runner with memoized stages.
+
+A stage is a plain function registered on a Pipeline; its parameter names are its
+inputs, and each input is either another stage's output or a value passed to
+Pipeline.run. Stages run in dependency order and hand their results to each other
+in memory. Each result is also pickled into cache_dir under a key derived from
+the stage's source code, its version and the content fingerprints of its inputs,
+so a rerun only recomputes stages whose inputs (or code) changed. A stage whose
+inputs were recomputed but came out identical is not rerun either.
+
+Fingerprints hash values by content. A string that names an existing file is
+hashed by the file's size and mtime (or its sha256 with use_hash). A string that
+names a directory is hashed the same way over every file below it when it is a
+stage result (e.g. a download folder or a scene). As a run() parameter it is just a
+location (e.g. work_dir) and is hashed as the string. A cached result that refers
+to files is also invalid once those files change or disappear.
+
+Every computed stage call is also recorded in instrumentation.RECORDER (wall and CPU
+time, peak RSS), with the measurements taken inside the stage nested under it.
+
+Per-scene stages (per_scene=True) run once for every item of the scene list (the
+output of the stage or parameter named by `scenes`), on a thread pool, and are
+cached per scene. Inside such a stage the `scene` parameter is the current item,
+and inputs produced by other per-scene stages are that scene's value. Anywhere else
+a per-scene output is a {scene: value} dict. A scene that fails is reported and
+left out of downstream per-scene stages; the other scenes carry on.
+
+Usage:
+    pipeline = Pipeline("work/.pipeline_cache")
+
+    @pipeline.stage()
+    def scenes(data_dir):
+        return sorted(os.path.join(data_dir, d) for d in os.listdir(data_dir))
+
+    @pipeline.stage(per_scene=True)
+    def detections(scene, weights):
+        ...
+
+    results = pipeline.run(data_dir="copernicus_data", weights="yolov8s.pt")
+"""
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from instrumentation import measure
+
+
+def _path_signature(path, use_hash=False):
+    """size + mtime of a file (sha256 instead of mtime with use_hash)"""
+    stat = os.stat(path)
+    if not use_hash:
+        return [stat.st_size, stat.st_mtime_ns]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return [stat.st_size, digest.hexdigest()]
+
+
+def path_signature(path, use_hash=False):
+    """Signature of a file, or of every file under a directory; None if the path is gone"""
+    if os.path.isfile(path):
+        return _path_signature(path, use_hash)
+    if os.path.isdir(path):
+        signature = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                signature.append([os.path.relpath(full, path)] + _path_signature(full, use_hash))
+        return signature
+    return None
+
+
+class _Fingerprint:
+    """Content hash of a value, collecting the signatures of the paths it refers to"""
+
+    def __init__(self, use_hash=False, directories=True):
+        self.use_hash = use_hash
+        self.directories = directories
+        self.digest = hashlib.sha256()
+        self.paths = {}
+
+    def _put(self, tag, data=b""):
+        self.digest.update(tag.encode() + b":" + str(len(data)).encode() + b":" + data)
+
+    def update(self, value):
+        if isinstance(value, str) and value and (os.path.isfile(value) or
+                                                 (self.directories and os.path.isdir(value))):
+            path = os.path.abspath(value)
+            signature = self.paths.setdefault(path, path_signature(path, self.use_hash))
+            self._put("path", json.dumps([value, signature]).encode())
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            self._put("json", json.dumps(value).encode())
+        elif isinstance(value, (list, tuple)):
+            self._put(type(value).__name__, str(len(value)).encode())
+            for item in value:
+                self.update(item)
+        elif isinstance(value, dict):
+            self._put("dict", str(len(value)).encode())
+            for key in sorted(value, key=repr):
+                self.update(key)
+                self.update(value[key])
+        elif isinstance(value, np.ndarray):
+            self._put("ndarray", json.dumps([value.dtype.str, value.shape]).encode())
+            self._put("data", np.ascontiguousarray(value).tobytes())
+        elif type(value).__module__.startswith("pandas"):
+            import pandas as pd
+            self._put(type(value).__name__,
+                      pickle.dumps(list(value.columns) if isinstance(value, pd.DataFrame) else value.name))
+            self._put("data", pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        else:
+            self._put("pickle", pickle.dumps(value))
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def fingerprint(value, use_hash=False, directories=True):
+    """
+    Content hash of a value. directories=False hashes directory paths as plain strings.
+
+    Returns:
+        (hexdigest, paths): paths maps every file/directory the value names to its
+        signature at the time of hashing.
+    """
+    fp = _Fingerprint(use_hash, directories)
+    fp.update(value)
+    return fp.hexdigest(), fp.paths
+
+
+class Stage:
+    """A registered stage: the function plus how it is wired and cached"""
+
+    def __init__(self, func, name, inputs, per_scene=False, persist=True, version=1):
+        self.func = func
+        self.name = name
+        self.inputs = inputs
+        self.per_scene = per_scene
+        self.persist = persist
+        self.version = version
+        try:
+            source = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = func.__qualname__
+        self.code_hash = hashlib.sha256(source.encode()).hexdigest()
+
+    def key(self, input_fingerprints, scene_fingerprint=None):
+        payload = json.dumps({
+            "stage": self.name,
+            "version": self.version,
+            "code": self.code_hash,
+            "inputs": input_fingerprints,
+            "scene": scene_fingerprint,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StageCache:
+    """Pickled stage results under cache_dir/<stage>/<key>.pkl, with a JSON sidecar of fingerprints"""
+
+    def __init__(self, cache_dir, use_hash=False):
+        self.cache_dir = cache_dir
+        self.use_hash = use_hash
+
+    def _path(self, stage, key, extension):
+        return os.path.join(self.cache_dir, stage, key + extension)
+
+    def lookup(self, stage, key):
+        """Stored fingerprint of a result, or None if absent or if any file it names has changed"""
+        try:
+            with open(self._path(stage, key, ".json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._path(stage, key, ".pkl")):
+            return None
+        for path, signature in meta["paths"].items():
+            if path_signature(path, self.use_hash) != signature:
+                return None
+        return meta["fingerprint"]
+
+    def load(self, stage, key):
+        with open(self._path(stage, key, ".pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def store(self, stage, key, value, fp, paths):
+        os.makedirs(os.path.join(self.cache_dir, stage), exist_ok=True)
+        for extension, mode, write in ((".pkl", "wb", lambda f: pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)),
+                                       (".json", "w", lambda f: json.dump({"fingerprint": fp, "paths": paths}, f))):
+            path = self._path(stage, key, extension)
+            with open(path + ".tmp", mode) as f:
+                write(f)
+            os.replace(path + ".tmp", path)
+
+
+class Pipeline:
+    """
+    Registry of stages plus the runner.
+
+    Parameters:
+        cache_dir (str): Where stage results are persisted (None disables persistence).
+        workers (int): Scenes processed in parallel by per-scene stages.
+        scenes (str): Name of the stage or run() parameter holding the scene list.
+        use_hash (bool): Fingerprint files by sha256 instead of size + mtime.
+    """
+
+    def __init__(self, cache_dir=".pipeline_cache", workers=4, scenes="scenes", use_hash=False):
+        self.cache = StageCache(cache_dir, use_hash) if cache_dir else None
+        self.workers = workers
+        self.scenes = scenes
+        self.use_hash = use_hash
+        self.stages = {}
+        self.report = []
+        self._scene_fingerprints = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name=None, per_scene=False, persist=True, version=1):
+        """
+        Decorator registering a function as a stage named after it (or `name`). Bump
+        `version` when the result changes for reasons the function's own source does not
+        show (e.g. a library it calls changed). persist=False keeps the result in memory
+        only (for values that cannot be pickled, such as a loaded model).
+        """
+        def register(func):
+            self.add(func, name, per_scene, persist, version)
+            return func
+        return register
+
+    def add(self, func, name=None, per_scene=False, persist=True, version=1):
+        name = name or func.__name__
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+        inputs = [p for p in inspect.signature(func).parameters if not (per_scene and p == "scene")]
+        self.stages[name] = Stage(func, name, inputs, per_scene, persist, version)
+        return self.stages[name]
+
+    def _plan(self, targets, params):
+        """Stages needed for targets, in dependency order"""
+        order, visiting, done = [], set(), set()
+
+        def visit(name, needed_by):
+            if name in done or (name in params and name not in self.stages):
+                return
+            if name not in self.stages:
+                raise ValueError(f"'{name}' (needed by {needed_by}) is neither a stage nor a run() parameter")
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage '{name}'")
+            visiting.add(name)
+            stage = self.stages[name]
+            for input_name in stage.inputs + ([self.scenes] if stage.per_scene else []):
+                visit(input_name, name)
+            visiting.discard(name)
+            done.add(name)
+            order.append(stage)
+
+        for target in targets:
+            visit(target, "run()")
+        return order
+
+    def run(self, targets=None, force=False, **params):
+        """
+        Run the stages needed for `targets` (default: every stage) with the given
+        parameters, reusing cached results whose inputs are unchanged.
+
+        Parameters:
+            targets (list): Stage names whose results are wanted.
+            force (bool or iterable): Recompute every stage (True) or the named ones.
+
+        Returns:
+            dict: stage name -> result, for the targets. Per-stage (and per-scene) status
+            and timings are left in self.report.
+        """
+        targets = list(targets or self.stages)
+        force = set(self.stages) if force is True else set(force or ())
+        self.report = []
+        self._scene_fingerprints = {}
+        fingerprints = {name: fingerprint(value, self.use_hash, directories=False)[0]
+                        for name, value in params.items()}
+        values = dict(params)
+        loaders = {}  # stage name -> (scene or None) -> key of a cached result not yet loaded
+
+        def value_of(name, scene=None):
+            stage = self.stages.get(name)
+            if stage is not None and stage.per_scene:
+                per_scene = values.setdefault(name, {})
+                if scene is not None:
+                    if scene not in per_scene:
+                        per_scene[scene] = self.cache.load(name, loaders[name].pop(scene))
+                    return per_scene[scene]
+                for pending_scene in list(loaders.get(name, {})):
+                    per_scene[pending_scene] = self.cache.load(name, loaders[name].pop(pending_scene))
+                return {s: per_scene[s] for s in value_of(self.scenes) if s in per_scene}
+            if name not in values:
+                values[name] = self.cache.load(name, loaders[name].pop(None))
+            return values[name]
+
+        for stage in self._plan(targets, params):
+            start = time.perf_counter()
+            if stage.per_scene:
+                self._run_per_scene(stage, stage.name in force, fingerprints, loaders, values, value_of)
+                continue
+            input_fingerprints = {name: fingerprints[name] for name in stage.inputs}
+            key = stage.key(input_fingerprints)
+            cached = self.cache.lookup(stage.name, key) if self.cache and stage.persist else None
+            if cached is not None and stage.name not in force:
+                fingerprints[stage.name] = cached
+                loaders.setdefault(stage.name, {})[None] = key
+                self._log(stage.name, None, "cached", start)
+                continue
+            kwargs = {name: value_of(name) for name in stage.inputs}
+            with measure(stage.name):
+                value = stage.func(**kwargs)
+            values[stage.name] = value
+            if stage.persist:
+                fp, paths = fingerprint(value, self.use_hash)
+                if self.cache:
+                    self.cache.store(stage.name, key, value, fp, paths)
+            else:
+                fp = key
+            fingerprints[stage.name] = fp
+            self._log(stage.name, None, "computed", start)
+
+        return {name: value_of(name) for name in targets}
+
+    def _run_per_scene(self, stage, force, fingerprints, loaders, values, value_of):
+        scenes = value_of(self.scenes)
+        scene_inputs = [name for name in stage.inputs
+                        if name in self.stages and self.stages[name].per_scene]
+        shared = {name: fingerprints[name] for name in stage.inputs if name not in scene_inputs}
+        scene_fingerprints = {}
+        todo = []
+        for scene in scenes:
+            start = time.perf_counter()
+            upstream = {name: fingerprints[name].get(scene) for name in scene_inputs}
+            if any(fp is None for fp in upstream.values()):
+                self._log(stage.name, scene, "skipped", start, error="upstream stage failed")
+                continue
+            if scene not in self._scene_fingerprints:
+                self._scene_fingerprints[scene] = fingerprint(scene, self.use_hash)[0]
+            scene_fp = self._scene_fingerprints[scene]
+            key = stage.key(dict(shared, **upstream), scene_fp)
+            cached = self.cache.lookup(stage.name, key) if self.cache and stage.persist else None
+            if cached is not None and not force:
+                scene_fingerprints[scene] = cached
+                loaders.setdefault(stage.name, {})[scene] = key
+                self._log(stage.name, scene, "cached", start)
+            else:
+                todo.append((scene, key))
+
+        def compute(task):
+            scene, key = task
+            start = time.perf_counter()
+            try:
+                kwargs = {name: value_of(name, scene) if name in scene_inputs else value_of(name)
+                          for name in stage.inputs}
+                with measure(stage.name, scene=os.path.basename(str(scene))):
+                    value = stage.func(scene=scene, **kwargs)
+            except Exception as e:
+                self._log(stage.name, scene, "failed", start, error=str(e))
+                return scene, None, None
+            if stage.persist:
+                fp, paths = fingerprint(value, self.use_hash)
+                if self.cache:
+                    self.cache.store(stage.name, key, value, fp, paths)
+            else:
+                fp = key
+            self._log(stage.name, scene, "computed", start)
+            return scene, value, fp
+
+        if todo:
+            # load shared inputs once, before the threads start
+            for name in stage.inputs:
+                if name not in scene_inputs:
+                    value_of(name)
+            per_scene = values.setdefault(stage.name, {})
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(todo)))) as pool:
+                for scene, value, fp in pool.map(compute, todo):
+                    if fp is not None:
+                        per_scene[scene] = value
+                        scene_fingerprints[scene] = fp
+        fingerprints[stage.name] = scene_fingerprints
+
+    def _log(self, stage, scene, status, start, error=None):
+        entry = {"stage": stage, "scene": scene, "status": status, "seconds": time.perf_counter() - start}
+        if error:
+            entry["error"] = error
+        label = stage if scene is None else f"{stage} [{os.path.basename(str(scene))}]"
+        with self._lock:
+            self.report.append(entry)
+            # one write per line, so lines from scene threads do not interleave
+            sys.stdout.write(f"{status:>9}  {entry['seconds']:7.1f}s  {label}" + (f"  ({error})" if error else "") + "\n")
@@ -0,0 +1,76 @@
+# Pipeline test script
+# Runs a three-stage DAG over three scenes (one of which fails) several times and checks
+# which stages are recomputed: only failed scenes are retried, a changed scene and its
+# dependants are recomputed, and everything else comes from the cache.
+# Run with: python -m pytest pipeline_test.py  (or python pipeline_test.py)
+
+import os
+import tempfile
+
+from pipeline import Pipeline
+
+
+def build(tmp, calls):
+    pipeline = Pipeline(os.path.join(tmp, "cache"), workers=3)
+
+    @pipeline.stage()
+    def scenes(data_dir):
+        return sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir))
+
+    @pipeline.stage(per_scene=True)
+    def decoded(scene):
+        calls.append(("decoded", os.path.basename(scene)))
+        with open(os.path.join(scene, "band.txt")) as f:
+            text = f.read()
+        if text.startswith("c"):
+            raise ValueError("corrupt band")
+        return text.upper()
+
+    @pipeline.stage(per_scene=True)
+    def counted(scene, decoded, letter):
+        calls.append(("counted", os.path.basename(scene)))
+        return decoded.count(letter.upper())
+
+    @pipeline.stage()
+    def total(counted):
+        calls.append(("total", None))
+        return sum(counted.values())
+
+    return pipeline
+
+
+def write_band(data_dir, name, text):
+    os.makedirs(os.path.join(data_dir, name), exist_ok=True)
+    with open(os.path.join(data_dir, name, "band.txt"), "w") as f:
+        f.write(text)
+
+
+def test_incremental_reruns():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, "data")
+        for name in ("a", "b", "c"):
+            write_band(data_dir, name, name * 3)
+        calls = []
+        pipeline = build(tmp, calls)
+
+        assert pipeline.run(["total"], data_dir=data_dir, letter="a") == {"total": 3}
+        assert {entry["status"] for entry in pipeline.report} >= {"computed", "failed", "skipped"}
+
+        calls.clear()
+        assert pipeline.run(["total"], data_dir=data_dir, letter="a") == {"total": 3}
+        assert calls == [("decoded", "c")], calls  # only the failed scene is retried
+
+        calls.clear()
+        write_band(data_dir, "b", "bab")
+        assert pipeline.run(["total"], data_dir=data_dir, letter="a") == {"total": 4}
+        assert sorted(calls) == [("counted", "b"), ("decoded", "b"), ("decoded", "c"), ("total", None)], calls
+
+        calls.clear()
+        result = pipeline.run(["counted"], data_dir=data_dir, letter="b")
+        assert result["counted"] == {os.path.join(data_dir, "a"): 0, os.path.join(data_dir, "b"): 2}
+        assert sorted(calls) == [("counted", "a"), ("counted", "b"), ("decoded", "c")], calls
+
+
+if __name__ == "__main__":
+    test_incremental_reruns()
+    print("✅ Unchanged scenes come from the cache, changed ones and their dependants are recomputed")
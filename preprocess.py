@@ -0,0 +1,160 @@
+"""
+Parallel RGB preprocessing for every IMG_DATA folder under a dataset root.
+
+Scenes run on a process pool; inside each scene the three bands are decoded on
+threads. A JSON manifest in the output folder records the inputs each output was
+built from (size + mtime, or content hash with --hash), so unchanged scenes are
+skipped on rerun. With --cache each composite is also stored as a raster cache with
+an overview pyramid (RGB_image.rc) for quicklooks and coarse screening.
+
+Usage:
+    python preprocess.py "EO data" "EO to RGB" --processes 4
+    python preprocess.py "EO data" "EO to RGB" --hash --force
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from rgb_composite import RGB_BANDS, compose_rgb, rgb_band_files
+
+MANIFEST_NAME = "preprocess_manifest.json"
+OUTPUT_NAME = "RGB_image.png"
+CACHE_NAME = "RGB_image.rc"
+
+
+def find_img_data_dirs(base_dir):
+    return sorted(root for root, _, _ in os.walk(base_dir) if "IMG_DATA" in root)
+
+
+def file_signature(path, use_hash=False):
+    """size + mtime of a file, plus its sha256 when use_hash is set"""
+    stat = os.stat(path)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if use_hash:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        signature = {"size": stat.st_size, "sha256": digest.hexdigest()}
+    return signature
+
+
+class Manifest:
+    """output path -> signatures of the inputs and parameters it was built from"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def is_current(self, output, inputs, params, use_hash=False):
+        entry = self.entries.get(output)
+        if entry is None or not os.path.exists(output) or entry.get("params") != params:
+            return False
+        if set(entry["inputs"]) != set(inputs):
+            return False
+        return all(entry["inputs"][path] == file_signature(path, use_hash) for path in inputs)
+
+    def record(self, output, inputs, params, use_hash=False):
+        self.entries[output] = {
+            "inputs": {path: file_signature(path, use_hash) for path in inputs},
+            "params": params,
+        }
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def process_scene(task):
+    """Worker: composite one IMG_DATA folder. Runs in a child process."""
+    img_data_path, output_path, block_rows, band_threads, cache_path = task
+    report = {"scene": img_data_path, "output": output_path}
+    start = time.perf_counter()
+    try:
+        band_paths = rgb_band_files(img_data_path)
+        if None in band_paths.values():
+            report["status"] = "missing_bands"
+        else:
+            timings = {}
+            compose_rgb({band: band_paths[band] for band in RGB_BANDS}, output_path,
+                        block_rows=block_rows, workers=band_threads, timings=timings, cache_path=cache_path)
+            report.update(timings)
+            report["status"] = "done"
+    except Exception as e:
+        report["status"] = "failed"
+        report["error"] = str(e)
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+
+def run_preprocessing(base_dir, output_dir, processes=None, band_threads=3, block_rows=1024,
+                      use_hash=False, force=False, cache=False):
+    """
+    Composite every scene under base_dir into output_dir (mirroring its folder layout).
+
+    Returns:
+        list[dict]: one report per scene with status ('done', 'skipped', 'missing_bands',
+        'failed') and timings in seconds.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    params = {"block_rows": block_rows, "percentiles": [2, 98], "cache": cache}
+
+    reports, tasks, task_inputs = [], [], {}
+    for img_data_path in find_img_data_dirs(base_dir):
+        scene_dir = os.path.join(output_dir, os.path.relpath(img_data_path, base_dir))
+        output_path = os.path.join(scene_dir, OUTPUT_NAME)
+        cache_path = os.path.join(scene_dir, CACHE_NAME) if cache else None
+        inputs = sorted(p for p in rgb_band_files(img_data_path).values() if p)
+        if not force and manifest.is_current(output_path, inputs, params, use_hash) \
+                and (cache_path is None or os.path.exists(cache_path)):
+            reports.append({"scene": img_data_path, "output": output_path, "status": "skipped", "seconds": 0.0})
+            continue
+        task_inputs[output_path] = inputs
+        tasks.append((img_data_path, output_path, block_rows, band_threads, cache_path))
+
+    start = time.perf_counter()
+    if tasks:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for report in pool.map(process_scene, tasks):
+                reports.append(report)
+                if report["status"] == "done":
+                    manifest.record(report["output"], task_inputs[report["output"]], params, use_hash)
+                    manifest.save()
+                print(f"{report['status']:>13}  {report['seconds']:7.1f}s  {report['scene']}"
+                      + (f"  ({report['error']})" if "error" in report else ""))
+
+    done = [r for r in reports if r["status"] == "done"]
+    print(f"✅ {len(done)} built, {sum(r['status'] == 'skipped' for r in reports)} up to date, "
+          f"{sum(r['status'] in ('failed', 'missing_bands') for r in reports)} not built "
+          f"in {time.perf_counter() - start:.1f}s")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel RGB preprocessing with up-to-date checks")
+    parser.add_argument("base_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--processes", type=int, default=None, help="Scenes in parallel (default: CPU count)")
+    parser.add_argument("--band-threads", type=int, default=3, help="Band decode threads per scene")
+    parser.add_argument("--block-rows", type=int, default=1024)
+    parser.add_argument("--hash", action="store_true", help="Compare input content hashes instead of mtimes")
+    parser.add_argument("--force", action="store_true", help="Rebuild everything")
+    parser.add_argument("--cache", action="store_true", help="Also write a raster cache with overviews per scene")
+    parser.add_argument("--report", help="Write per-scene reports as JSON lines")
+    args = parser.parse_args()
+
+    reports = run_preprocessing(args.base_dir, args.output_dir, args.processes, args.band_threads,
+                                args.block_rows, args.hash, args.force, args.cache)
+    if args.report:
+        with open(args.report, "w") as f:
+            for report in reports:
+                f.write(json.dumps(report) + "\n")
@@ -0,0 +1,104 @@
+"""
+Local store for downloaded Copernicus products.
+
+Each product gets a directory whose name is derived from the product name alone
+(platform prefix + first 8 hex digits of its SHA-1), so the same product lands in
+the same place on every run and on every machine. product_index.json next to those
+directories records how far each product has got (searched -> downloaded ->
+extracted -> converted) together with its catalogue entry and output paths, which
+lets a rerun skip every stage that already finished.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+STATES = ("searched", "downloaded", "extracted", "converted")
+INDEX_NAME = "product_index.json"
+
+
+def product_key(product_name):
+    """Stable short directory name for a product, e.g. S2A_MSIL1C_..._T20TMP.SAFE -> S2A_3f9c01ab"""
+    name = product_name[:-5] if product_name.endswith(".SAFE") else product_name
+    return name.split('_')[0][:20] + '_' + hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+
+
+class ProductStore:
+    """Deterministic product directories plus a JSON index of their processing state"""
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, INDEX_NAME)
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def product_dir(self, product_name):
+        return os.path.join(self.root, product_key(product_name))
+
+    def zip_path(self, product_name):
+        return os.path.join(self.root, f"{product_name}.zip")
+
+    def get(self, product_name):
+        return self.entries.get(product_name, {})
+
+    def product(self, product_name):
+        """Catalogue entry recorded at search time, or None"""
+        return self.get(product_name).get("product")
+
+    def state(self, product_name):
+        """Furthest stage reached whose outputs are still on disk, or None"""
+        entry = self.get(product_name)
+        state = entry.get("state")
+        if state == "converted" and not all(os.path.exists(p) for p in entry.get("outputs", [])):
+            state = "extracted"
+        if state == "extracted" and not all(
+                os.path.exists(self.zip_path(product_name) if source.startswith("/vsizip/") else source)
+                for source, _ in entry.get("sources", [])):
+            state = "downloaded"
+        if state == "downloaded" and not os.path.exists(self.zip_path(product_name)):
+            state = "searched"
+        return state
+
+    def reached(self, product_name, state):
+        current = self.state(product_name)
+        return current is not None and STATES.index(current) >= STATES.index(state)
+
+    def mark(self, product_name, state, **fields):
+        """
+        Record that product_name reached `state`. Extra fields are stored with it: product
+        (catalogue entry), sources ((source, local_path) pairs) and outputs (paths that must
+        exist for 'converted' to count).
+        """
+        if state not in STATES:
+            raise ValueError(f"Unknown state {state!r}, expected one of {STATES}")
+        with self._lock:
+            entry = self.entries.setdefault(product_name, {"dir": product_key(product_name)})
+            entry.update(fields)
+            entry["state"] = state
+            entry[f"{state}_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            self._save()
+
+    def mark_missing(self, product_name):
+        """Record that the catalogue has no product of this name (at this time)"""
+        with self._lock:
+            entry = self.entries.setdefault(product_name, {"dir": product_key(product_name)})
+            entry["missing_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            self._save()
+
+    def missing_for(self, product_name):
+        """Seconds since the catalogue last reported product_name missing (inf if never)"""
+        missing_at = self.get(product_name).get("missing_at")
+        if missing_at is None:
+            return float("inf")
+        return (datetime.now(timezone.utc) - datetime.fromisoformat(missing_at)).total_seconds()
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,33 @@
+# Product store test script
+# Checks that product states survive a reload of the index and fall back when the
+# outputs they vouch for disappear.
+# Run with: python -m pytest product_store_test.py  (or python product_store_test.py)
+
+import os
+import tempfile
+
+from product_store import ProductStore, product_key
+
+NAME = "S2A_MSIL1C_20240904T151651_N0511_R025_T20TMP_20240904T221000.SAFE"
+
+
+def test_product_key_is_deterministic():
+    assert product_key(NAME) == product_key(NAME[:-len(".SAFE")]) and product_key(NAME).startswith("S2A_")
+    assert product_key(NAME) != product_key(NAME.replace("S2A", "S2B"))
+
+
+def test_states_survive_reload_and_fall_back():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ProductStore(tmp)
+        store.mark(NAME, "searched", product={"Id": "abc", "Name": NAME})
+        open(store.zip_path(NAME), "wb").close()
+        store.mark(NAME, "downloaded")
+        assert ProductStore(tmp).reached(NAME, "downloaded") and not ProductStore(tmp).reached(NAME, "extracted")
+        os.remove(store.zip_path(NAME))
+        assert ProductStore(tmp).state(NAME) == "searched"
+
+
+if __name__ == "__main__":
+    test_product_key_is_deterministic()
+    test_states_survive_reload_and_fall_back()
+    print("✅ States survive a reload and fall back when outputs disappear")
@@ -0,0 +1,457 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+# File layout (little-endian):
+#   8 bytes   magic b"MDARC\x00\x00\x01" (last byte = format version)
+#   ...       chunks of every level, in the order they were produced; each is a
+#             compressed (or raw) 2D block
+#   ...       JSON header (shape, dtype, chunk size, codec, metadata, chunk index
+#             of the full-resolution level and of each 2x overview level)
+#   8 bytes   uint64 offset of the JSON header
+#   4 bytes   uint32 length of the JSON header
+#   8 bytes   magic again
+#
+# The header goes last so a band and its overview pyramid can be written in one
+# streaming pass of row strips. Chunks are chunk x chunk pixels (clipped at the
+# right/bottom edges) and are addressed individually through the index, so a
+# window read only decodes the chunks it touches.
+
+MAGIC = b"MDARC\x00\x00\x01"
+EXTENSION = ".rc"
+_FOOTER = struct.Struct("<QI")
+
+
+def _codec(name, level=None):
+    """(compress, decompress) for a codec name; lz4/zstd are used only if installed"""
+    if name == "none":
+        return bytes, bytes
+    if name == "zlib":
+        level = 1 if level is None else level
+        return (lambda data: zlib.compress(data, level)), zlib.decompress
+    if name == "lz4":
+        import lz4.frame
+
+        return (lambda data: lz4.frame.compress(data, compression_level=level or 0)), lz4.frame.decompress
+    if name == "zstd":
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        decompressor = zstandard.ZstdDecompressor()
+        return compressor.compress, decompressor.decompress
+    raise ValueError(f"Unknown codec '{name}' (expected none, zlib, lz4 or zstd)")
+
+
+def best_codec():
+    """Fastest codec available here: lz4, then zstd, then zlib"""
+    for name, module in (("lz4", "lz4.frame"), ("zstd", "zstandard")):
+        try:
+            __import__(module)
+            return name
+        except ImportError:
+            pass
+    return "zlib"
+
+
+def _shuffle(block):
+    """Group the bytes of each sample by significance; compresses uint16 imagery much better"""
+    if block.dtype.itemsize == 1:
+        return block.tobytes()
+    return np.ascontiguousarray(block).view(np.uint8).reshape(-1, block.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if dtype.itemsize > 1:
+        raw = raw.reshape(dtype.itemsize, -1).T.copy()
+    return raw.view(dtype).reshape(shape)
+
+
+def downsample2(rows, resampling="average"):
+    """
+    Halve (count, n, w) rows in both directions. Odd edges repeat their last row/column;
+    integer averages are rounded half up.
+    """
+    count, n, w = rows.shape
+    if n % 2 or w % 2:
+        rows = np.pad(rows, ((0, 0), (0, n % 2), (0, w % 2)), mode="edge")
+    blocks = rows.reshape(count, rows.shape[1] // 2, 2, rows.shape[2] // 2, 2)
+    if resampling == "max":
+        return blocks.max(axis=(2, 4))
+    if resampling != "average":
+        raise ValueError(f"Unknown resampling '{resampling}' (expected average or max)")
+    if rows.dtype.kind in "ui":
+        total = blocks.sum(axis=(2, 4), dtype=np.int64)
+        return ((total + 2) // 4).astype(rows.dtype)
+    return blocks.mean(axis=(2, 4)).astype(rows.dtype)
+
+
+def overview_count(width, height, chunk):
+    """Number of 2x levels until the whole raster fits in one chunk"""
+    levels = 0
+    while max(width, height) > chunk:
+        width, height = -(-width // 2), -(-height // 2)
+        levels += 1
+    return levels
+
+
+class _LevelWriter:
+    """Chunk grid of one pyramid level; flushed chunk rows are downsampled into the next level"""
+
+    def __init__(self, writer, factor, width, height, next_level=None):
+        self.writer = writer
+        self.factor = factor
+        self.width = width
+        self.height = height
+        self.next = next_level
+        self.chunks_x = -(-width // writer.chunk)
+        self.chunks_y = -(-height // writer.chunk)
+        self.index = np.zeros((writer.count, self.chunks_y, self.chunks_x, 2), dtype=np.int64)
+        self.buffer = np.empty((writer.count, writer.chunk, width), dtype=writer.dtype)
+        self.buffered = 0
+        self.chunk_row = 0
+
+    def write_rows(self, rows):
+        chunk = self.writer.chunk
+        start = 0
+        while start < rows.shape[1]:
+            take = min(chunk - self.buffered, rows.shape[1] - start)
+            self.buffer[:, self.buffered:self.buffered + take] = rows[:, start:start + take]
+            self.buffered += take
+            start += take
+            if self.buffered == chunk:
+                self.flush()
+
+    def flush(self):
+        if self.buffered == 0:
+            return
+        if self.chunk_row >= self.chunks_y:
+            raise ValueError(f"More than {self.height} rows written")
+        writer, chunk = self.writer, self.writer.chunk
+        rows = self.buffer[:, :self.buffered]
+        for band in range(writer.count):
+            for cx in range(self.chunks_x):
+                self.index[band, self.chunk_row, cx] = writer._write_chunk(rows[band, :, cx * chunk:(cx + 1) * chunk])
+        if self.next is not None:
+            self.next.write_rows(downsample2(rows, writer.resampling))
+        self.chunk_row += 1
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        if self.chunk_row != self.chunks_y:
+            raise ValueError(f"Wrote {min(self.chunk_row * self.writer.chunk, self.height)} of {self.height} "
+                             f"rows at overview factor {self.factor}")
+        if self.next is not None:
+            self.next.close()
+
+
+class RasterCacheWriter:
+    """
+    Streams a raster into the cache format, building its overview pyramid on the way.
+
+    Rows are fed in any strip height via write_rows(); whenever a full row of
+    chunks is buffered it is compressed and written out, and its 2x downsample is
+    fed to the next overview level. Memory stays at about one chunk row per level.
+
+    Parameters:
+        path (str): Output file.
+        width, height (int): Raster size.
+        dtype: Pixel type.
+        count (int): Number of bands.
+        chunk (int): Chunk edge in pixels.
+        codec (str): 'zlib' (default), 'lz4', 'zstd' or 'none'.
+        metadata (dict): Free-form JSON metadata (source path, CRS WKT, affine transform
+            (a, b, c, d, e, f), ...).
+        overviews (int): Number of 2x overview levels; None builds levels until the
+            coarsest fits in one chunk, 0 disables them.
+        resampling (str): 'average' (quicklooks) or 'max' (keeps small bright targets).
+    """
+
+    def __init__(self, path, width, height, dtype, count=1, chunk=512, codec="zlib", level=None,
+                 shuffle=True, metadata=None, overviews=None, resampling="average"):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.dtype = np.dtype(dtype)
+        self.count = count
+        self.chunk = chunk
+        self.codec = codec
+        self.shuffle = shuffle and codec != "none"
+        self.metadata = metadata or {}
+        self.resampling = resampling
+        self._compress = _codec(codec, level)[0]
+
+        if overviews is None:
+            overviews = overview_count(width, height, chunk)
+        sizes = [(width, height)]
+        for _ in range(overviews):
+            sizes.append((-(-sizes[-1][0] // 2), -(-sizes[-1][1] // 2)))
+        self.levels = []
+        next_level = None
+        for i in reversed(range(len(sizes))):
+            next_level = _LevelWriter(self, 2 ** i, *sizes[i], next_level=next_level)
+            self.levels.insert(0, next_level)
+
+        self._tmp_path = path + ".partial"
+        self.file = open(self._tmp_path, "wb")
+        self.file.write(MAGIC)
+
+    def _write_chunk(self, block):
+        raw = _shuffle(block) if self.shuffle else np.ascontiguousarray(block).tobytes()
+        data = self._compress(raw)
+        offset = self.file.tell()
+        self.file.write(data)
+        return offset, len(data)
+
+    def write_rows(self, rows):
+        """Append the next rows: (n, width) for one band or (count, n, width)"""
+        rows = np.asarray(rows)
+        if rows.ndim == 2:
+            rows = rows[None]
+        if rows.shape[0] != self.count or rows.shape[2] != self.width:
+            raise ValueError(f"Expected ({self.count}, n, {self.width}) rows, got {rows.shape}")
+        self.levels[0].write_rows(rows)
+
+    def close(self):
+        try:
+            self.levels[0].close()
+        except ValueError:
+            self.abort()
+            raise
+        self._write_header()
+        self.file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def _header(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "count": self.count,
+            "dtype": self.dtype.str,
+            "chunk": self.chunk,
+            "codec": self.codec,
+            "shuffle": self.shuffle,
+            "metadata": self.metadata,
+            "resampling": self.resampling,
+            "index": self.levels[0].index.reshape(-1).tolist(),
+            "overviews": [{"factor": level.factor, "width": level.width, "height": level.height,
+                           "index": level.index.reshape(-1).tolist()} for level in self.levels[1:]],
+        }
+
+    def _write_header(self):
+        header_bytes = json.dumps(self._header()).encode("utf-8")
+        offset = self.file.tell()
+        self.file.write(header_bytes)
+        self.file.write(_FOOTER.pack(offset, len(header_bytes)))
+        self.file.write(MAGIC)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class RasterCache:
+    """
+    Window reader for a raster cache file.
+
+    read(level, window) decodes only the chunks of that pyramid level that overlap
+    the window; recently used decoded chunks are kept in a small LRU so overlapping
+    detection tiles share work. Uncompressed caches are served straight from a memory map.
+    """
+
+    def __init__(self, path, cache_chunks=64):
+        import mmap
+
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC or self._mmap[-len(MAGIC):] != MAGIC:
+            raise ValueError(f"{path} is not a raster cache file")
+        offset, length = _FOOTER.unpack_from(self._mmap, len(self._mmap) - len(MAGIC) - _FOOTER.size)
+        self.header = json.loads(self._mmap[offset:offset + length].decode("utf-8"))
+
+        self.width = self.header["width"]
+        self.height = self.header["height"]
+        self.count = self.header["count"]
+        self.dtype = np.dtype(self.header["dtype"])
+        self.chunk = self.header["chunk"]
+        self.codec = self.header["codec"]
+        self.shuffle = self.header["shuffle"]
+        self.metadata = self.header["metadata"]
+
+        # level 0 is full resolution; level k is downsampled by factor 2**k
+        self._levels = []
+        for entry in [{"factor": 1, "width": self.width, "height": self.height, "index": self.header["index"]}] \
+                + self.header.get("overviews", []):
+            chunks_y = -(-entry["height"] // self.chunk)
+            chunks_x = -(-entry["width"] // self.chunk)
+            index = np.asarray(entry["index"], dtype=np.int64).reshape(self.count, chunks_y, chunks_x, 2)
+            self._levels.append((entry["factor"], entry["width"], entry["height"], index))
+
+        self._decompress = _codec(self.codec)[1]
+        self._lru = OrderedDict()
+        self._lru_size = cache_chunks
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return (self.height, self.width) if self.count == 1 else (self.count, self.height, self.width)
+
+    @property
+    def levels(self):
+        """Number of stored levels, including full resolution"""
+        return len(self._levels)
+
+    def level_size(self, level):
+        """(width, height) of a pyramid level"""
+        return self._levels[level][1:3]
+
+    def level_factor(self, level):
+        return self._levels[level][0]
+
+    def level_for(self, factor=None, max_size=None):
+        """
+        Coarsest level whose downsampling factor is <= `factor`, or whose longest side
+        is still >= `max_size` (for quicklooks). With neither, level 0.
+        """
+        best = 0
+        for level, (level_factor, width, height, _) in enumerate(self._levels):
+            if factor is not None and level_factor <= factor:
+                best = level
+            elif max_size is not None and max(width, height) >= max_size:
+                best = level
+        return best
+
+    def read_chunk(self, band, cy, cx, level=0):
+        """Decoded chunk (band is 0-based)"""
+        key = (level, band, cy, cx)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+
+        _, width, height, index = self._levels[level]
+        offset, length = index[band, cy, cx]
+        shape = (min(self.chunk, height - cy * self.chunk), min(self.chunk, width - cx * self.chunk))
+        if self.codec == "none":
+            return np.frombuffer(self._mmap, dtype=self.dtype, count=shape[0] * shape[1],
+                                 offset=int(offset)).reshape(shape)
+
+        data = self._decompress(self._mmap[offset:offset + length])
+        if self.shuffle:
+            block = _unshuffle(data, self.dtype, shape)
+        else:
+            block = np.frombuffer(data, dtype=self.dtype).reshape(shape)
+        with self._lock:
+            self._lru[key] = block
+            if len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+        return block
+
+    def read(self, level=0, window=None, bands=None, fill_value=0):
+        """
+        Pixels of a window at one pyramid level, decoding only the chunks it overlaps.
+
+        Parameters:
+            level (int): 0 for full resolution, k for the 2**k overview.
+            window (tuple): (x, y, width, height) in that level's pixels; None reads the
+                whole level. Parts outside the raster are filled with `fill_value`.
+            bands (list): 0-based band indices; default all.
+
+        Returns:
+            array: (height, width) for single-band caches, otherwise (bands, height, width).
+        """
+        _, width, height, _ = self._levels[level]
+        x, y, w, h = window if window is not None else (0, 0, width, height)
+        band_list = list(range(self.count)) if bands is None else list(bands)
+        out = np.full((len(band_list), h, w), fill_value, dtype=self.dtype)
+
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, width), min(y + h, height)
+        if x0 < x1 and y0 < y1:
+            c = self.chunk
+            for cy in range(y0 // c, (y1 - 1) // c + 1):
+                for cx in range(x0 // c, (x1 - 1) // c + 1):
+                    # overlap of this chunk with the window, in level pixels
+                    top, bottom = max(y0, cy * c), min(y1, (cy + 1) * c)
+                    left, right = max(x0, cx * c), min(x1, (cx + 1) * c)
+                    for i, band in enumerate(band_list):
+                        block = self.read_chunk(band, cy, cx, level)
+                        out[i, top - y:bottom - y, left - x:right - x] = \
+                            block[top - cy * c:bottom - cy * c, left - cx * c:right - cx * c]
+        return out[0] if self.count == 1 and bands is None else out
+
+    def quicklook(self, max_size=1024):
+        """Smallest stored level with its longest side >= max_size, as (image, factor)"""
+        level = self.level_for(max_size=max_size)
+        return self.read(level), self.level_factor(level)
+
+    def close(self):
+        self._lru.clear()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def cache_path_for(path):
+    """Cache file next to a source raster: B04.jp2 -> B04.rc"""
+    return os.path.splitext(path)[0] + EXTENSION
+
+
+def write_array(path, array, chunk=512, codec="zlib", strip_rows=None, metadata=None, overviews=None):
+    """Write an in-memory (H, W) or (bands, H, W) array to a cache file"""
+    array = np.asarray(array)
+    bands = array if array.ndim == 3 else array[None]
+    count, height, width = bands.shape
+    strip_rows = strip_rows or chunk
+    with RasterCacheWriter(path, width, height, array.dtype, count, chunk, codec, metadata=metadata,
+                           overviews=overviews) as writer:
+        for top in range(0, height, strip_rows):
+            writer.write_rows(bands[:, top:top + strip_rows])
+    return path
+
+
+def convert_raster(src_path, dst_path=None, chunk=512, codec="zlib", strip_rows=None, overviews=None):
+    """
+    Convert a GDAL-readable raster (JP2, GeoTIFF) into a cache file, reading strips of
+    full-width rows so the whole band is never decoded at once.
+    """
+    import rasterio
+    from rasterio.windows import Window
+
+    dst_path = dst_path or cache_path_for(src_path)
+    strip_rows = strip_rows or chunk
+    with rasterio.open(src_path) as src:
+        metadata = {
+            "source": os.path.abspath(src_path),
+            "crs": src.crs.to_wkt() if src.crs else None,
+            "transform": list(src.transform)[:6],
+        }
+        with RasterCacheWriter(dst_path, src.width, src.height, src.dtypes[0], src.count, chunk, codec,
+                               metadata=metadata, overviews=overviews) as writer:
+            for top in range(0, src.height, strip_rows):
+                rows = min(strip_rows, src.height - top)
+                writer.write_rows(src.read(window=Window(0, top, src.width, rows)))
+    return dst_path
@@ -0,0 +1,234 @@
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from raster_cache import RasterCacheWriter
+
+RGB_BANDS = ("B04", "B03", "B02")
+
+
+def rgb_band_files(img_data_path):
+    """B02/B03/B04 .jp2 paths in an IMG_DATA folder; None for any band that is missing"""
+    band_files = {band: None for band in ("B02", "B03", "B04")}
+    for file in sorted(os.listdir(img_data_path)):
+        if file.endswith('.jp2'):
+            for band in band_files:
+                if band in file:
+                    band_files[band] = os.path.join(img_data_path, file)
+    return band_files
+
+
+def _linear_virtual_index(n, quantiles):
+    """numpy's own 'linear' virtual index formula, so percentiles match np.percentile bit for bit"""
+    try:
+        from numpy.lib._function_base_impl import _QuantileMethods  # numpy >= 2.0
+    except ImportError:
+        try:
+            from numpy.lib.function_base import _QuantileMethods
+        except ImportError:
+            return (n - 1) * quantiles
+    return _QuantileMethods["linear"]["get_virtual_index"](n, quantiles)
+
+
+def _lerp(a, b, t):
+    """Same two-sided interpolation as numpy's quantile _lerp"""
+    diff_b_a = b - a
+    return np.where(t >= 0.5, b - diff_b_a * (1 - t), a + diff_b_a * t)
+
+
+def row_blocks(height, block_rows):
+    for top in range(0, height, block_rows):
+        yield top, min(block_rows, height - top)
+
+
+def band_histogram(path, block_rows=1024):
+    """
+    Exact value histogram of an integer band, read in full-width row blocks.
+
+    Returns:
+        (hist, offset): counts per value, with hist[i] counting value i + offset.
+    """
+    with rasterio.open(path) as src:
+        dtype = np.dtype(src.dtypes[0])
+        if dtype.kind not in "ui" or dtype.itemsize > 2:
+            raise TypeError(f"Histogram stretch needs an 8/16-bit integer band, got {dtype} in {path}")
+        offset = int(np.iinfo(dtype).min)
+        hist = np.zeros(int(np.iinfo(dtype).max) - offset + 1, dtype=np.int64)
+        for top, rows in row_blocks(src.height, block_rows):
+            block = src.read(1, window=Window(0, top, src.width, rows))
+            values = block.ravel().astype(np.int64) - offset if offset else block.ravel()
+            hist += np.bincount(values, minlength=len(hist))
+    return hist, offset
+
+
+def histogram_percentiles(hist, percentiles=(2, 98), offset=0):
+    """
+    np.percentile(data, percentiles) computed from a value histogram of `data`,
+    using the same virtual index, neighbour selection and interpolation as numpy's
+    default 'linear' method.
+    """
+    cdf = np.cumsum(hist)
+    n = int(cdf[-1])
+    if n == 0:
+        raise ValueError("Empty histogram")
+
+    q = np.true_divide(percentiles, 100)
+    virtual = np.asanyarray(_linear_virtual_index(n, q))
+    previous = np.floor(virtual)
+    following = previous + 1
+    above = virtual >= n - 1
+    previous[above] = following[above] = n - 1
+    below = virtual < 0
+    previous[below] = following[below] = 0
+    gamma = virtual - np.where(above, -1, previous)
+
+    def order_statistic(k):
+        # value of the k-th smallest sample (0-based)
+        return np.searchsorted(cdf, k.astype(np.int64), side="right").astype(np.float64) + offset
+
+    return _lerp(order_statistic(previous), order_statistic(following), gamma)
+
+
+def stretch_lut(low, high, offset=0, size=65536):
+    """
+    Lookup table of the 2-98% stretch for every integer value: the same float64
+    clip/scale/cast as the original per-pixel normalisation, evaluated once per value.
+    """
+    values = np.arange(size, dtype=np.float64) + offset
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return ((np.clip(values, low, high) - low) / (high - low) * 255).astype(np.uint8)
+
+
+class PNGStreamWriter:
+    """Writes an 8-bit RGB PNG row block by row block, so the full image is never held in memory"""
+
+    def __init__(self, path, width, height, compression=6, chunk_bytes=1 << 20):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.chunk_bytes = chunk_bytes
+        self._compressor = zlib.compressobj(compression)
+        self._pending = []
+        self._pending_bytes = 0
+        self.file = open(path, "wb")
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def _emit(self, data):
+        if data:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+        if self._pending_bytes >= self.chunk_bytes:
+            self._chunk(b"IDAT", b"".join(self._pending))
+            self._pending, self._pending_bytes = [], 0
+
+    def write_rows(self, rgb):
+        """rgb: (rows, width, 3) uint8"""
+        rows = np.ascontiguousarray(rgb, dtype=np.uint8).reshape(-1, self.width * 3)
+        filtered = np.zeros((len(rows), self.width * 3 + 1), dtype=np.uint8)  # filter byte 0 = None
+        filtered[:, 1:] = rows
+        self._emit(self._compressor.compress(filtered.tobytes()))
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.rows_written != self.height:
+            self.file.close()
+            raise ValueError(f"Wrote {self.rows_written} of {self.height} rows")
+        self._emit(self._compressor.flush())
+        if self._pending:
+            self._chunk(b"IDAT", b"".join(self._pending))
+        self._chunk(b"IEND", b"")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+
+def compose_rgb(band_paths, output_path, block_rows=1024, percentiles=(2, 98), workers=3, timings=None,
+                cache_path=None):
+    """
+    Two-pass block-wise true-colour composite.
+
+    Pass 1 builds an exact histogram per band and derives the 2/98 percentiles from it;
+    pass 2 maps each row block through a per-band lookup table and streams it to the PNG.
+    Peak memory is a few row blocks, independent of scene size, and the pixels are
+    identical to stretching the full float64 bands with np.percentile. The three bands
+    are decoded on `workers` threads (GDAL releases the GIL while decoding).
+
+    Parameters:
+        band_paths (dict): 'B04', 'B03', 'B02' -> raster paths (red, green, blue).
+        output_path (str): PNG to write.
+        timings (dict): If given, receives 'histogram_s' and 'stretch_s'.
+        cache_path (str): Also stream the composite into a 3-band raster cache with
+            overview pyramid (see raster_cache), for quicklooks and coarse screening.
+
+    Returns:
+        dict: band -> (low, high) stretch limits.
+    """
+    timings = {} if timings is None else timings
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        start = time.perf_counter()
+        limits, luts = {}, {}
+        histograms = pool.map(lambda band: band_histogram(band_paths[band], block_rows), RGB_BANDS)
+        for band, (hist, offset) in zip(RGB_BANDS, histograms):
+            low, high = histogram_percentiles(hist, percentiles, offset)
+            limits[band] = (float(low), float(high))
+            luts[band] = (stretch_lut(low, high, offset, len(hist)), offset)
+        timings["histogram_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sources = [rasterio.open(band_paths[band]) for band in RGB_BANDS]
+        try:
+            width, height = sources[0].width, sources[0].height
+            if any((src.width, src.height) != (width, height) for src in sources):
+                raise ValueError("RGB bands differ in size")
+
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            cache = None
+            if cache_path:
+                metadata = {"source": {band: os.path.abspath(band_paths[band]) for band in RGB_BANDS},
+                            "crs": sources[0].crs.to_wkt() if sources[0].crs else None,
+                            "transform": list(sources[0].transform)[:6], "limits": limits}
+                cache = RasterCacheWriter(cache_path, width, height, np.uint8, count=3, metadata=metadata)
+            with PNGStreamWriter(output_path, width, height) as png:
+                block = np.empty((block_rows, width, 3), dtype=np.uint8)
+                for top, rows in row_blocks(height, block_rows):
+                    window = Window(0, top, width, rows)
+
+                    def fill(channel):
+                        lut, offset = luts[RGB_BANDS[channel]]
+                        data = sources[channel].read(1, window=window)
+                        block[:rows, :, channel] = lut[data.astype(np.int64) - offset if offset else data]
+
+                    list(pool.map(fill, range(3)))
+                    png.write_rows(block[:rows])
+                    if cache is not None:
+                        cache.write_rows(block[:rows].transpose(2, 0, 1))
+            if cache is not None:
+                cache.close()
+                cache = None
+        finally:
+            if cache is not None:
+                cache.abort()
+            for src in sources:
+                src.close()
+        timings["stretch_s"] = time.perf_counter() - start
+    return limits
@@ -0,0 +1,86 @@
+"""
+Member-filtered access to downloaded SAFE zips.
+
+Only the members the pipeline uses are touched: the B02/B03/B04 JP2s of a Sentinel-2
+product, and the measurement TIFFs of a Sentinel-1 product plus their calibration
+XMLs. Stored (uncompressed) members are read in place through GDAL's /vsizip/
+path; deflated ones are streamed out one at a time, since random access into a
+deflated member means re-inflating it from the start.
+"""
+import os
+import re
+import shutil
+import zipfile
+
+COPY_BUFFER = 8 * 1024 * 1024
+
+_EO_BAND = re.compile(r"/IMG_DATA/(?:R10m/)?[^/]*_(B0[234])(?:_10m)?\.jp2$")
+_SAR_MEASUREMENT = re.compile(r"/measurement/[^/]+\.tiff?$")
+_SAR_CALIBRATION = re.compile(r"/annotation/calibration/calibration-[^/]+\.xml$")
+
+
+def select_members(names, product_name):
+    """
+    Members of a SAFE zip the pipeline needs.
+
+    Returns:
+        (rasters, auxiliary): member names of the rasters to convert, and of the small
+        files (calibration XMLs) their processing reads from disk.
+    """
+    names = ["/" + name for name in names if not name.endswith("/")]
+    if product_name.startswith("S1"):
+        rasters = [n for n in names if _SAR_MEASUREMENT.search(n)]
+        auxiliary = [n for n in names if _SAR_CALIBRATION.search(n)]
+    elif product_name.startswith("S2"):
+        rasters = [n for n in names if _EO_BAND.search(n)]
+        auxiliary = []
+    else:
+        rasters, auxiliary = [], []
+    return sorted(n[1:] for n in rasters), sorted(n[1:] for n in auxiliary)
+
+
+def gdal_path(zip_path, member):
+    """GDAL virtual path of a member inside a zip"""
+    return f"/vsizip/{os.path.abspath(zip_path)}/{member}"
+
+
+def readable_in_place(info):
+    """Stored members can be read with random access straight from the zip"""
+    return info.compress_type == zipfile.ZIP_STORED
+
+
+def extract_member(archive, member, dest_dir):
+    """Stream one member to dest_dir/<member path>; returns the extracted path"""
+    target = os.path.join(dest_dir, *member.split("/"))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = target + ".partial"
+    with archive.open(member) as src, open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER)
+    os.replace(tmp, target)
+    return target
+
+
+def open_sources(archive, zip_path, product_name, dest_dir, keep_sources=False):
+    """
+    Make the needed members of an open SAFE zip available to GDAL.
+
+    Auxiliary files are always extracted (they are small and read by path). Rasters
+    are extracted only if they are deflated or keep_sources is set; otherwise they
+    are read from the zip via /vsizip/.
+
+    Returns:
+        list of (source, local_path): the path GDAL should open, and the on-disk path
+        the member has (or would have) under dest_dir, which outputs are named after.
+    """
+    rasters, auxiliary = select_members(archive.namelist(), product_name)
+    for member in auxiliary:
+        extract_member(archive, member, dest_dir)
+    sources = []
+    for member in rasters:
+        local_path = os.path.join(dest_dir, *member.split("/"))
+        if keep_sources or not readable_in_place(archive.getinfo(member)):
+            sources.append((extract_member(archive, member, dest_dir), local_path))
+        else:
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            sources.append((gdal_path(zip_path, member), local_path))
+    return sources
@@ -0,0 +1,68 @@
+# SAFE archive test script
+# Builds a minimal Sentinel-1 SAFE zip and checks that the stored measurement is read in
+# place (nothing extracted but the calibration XML), and that the Sentinel-2 member
+# selection picks only the 10 m RGB bands.
+# Run with: python -m pytest safe_archive_test.py  (or python safe_archive_test.py)
+
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from safe_archive import open_sources, select_members
+
+SAFE = "S1A_IW_GRDH_1SDV_TEST.SAFE"
+
+
+def make_s1_zip(tmp):
+    """Minimal S1 SAFE zip: one stored measurement GeoTIFF, its calibration XML and members to skip"""
+    tiff = os.path.join(tmp, "s1a-iw-grd-vv.tiff")
+    data = np.arange(64 * 48, dtype=np.uint16).reshape(64, 48)
+    with rasterio.open(tiff, "w", driver="GTiff", width=48, height=64, count=1, dtype="uint16",
+                       crs="EPSG:32620", transform=from_origin(0, 64, 1, 1)) as dst:
+        dst.write(data, 1)
+    zip_path = os.path.join(tmp, SAFE + ".zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(tiff, f"{SAFE}/measurement/s1a-iw-grd-vv.tiff", zipfile.ZIP_STORED)
+        archive.writestr(f"{SAFE}/annotation/calibration/calibration-s1a-iw-grd-vv.xml", "<calibration/>",
+                         zipfile.ZIP_DEFLATED)
+        archive.writestr(f"{SAFE}/preview/quick-look.png", b"\x00" * 1000, zipfile.ZIP_DEFLATED)
+        archive.writestr(f"{SAFE}/annotation/s1a-iw-grd-vv.xml", "<product/>", zipfile.ZIP_DEFLATED)
+    os.remove(tiff)
+    return zip_path, data
+
+
+def test_stored_measurement_is_read_in_place():
+    with tempfile.TemporaryDirectory() as tmp:
+        zip_path, data = make_s1_zip(tmp)
+        out_dir = os.path.join(tmp, "out")
+        with zipfile.ZipFile(zip_path) as archive:
+            (source, local_path), = open_sources(archive, zip_path, SAFE, out_dir)
+        assert source.startswith("/vsizip/"), source
+        with rasterio.open(source) as src:
+            assert np.array_equal(src.read(1), data)
+        extracted = sorted(os.path.relpath(os.path.join(root, f), out_dir)
+                           for root, _, files in os.walk(out_dir) for f in files)
+        assert extracted == [os.path.join(SAFE, "annotation", "calibration", "calibration-s1a-iw-grd-vv.xml")], \
+            extracted
+
+
+def test_s2_selects_rgb_bands():
+    names = [
+        "S2A.SAFE/GRANULE/L1C_T20TMP/IMG_DATA/T20TMP_20240904T151651_B02.jp2",
+        "S2A.SAFE/GRANULE/L1C_T20TMP/IMG_DATA/T20TMP_20240904T151651_B08.jp2",
+        "S2A.SAFE/GRANULE/L1C_T20TMP/IMG_DATA/T20TMP_20240904T151651_TCI.jp2",
+        "S2A.SAFE/GRANULE/L2A_T20TMP/IMG_DATA/R10m/T20TMP_20240904T151651_B04_10m.jp2",
+        "S2A.SAFE/GRANULE/L2A_T20TMP/IMG_DATA/R20m/T20TMP_20240904T151651_B03_20m.jp2",
+        "S2A.SAFE/GRANULE/L1C_T20TMP/QI_DATA/MSK_CLOUDS_B00.gml",
+    ]
+    assert select_members(names, "S2A_MSIL1C_TEST") == ([names[0], names[3]], [])
+
+
+if __name__ == "__main__":
+    test_stored_measurement_is_read_in_place()
+    test_s2_selects_rgb_bands()
+    print("✅ Stored measurements are read in place; S2 selection keeps the 10 m RGB bands")
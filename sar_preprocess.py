@@ -0,0 +1,269 @@
+"""
+Sentinel-1 GRD preprocessing: DN -> intensity (or calibrated sigma0) -> speckle
+filter -> dB -> CFAR statistics -> 8-bit raster cache for the detector.
+
+The measurement TIFF is processed in full-width strips with a halo of extra rows
+above and below, large enough for the speckle filter and the CFAR window combined,
+so every output row is identical to processing the whole scene at once while only
+a strip is ever held as float32.
+
+Usage:
+    python sar_preprocess.py path/to/measurement/s1a-iw-grd-vv-....tiff --filter lee
+"""
+import argparse
+import glob
+import os
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import cv2
+
+from raster_cache import RasterCacheWriter
+
+
+class CalibrationLUT:
+    """
+    Sentinel-1 calibration vectors (annotation/calibration/calibration-*.xml),
+    bilinearly interpolated to any strip of the image.
+    """
+
+    def __init__(self, lines, pixels, values):
+        self.lines = np.asarray(lines, dtype=np.float64)
+        self.pixels = np.asarray(pixels, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)  # (len(lines), len(pixels))
+
+    @classmethod
+    def from_xml(cls, path, lut="sigmaNought"):
+        root = ET.parse(path).getroot()
+        lines, pixels, values = [], None, []
+        for vector in root.iter("calibrationVector"):
+            lines.append(int(vector.findtext("line")))
+            vector_pixels = np.array(vector.findtext("pixel").split(), dtype=np.float64)
+            vector_values = np.array(vector.findtext(lut).split(), dtype=np.float64)
+            if pixels is None:
+                pixels = vector_pixels
+            elif len(vector_pixels) != len(pixels) or not np.array_equal(vector_pixels, pixels):
+                # GRD vectors share one pixel grid; resample the odd one onto it
+                vector_values = np.interp(pixels, vector_pixels, vector_values)
+            values.append(vector_values)
+        if not lines:
+            raise ValueError(f"No calibrationVector elements in {path}")
+        return cls(lines, pixels, np.stack(values))
+
+    def strip(self, top, rows, width):
+        """(rows, width) float32 LUT values for image rows top .. top + rows - 1"""
+        row_lut = np.stack([np.interp(np.arange(top, top + rows), self.lines, column)
+                            for column in self.values.T], axis=1)  # (rows, len(pixels))
+        cols = np.arange(width, dtype=np.float64)
+        right = np.clip(np.searchsorted(self.pixels, cols, side="right"), 1, len(self.pixels) - 1)
+        left = right - 1
+        t = np.clip((cols - self.pixels[left]) / (self.pixels[right] - self.pixels[left]), 0, 1)
+        return (row_lut[:, left] * (1 - t) + row_lut[:, right] * t).astype(np.float32)
+
+
+def calibration_for(measurement_path):
+    """annotation/calibration/calibration-<name>.xml matching a measurement TIFF, or None"""
+    safe_dir = os.path.dirname(os.path.dirname(os.path.abspath(measurement_path)))
+    stem = os.path.splitext(os.path.basename(measurement_path))[0]
+    matches = glob.glob(os.path.join(safe_dir, "annotation", "calibration", f"calibration-{stem}.xml"))
+    return matches[0] if matches else None
+
+
+def lee_filter(intensity, size=7, enl=4.4):
+    """
+    Lee speckle filter with box-filter local statistics: the local mean plus a gain
+    on the deviation, where the gain is the fraction of local variance not explained
+    by speckle (coefficient of variation 1/sqrt(enl)).
+    """
+    mean = cv2.boxFilter(intensity, cv2.CV_32F, (size, size))
+    sq_mean = cv2.boxFilter(intensity * intensity, cv2.CV_32F, (size, size))
+    variance = np.maximum(sq_mean - mean * mean, 0)
+    noise = 1.0 / enl
+    signal_variance = np.maximum((variance - mean * mean * noise) / (1 + noise), 0)
+    gain = np.divide(signal_variance, variance, out=np.zeros_like(variance), where=variance > 0)
+    return mean + gain * (intensity - mean)
+
+
+def median_filter(intensity, size=5):
+    if size <= 5:
+        return cv2.medianBlur(intensity, size)
+    from scipy.ndimage import median_filter as ndi_median
+
+    return ndi_median(intensity, size=size, mode="mirror")
+
+
+def cfar_statistics(db, guard=21, background=61):
+    """
+    Two-parameter CFAR z-score: each pixel against the mean/std of a background ring
+    (background x background window minus the guard x guard window around it).
+    """
+    db = db.astype(np.float32, copy=False)
+    n_outer, n_guard = background * background, guard * guard
+    outer_sum = cv2.boxFilter(db, cv2.CV_32F, (background, background), normalize=False)
+    guard_sum = cv2.boxFilter(db, cv2.CV_32F, (guard, guard), normalize=False)
+    outer_sq = cv2.boxFilter(db * db, cv2.CV_32F, (background, background), normalize=False)
+    guard_sq = cv2.boxFilter(db * db, cv2.CV_32F, (guard, guard), normalize=False)
+    n = n_outer - n_guard
+    mean = (outer_sum - guard_sum) / n
+    variance = np.maximum((outer_sq - guard_sq) / n - mean * mean, 1e-6)
+    return (db - mean) / np.sqrt(variance)
+
+
+def _candidate_boxes(mask, zscore, top):
+    """xyxy boxes (offset by `top` rows), peak z-score and pixel count of each connected component"""
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    if count <= 1:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+    x, y = stats[1:, cv2.CC_STAT_LEFT], stats[1:, cv2.CC_STAT_TOP] + top
+    w, h = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    peaks = np.full(count, -np.inf, dtype=np.float32)
+    np.maximum.at(peaks, labels[mask], zscore[mask])
+    boxes = np.stack([x, y, x + w, y + h], axis=1).astype(np.float32)
+    return boxes, peaks[1:], stats[1:, cv2.CC_STAT_AREA].astype(np.int64)
+
+
+def _merge_across_strips(boxes, peaks, areas, boundaries):
+    """Join candidate boxes that were cut by a strip boundary"""
+    boxes, peaks, areas = list(map(list, boxes)), list(peaks), list(areas)
+    for boundary in boundaries:
+        above = [i for i, b in enumerate(boxes) if b is not None and b[3] == boundary]
+        below = [i for i, b in enumerate(boxes) if b is not None and b[1] == boundary]
+        for i in above:
+            for j in below:
+                a, b = boxes[i], boxes[j]
+                if a is None or b is None or a[2] < b[0] or b[2] < a[0]:
+                    continue
+                boxes[i] = [min(a[0], b[0]), a[1], max(a[2], b[2]), max(a[3], b[3])]
+                peaks[i] = max(peaks[i], peaks[j])
+                areas[i] += areas[j]
+                boxes[j] = None
+    keep = [i for i, b in enumerate(boxes) if b is not None]
+    return (np.array([boxes[i] for i in keep], dtype=np.float32).reshape(-1, 4),
+            np.array([peaks[i] for i in keep], dtype=np.float32),
+            np.array([areas[i] for i in keep], dtype=np.int64))
+
+
+def preprocess_sar(measurement_path, output_path=None, calibration=None, speckle="lee", filter_size=7,
+                   db_range=(-25.0, 5.0), cfar_guard=21, cfar_background=61, cfar_threshold=5.0,
+                   min_area=3, strip_rows=512, chunk=512):
+    """
+    Turn a GRD measurement TIFF into an 8-bit dB raster cache and CFAR candidates.
+
+    Parameters:
+        measurement_path (str): measurement/*.tiff of a Sentinel-1 SAFE.
+        output_path (str): Raster cache to write (default: <tiff>_db8.rc).
+        calibration (str): Calibration XML; "auto" looks it up in the SAFE annotation
+            folder. Without it, intensity is DN² and db_range should be adjusted.
+        speckle (str): 'lee', 'median' or None.
+        db_range (tuple): dB values mapped to 0 and 255.
+        cfar_guard, cfar_background (int): CFAR window sizes; the guard should exceed the
+            largest expected vessel so its pixels stay out of the background ring.
+        cfar_threshold (float): z-score above the background ring that makes a candidate.
+        min_area (int): Smallest candidate in pixels.
+        strip_rows (int): Core rows per strip; memory is a few float32 strips of
+            (strip_rows + 2 * halo) x width.
+
+    Returns:
+        dict: output path, candidate boxes (N, 4) xyxy, peak z-scores, scene dB mean/std,
+        and timings.
+    """
+    import rasterio
+    from rasterio.windows import Window
+
+    output_path = output_path or os.path.splitext(measurement_path)[0] + "_db8.rc"
+    if calibration == "auto":
+        calibration = calibration_for(measurement_path)
+    lut = CalibrationLUT.from_xml(calibration) if calibration else None
+    halo = (filter_size // 2 if speckle else 0) + cfar_background // 2
+    low, high = db_range
+    timings = {"read_s": 0.0, "filter_s": 0.0, "cfar_s": 0.0, "write_s": 0.0}
+    db_sum, db_sq_sum, db_count = 0.0, 0.0, 0
+    all_boxes, all_peaks, all_areas, boundaries = [], [], [], []
+
+    with rasterio.open(measurement_path) as src:
+        width, height = src.width, src.height
+        metadata = {"source": os.path.abspath(measurement_path), "calibration": calibration,
+                    "speckle": speckle, "filter_size": filter_size, "db_range": list(db_range),
+                    "gcps": [[g.row, g.col, g.x, g.y] for g in src.gcps[0]]}
+        with RasterCacheWriter(output_path, width, height, np.uint8, chunk=chunk, metadata=metadata,
+                               resampling="max") as writer:
+            for top in range(0, height, strip_rows):
+                rows = min(strip_rows, height - top)
+                read_top = max(top - halo, 0)
+                read_bottom = min(top + rows + halo, height)
+
+                start = time.perf_counter()
+                dn = src.read(1, window=Window(0, read_top, width, read_bottom - read_top)).astype(np.float32)
+                timings["read_s"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                intensity = dn * dn
+                del dn
+                if lut is not None:
+                    a = lut.strip(read_top, read_bottom - read_top, width)
+                    intensity /= a * a
+                    del a
+                if speckle == "lee":
+                    intensity = lee_filter(intensity, filter_size)
+                elif speckle == "median":
+                    intensity = median_filter(intensity, filter_size)
+                db = 10 * np.log10(np.maximum(intensity, 1e-10))
+                del intensity
+                timings["filter_s"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                zscore = cfar_statistics(db, cfar_guard, cfar_background)
+                core = slice(top - read_top, top - read_top + rows)
+                core_db, core_z = db[core], zscore[core]
+                boxes, peaks, areas = _candidate_boxes(core_z > cfar_threshold, core_z, top)
+                all_boxes.append(boxes)
+                all_peaks.append(peaks)
+                all_areas.append(areas)
+                if top:
+                    boundaries.append(top)
+                db_sum += float(core_db.sum(dtype=np.float64))
+                db_sq_sum += float((core_db.astype(np.float64) ** 2).sum())
+                db_count += core_db.size
+                timings["cfar_s"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                scaled = (np.clip(core_db, low, high) - low) * (255.0 / (high - low))
+                writer.write_rows(np.rint(scaled).astype(np.uint8))
+                timings["write_s"] += time.perf_counter() - start
+
+    boxes, peaks, areas = _merge_across_strips(np.concatenate(all_boxes), np.concatenate(all_peaks),
+                                               np.concatenate(all_areas), boundaries)
+    keep = areas >= min_area
+    mean = db_sum / db_count
+    return {
+        "output": output_path,
+        "width": width,
+        "height": height,
+        "candidates": boxes[keep],
+        "peak_zscore": peaks[keep],
+        "db_mean": mean,
+        "db_std": float(np.sqrt(max(db_sq_sum / db_count - mean * mean, 0.0))),
+        "timings": timings,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sentinel-1 GRD -> 8-bit dB raster cache + CFAR candidates")
+    parser.add_argument("measurement")
+    parser.add_argument("--output")
+    parser.add_argument("--calibration", default="auto", help="Calibration XML, 'auto' or 'none'")
+    parser.add_argument("--filter", default="lee", choices=["lee", "median", "none"])
+    parser.add_argument("--filter-size", type=int, default=7)
+    parser.add_argument("--strip-rows", type=int, default=512)
+    parser.add_argument("--cfar-threshold", type=float, default=5.0)
+    args = parser.parse_args()
+
+    result = preprocess_sar(args.measurement, args.output,
+                            calibration=None if args.calibration == "none" else args.calibration,
+                            speckle=None if args.filter == "none" else args.filter,
+                            filter_size=args.filter_size, strip_rows=args.strip_rows,
+                            cfar_threshold=args.cfar_threshold)
+    print(f"✅ {result['output']}: {result['width']}x{result['height']}, {len(result['candidates'])} CFAR candidates, "
+          f"{result['db_mean']:.1f} ± {result['db_std']:.1f} dB")
+    print({k: round(v, 2) for k, v in result["timings"].items()})
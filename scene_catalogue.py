@@ -0,0 +1,326 @@
+"""
+One SQLite catalogue of the challenge scenes, shared by every script.
+
+The imagery CSV (the sectioned EO/SAR original or the flat converted_output.csv)
+is parsed once into indexed rows holding EO/SAR type, timestamp, image centre and
+remarks. Scene folders under a data directory are resolved once to their IMG_DATA
+or measurement folder and band files. Both are refreshed incrementally: a CSV is
+re-parsed only when its size or mtime changes, and a folder is re-resolved only
+when its mtime (or its band folder's) changes.
+
+Usage:
+    python scene_catalogue.py Imagery_details_for_vessel_detection_and_AIS_correlation.csv copernicus_data
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sqlite3
+import threading
+
+from scene_metadata import band_files
+
+DB_NAME = "scene_catalogue.sqlite"
+CSV_COLUMNS = ["S.No.(ID)", "time_stamp", "image_name", "image_centre_latitude", "image_centre_longitude"]
+
+_BAND_DIR_PATTERNS = {
+    "EO": ("IMG_DATA", ["GRANULE/*/IMG_DATA", "*.SAFE/GRANULE/*/IMG_DATA"]),
+    "SAR": ("measurement", ["measurement", "*.SAFE/measurement"]),
+}
+
+
+def _float_or_none(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_imagery_csv(path):
+    """
+    Scene rows of either imagery CSV layout, in file order, as converted_output.csv
+    dicts ('EO/SAR', the five CSV_COLUMNS, 'Remarks' '0'/'1') plus 'remarks_text'.
+
+    The sectioned original has 'EO'/'SAR' marker rows, a 'S.No.(ID)' header and free
+    text remarks; the flat layout already has an 'EO/SAR' column and 0/1 remarks.
+    """
+    with open(path, newline='', encoding='latin-1') as f:
+        rows = list(csv.reader(f))
+    header = next((row for row in rows if any(cell.strip() for cell in row)), [])
+
+    scenes = []
+    if "EO/SAR" in [cell.strip() for cell in header]:
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            id_col = next((c for c in reader.fieldnames if c.strip().lower() in ('s.no.(id)', 'id', 's.no')), None)
+            for row in reader:
+                if id_col and row[id_col].strip():
+                    scene = {"EO/SAR": row["EO/SAR"].strip()}
+                    scene.update({column: row.get(column if column != "S.No.(ID)" else id_col, "").strip()
+                                  for column in CSV_COLUMNS})
+                    scene["Remarks"] = "1" if row.get("Remarks", "").strip() == "1" else "0"
+                    scene["remarks_text"] = None
+                    scenes.append(scene)
+        return scenes
+
+    mode, columns = None, None
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        first = row[0].strip()
+        if first in ("EO", "SAR"):
+            mode = first
+        elif first.startswith("S.No.(ID)"):
+            columns = row
+        elif mode and columns and first.isdigit():
+            row = row + [""] * (len(columns) - len(row))
+            scene = {"EO/SAR": mode}
+            scene.update({columns[i]: row[i] for i in range(5)})
+            scene["Remarks"] = "0" if not row[5].strip() else "1"
+            scene["remarks_text"] = row[5].strip() or None
+            scenes.append(scene)
+    return scenes
+
+
+def kind_from_name(image_name):
+    """'EO' for Sentinel-2, 'SAR' for Sentinel-1 product names, else None"""
+    return {"S2": "EO", "S1": "SAR"}.get(image_name[:2])
+
+
+def find_band_dir(folder, kind):
+    """
+    IMG_DATA (EO) or measurement (SAR) folder of a scene folder, which may be the SAFE
+    itself or contain it. Known layouts are globbed directly; os.walk is the fallback.
+    """
+    if kind not in _BAND_DIR_PATTERNS:
+        return None
+    name, patterns = _BAND_DIR_PATTERNS[kind]
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.join(folder, pattern)))
+        if matches:
+            return matches[0]
+    for root, dirs, _ in os.walk(folder):
+        if name in dirs:
+            return os.path.join(root, name)
+    return None
+
+
+def scene_name(folder):
+    """
+    Product name of a scene folder: the folder's own name, or the name of the single
+    *.SAFE inside it when the folder is a product store directory (S2A_<sha1[:8]>)
+    """
+    name = os.path.basename(folder)
+    if not name.endswith(".SAFE"):
+        nested = [d for d in glob.glob(os.path.join(folder, "*.SAFE")) if os.path.isdir(d)]
+        if len(nested) == 1:
+            return os.path.basename(nested[0])
+    return name
+
+
+def _safe_root(band_dir, kind):
+    # IMG_DATA sits at SAFE/GRANULE/<tile>/IMG_DATA, measurement at SAFE/measurement
+    return os.path.dirname(os.path.dirname(os.path.dirname(band_dir))) if kind == "EO" else os.path.dirname(band_dir)
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class SceneCatalogue:
+    """
+    SQLite index of scenes keyed by image_name: CSV attributes (id, kind, time_stamp,
+    centre, remarks) and resolved folders (folder, band_dir, bands).
+    """
+
+    def __init__(self, db_path=DB_NAME):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scenes (
+                image_name TEXT PRIMARY KEY,
+                id INTEGER,
+                kind TEXT,
+                time_stamp TEXT,
+                centre_lat REAL,
+                centre_lon REAL,
+                remarks INTEGER,
+                remarks_text TEXT,
+                csv_row TEXT,
+                source TEXT,
+                position INTEGER,
+                folder TEXT,
+                band_dir TEXT,
+                bands TEXT,
+                fingerprint REAL
+            );
+            CREATE INDEX IF NOT EXISTS scenes_id ON scenes (id);
+            CREATE INDEX IF NOT EXISTS scenes_kind_remarks ON scenes (kind, remarks);
+            CREATE INDEX IF NOT EXISTS scenes_folder ON scenes (folder);
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                signature TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def load_csv(self, csv_path):
+        """Index the scenes of an imagery CSV; a no-op if the file is unchanged since the last load"""
+        path = os.path.abspath(csv_path)
+        signature = _file_signature(path)
+        with self._lock:
+            row = self.conn.execute("SELECT signature FROM sources WHERE path = ?", (path,)).fetchone()
+        if row and row["signature"] == signature:
+            return False
+
+        scenes = parse_imagery_csv(path)
+        with self._lock, self.conn:
+            # Scenes taken over from another CSV are no longer indexed under it, so that
+            # CSV has to be parsed again the next time it is loaded
+            names = [scene["image_name"] for scene in scenes]
+            self.conn.execute(f"DELETE FROM sources WHERE path IN (SELECT source FROM scenes WHERE source != ? "
+                              f"AND image_name IN ({', '.join('?' * len(names))}))", [path] + names)
+            self.conn.execute("UPDATE scenes SET id = NULL, kind = NULL, time_stamp = NULL, centre_lat = NULL, "
+                              "centre_lon = NULL, remarks = NULL, remarks_text = NULL, csv_row = NULL, "
+                              "source = NULL, position = NULL WHERE source = ?", (path,))
+            for position, scene in enumerate(scenes):
+                row = {key: value for key, value in scene.items() if key != "remarks_text"}
+                self.conn.execute("""
+                    INSERT INTO scenes (image_name, id, kind, time_stamp, centre_lat, centre_lon, remarks,
+                                        remarks_text, csv_row, source, position)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (image_name) DO UPDATE SET
+                        id = excluded.id, kind = excluded.kind, time_stamp = excluded.time_stamp,
+                        centre_lat = excluded.centre_lat, centre_lon = excluded.centre_lon,
+                        remarks = excluded.remarks, remarks_text = excluded.remarks_text,
+                        csv_row = excluded.csv_row, source = excluded.source, position = excluded.position
+                """, (scene["image_name"], int(scene["S.No.(ID)"]), scene["EO/SAR"], scene["time_stamp"],
+                      _float_or_none(scene["image_centre_latitude"]), _float_or_none(scene["image_centre_longitude"]),
+                      int(scene["Remarks"]), scene["remarks_text"], json.dumps(row), path, position))
+            self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (path, signature))
+        return True
+
+    def scan(self, data_dir):
+        """
+        Resolve every scene folder directly under data_dir (a SAFE, or a product store
+        directory holding one) to its band folder and band files. Folders whose mtime is
+        unchanged keep their stored resolution; scenes whose folder disappeared lose it.
+        """
+        data_dir = os.path.abspath(data_dir)
+        folders = {scene_name(os.path.join(data_dir, d)): os.path.join(data_dir, d) for d in os.listdir(data_dir)
+                   if os.path.isdir(os.path.join(data_dir, d))}
+        with self._lock:
+            known = {row["image_name"]: row for row in self.conn.execute(
+                "SELECT image_name, kind, folder, band_dir, fingerprint FROM scenes WHERE folder LIKE ?",
+                (data_dir + os.sep + "%",))}
+
+        updates = []
+        for name, folder in folders.items():
+            row = known.get(name)
+            band_dir = row["band_dir"] if row else None
+            fingerprint = max([os.path.getmtime(folder)] + ([os.path.getmtime(band_dir)]
+                                                           if band_dir and os.path.isdir(band_dir) else []))
+            if row and row["folder"] == folder and row["fingerprint"] == fingerprint:
+                continue
+            kind = (row["kind"] if row else None) or self._kind(name) or kind_from_name(name)
+            band_dir = find_band_dir(folder, kind)
+            bands = band_files(_safe_root(band_dir, kind)) if band_dir else {}
+            if band_dir:
+                fingerprint = max(fingerprint, os.path.getmtime(band_dir))
+            updates.append((name, folder, band_dir, json.dumps(bands), fingerprint))
+
+        with self._lock, self.conn:
+            for name, folder, band_dir, bands, fingerprint in updates:
+                self.conn.execute("""
+                    INSERT INTO scenes (image_name, folder, band_dir, bands, fingerprint) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (image_name) DO UPDATE SET
+                        folder = excluded.folder, band_dir = excluded.band_dir,
+                        bands = excluded.bands, fingerprint = excluded.fingerprint
+                """, (name, folder, band_dir, bands, fingerprint))
+            for name in set(known) - set(folders):
+                self.conn.execute("UPDATE scenes SET folder = NULL, band_dir = NULL, bands = NULL, "
+                                  "fingerprint = NULL WHERE image_name = ?", (name,))
+        return len(updates)
+
+    def _kind(self, image_name):
+        with self._lock:
+            row = self.conn.execute("SELECT kind FROM scenes WHERE image_name = ?", (image_name,)).fetchone()
+        return row["kind"] if row else None
+
+    @staticmethod
+    def _to_dict(row):
+        scene = dict(row)
+        scene["row"] = json.loads(scene.pop("csv_row")) if scene["csv_row"] else None
+        scene["bands"] = json.loads(scene["bands"]) if scene["bands"] else {}
+        # the SAFE itself, which is nested one level down in the product store layout
+        scene["safe_dir"] = None
+        if scene["folder"]:
+            scene["safe_dir"] = (scene["folder"] if os.path.basename(scene["folder"]) == scene["image_name"]
+                                 else os.path.join(scene["folder"], scene["image_name"]))
+        return scene
+
+    def scene(self, image_name):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM scenes WHERE image_name = ?", (image_name,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def scenes(self, kind=None, remarks=None, in_csv=True, on_disk=False, csv_path=None):
+        """
+        Scenes in CSV order, optionally filtered by kind ('EO'/'SAR'), remarks (0/1),
+        presence on disk and the CSV they were loaded from
+        """
+        clauses, params = [], []
+        if csv_path is not None:
+            clauses.append("source = ?")
+            params.append(os.path.abspath(csv_path))
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if remarks is not None:
+            clauses.append("remarks = ?")
+            params.append(int(remarks))
+        if in_csv:
+            clauses.append("csv_row IS NOT NULL")
+        if on_disk:
+            clauses.append("folder IS NOT NULL")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT * FROM scenes {where} ORDER BY position IS NULL, position, image_name",
+                                     params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def lookup(self, **filters):
+        """image_name -> scene dict"""
+        return {scene["image_name"]: scene for scene in self.scenes(**filters)}
+
+    def converted_rows(self, csv_path=None):
+        """Rows in the converted_output.csv layout, in CSV order"""
+        return [scene["row"] for scene in self.scenes(csv_path=csv_path)]
+
+    def image_list(self, csv_path=None):
+        """[{'id': '1', 'image_name': ...}, ...] as consumed by CopernicusDownloader.process_image_list"""
+        return [{"id": scene["row"]["S.No.(ID)"], "image_name": scene["image_name"]}
+                for scene in self.scenes(csv_path=csv_path)]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or refresh the scene catalogue")
+    parser.add_argument("csv_file", help="Imagery CSV (sectioned original or converted_output.csv)")
+    parser.add_argument("data_dir", nargs="?", help="Folder holding the downloaded scene folders")
+    parser.add_argument("--db", default=DB_NAME)
+    args = parser.parse_args()
+
+    catalogue = SceneCatalogue(args.db)
+    print(f"{'Parsed' if catalogue.load_csv(args.csv_file) else 'Unchanged'}: {args.csv_file}")
+    if args.data_dir:
+        print(f"Resolved {catalogue.scan(args.data_dir)} new or changed folders in {args.data_dir}")
+    for scene in catalogue.scenes():
+        print(f"{scene['id']:>3} {scene['kind']:<3} {scene['time_stamp']} remarks={scene['remarks']} "
+              f"{scene['image_name']} -> {scene['band_dir']}")
@@ -0,0 +1,94 @@
+# Scene catalogue test script
+# Builds a small data directory in the product store layout (data/S2A_<sha1[:8]>/<name>.SAFE/...)
+# next to a flat SAFE, and checks that the catalogue and Json_Format resolve both.
+# Run with: python -m pytest scene_catalogue_test.py  (or python scene_catalogue_test.py)
+
+import csv
+import json
+import os
+import tempfile
+
+from Json_Format import write_json_from_folders
+from product_store import ProductStore
+from scene_catalogue import CSV_COLUMNS, SceneCatalogue
+from scene_metadata_test import make_eo_safe
+
+STORE_SCENE = "S2A_MSIL1C_20240904T151651_N0511_R025_T20TMP_20240904T221000.SAFE"
+FLAT_SCENE = "S2B_MSIL1C_20241001T160509_N0511_R054_T17RQM_20241001T204223.SAFE"
+MISSING_SCENE = "S2B_MSIL1C_20250119T160509_N0511_R054_T17RPL_20250119T210239.SAFE"
+
+
+def make_store_scene(data_dir, image_name, **band_kwargs):
+    """A scene where CopernicusDownloader puts it: data_dir/<product_key>/<image_name>"""
+    return make_eo_safe(os.path.join(ProductStore(data_dir).product_dir(image_name), image_name), **band_kwargs)
+
+
+def write_converted_csv(path, image_names, correlate=()):
+    """converted_output.csv for EO scenes; those named in `correlate` get Remarks 1"""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["EO/SAR"] + CSV_COLUMNS + ["Remarks"])
+        writer.writeheader()
+        for i, name in enumerate(image_names, start=1):
+            writer.writerow({"EO/SAR": "EO", "S.No.(ID)": i, "time_stamp": "2024-09-04T15:16:51",
+                             "image_name": name, "image_centre_latitude": 45.0,
+                             "image_centre_longitude": -63.0, "Remarks": int(name in correlate)})
+
+
+def make_data_dir(tmp):
+    data_dir, csv_path = os.path.join(tmp, "data"), os.path.join(tmp, "converted_output.csv")
+    store_img_data = make_store_scene(data_dir, STORE_SCENE)
+    make_eo_safe(os.path.join(data_dir, FLAT_SCENE))
+    write_converted_csv(csv_path, [STORE_SCENE, FLAT_SCENE, MISSING_SCENE])
+    return data_dir, csv_path, store_img_data
+
+
+def test_scan_names_store_folders_by_their_safe():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir, csv_path, store_img_data = make_data_dir(tmp)
+        catalogue = SceneCatalogue(os.path.join(tmp, "catalogue.sqlite"))
+        catalogue.load_csv(csv_path)
+        assert catalogue.scan(data_dir) == 2
+
+        on_disk = catalogue.lookup(csv_path=csv_path, on_disk=True)
+        assert list(on_disk) == [STORE_SCENE, FLAT_SCENE], list(on_disk)
+        store_scene = on_disk[STORE_SCENE]
+        assert store_scene["folder"] == ProductStore(os.path.abspath(data_dir)).product_dir(STORE_SCENE)
+        assert store_scene["safe_dir"] == os.path.join(store_scene["folder"], STORE_SCENE)
+        assert store_scene["band_dir"] == os.path.abspath(store_img_data)
+        assert sorted(store_scene["bands"]) == ["B02", "B03", "B04"]
+        assert on_disk[FLAT_SCENE]["safe_dir"] == on_disk[FLAT_SCENE]["folder"]
+        # the product store directory name is never recorded as a scene of its own
+        assert catalogue.scene(os.path.basename(store_scene["folder"])) is None
+
+        # unchanged folders are not re-resolved; a removed store folder loses its resolution
+        assert catalogue.scan(data_dir) == 0
+        os.rename(store_scene["folder"], os.path.join(tmp, "moved"))
+        catalogue.scan(data_dir)
+        assert list(catalogue.lookup(csv_path=csv_path, on_disk=True)) == [FLAT_SCENE]
+        catalogue.close()
+
+
+def test_output_json_lists_store_scenes():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir, csv_path, _ = make_data_dir(tmp)
+        catalogue = SceneCatalogue(os.path.join(tmp, "catalogue.sqlite"))
+        bbox_input = [{"image_name": name, "bboxes": [{"bbox": "POLYGON((0 0, 1 0, 1 1, 0 0))", "score": 0.9}]}
+                      for name in (STORE_SCENE, FLAT_SCENE, MISSING_SCENE)]
+        output_path = os.path.join(tmp, "output.json")
+        assert write_json_from_folders(output_path, data_dir, csv_path, bbox_input, "test",
+                                       catalogue=catalogue) == (2, 2)
+        with open(output_path) as f:
+            output = json.load(f)
+        images = {image["file_name"]: image for image in output["images"]}
+        assert sorted(images) == sorted([STORE_SCENE, FLAT_SCENE]), sorted(images)
+        # dimensions were read from the nested SAFE's bands, not the EO default
+        assert (images[STORE_SCENE]["width"], images[STORE_SCENE]["height"]) == (64, 48)
+        assert {ann["image_id"] for ann in output["annotations"]} == {1, 2}
+        catalogue.close()
+
+
+if __name__ == "__main__":
+    test_scan_names_store_folders_by_their_safe()
+    print("✅ Store folders are catalogued under their SAFE name")
+    test_output_json_lists_store_scenes()
+    print("✅ output.json lists store-layout scenes with their real dimensions")
@@ -0,0 +1,162 @@
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import rasterio
+
+from georeference import SceneGeoreferencer
+
+
+def band_files(safe_dir):
+    """
+    Band rasters inside a SAFE folder, keyed by band (EO, e.g. 'B04') or polarisation (SAR, e.g. 'vv').
+    """
+    bands = {}
+    for path in sorted(glob.glob(os.path.join(safe_dir, "GRANULE", "*", "IMG_DATA", "*.jp2"))):
+        match = re.search(r"_(B\d[\dA]|TCI)\.jp2$", os.path.basename(path))
+        if match:
+            bands[match.group(1)] = path
+    for path in sorted(glob.glob(os.path.join(safe_dir, "measurement", "*.tif*"))):
+        match = re.search(r"-(vv|vh|hh|hv)-", os.path.basename(path).lower())
+        bands[match.group(1) if match else os.path.basename(path)] = path
+    return bands
+
+
+def _fingerprint(safe_dir):
+    """
+    Size and mtime of every band file; changes when a band is added, removed or rewritten
+    in place (which leaves its folder's mtime alone)
+    """
+    signatures = []
+    for band, path in sorted(band_files(safe_dir).items()):
+        stat = os.stat(path)
+        signatures.append(f"{band}={stat.st_size}:{stat.st_mtime_ns}")
+    return ";".join(signatures)
+
+
+def read_scene_metadata(safe_dir):
+    """Read dimensions, CRS, transform, bounds and GCPs from the scene's band headers (no pixel data)"""
+    bands = band_files(safe_dir)
+    if not bands:
+        raise FileNotFoundError(f"No band rasters found in {safe_dir}")
+    kind = "EO" if any(b.startswith("B") for b in bands) else "SAR"
+    # 10 m band (or first polarisation) defines the scene geometry
+    geometry_band = next((b for b in ("B04", "B03", "B02", "vv", "hh") if b in bands), next(iter(bands)))
+
+    with rasterio.open(bands[geometry_band]) as src:
+        gcps, gcp_crs = src.gcps
+        has_transform = src.crs is not None and not src.transform.is_identity
+        return {
+            "name": os.path.basename(os.path.normpath(safe_dir)),
+            "path": os.path.abspath(safe_dir),
+            "kind": kind,
+            "width": src.width,
+            "height": src.height,
+            "crs": src.crs.to_wkt() if has_transform else None,
+            "transform": list(src.transform)[:6] if has_transform else None,
+            "bounds": list(src.bounds) if has_transform else None,
+            "gcps": [[g.row, g.col, g.x, g.y] for g in gcps] if not has_transform else None,
+            "gcp_crs": gcp_crs.to_wkt() if gcp_crs and not has_transform else None,
+            "geometry_band": geometry_band,
+            "bands": bands,
+        }
+
+
+class SceneMetadataCache:
+    """
+    SQLite index of scene header metadata keyed by SAFE name and band file fingerprint.
+
+    Headers are read once (in parallel across scenes) and re-read only when a band
+    file changes, so scripts never reopen rasters just to get dimensions.
+    """
+
+    def __init__(self, db_path="scene_metadata.sqlite"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._georeferencers = {}
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS scenes (
+                name TEXT PRIMARY KEY,
+                fingerprint TEXT,
+                metadata TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def _lookup(self, name, fingerprint):
+        with self._lock:
+            row = self.conn.execute("SELECT fingerprint, metadata FROM scenes WHERE name = ?", (name,)).fetchone()
+        if row and row[0] == fingerprint:
+            return json.loads(row[1])
+        return None
+
+    def _store(self, metadata, fingerprint):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO scenes VALUES (?, ?, ?)",
+                              (metadata["name"], fingerprint, json.dumps(metadata)))
+            self.conn.commit()
+
+    def get(self, safe_dir):
+        """Metadata for one SAFE folder, reading headers only if it is new or changed"""
+        name = os.path.basename(os.path.normpath(safe_dir))
+        fingerprint = _fingerprint(safe_dir)
+        metadata = self._lookup(name, fingerprint)
+        if metadata is None:
+            metadata = read_scene_metadata(safe_dir)
+            self._store(metadata, fingerprint)
+        return metadata
+
+    def refresh(self, safe_dirs, workers=8):
+        """
+        Bring the index up to date for many scenes. Header reads run on a thread pool
+        (GDAL releases the GIL); scenes that fail to open map to None.
+        """
+        def load(safe_dir):
+            try:
+                return self.get(safe_dir)
+            except Exception as e:
+                print(f"Could not read metadata for {safe_dir}: {e}")
+                return None
+
+        safe_dirs = list(safe_dirs)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(safe_dirs)))) as pool:
+            return dict(zip(safe_dirs, pool.map(load, safe_dirs)))
+
+    def cached(self, name):
+        """Stored metadata by SAFE name, without touching the filesystem"""
+        with self._lock:
+            row = self.conn.execute("SELECT metadata FROM scenes WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def dimensions(self, safe_dir):
+        metadata = self.get(safe_dir)
+        return metadata["width"], metadata["height"]
+
+    def georeferencer(self, safe_dir):
+        """SceneGeoreferencer built from the stored transform/GCPs instead of reopening the raster"""
+        m = self.get(safe_dir)
+        key = (m["name"], m["path"], json.dumps(m["transform"]), len(m["gcps"] or []))
+        if key not in self._georeferencers:
+            self._georeferencers[key] = SceneGeoreferencer(
+                m["width"], m["height"], crs_wkt=m["crs"], transform=m["transform"],
+                gcps=m["gcps"], gcp_crs_wkt=m["gcp_crs"])
+        return self._georeferencers[key]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    copernicus_dir = "copernicus_data"
+    cache = SceneMetadataCache(os.path.join(copernicus_dir, "scene_metadata.sqlite"))
+    folders = [os.path.join(copernicus_dir, d) for d in os.listdir(copernicus_dir)
+               if os.path.isdir(os.path.join(copernicus_dir, d))]
+    for folder, metadata in cache.refresh(folders).items():
+        if metadata:
+            print(f"{metadata['name']}: {metadata['kind']} {metadata['width']}x{metadata['height']}, "
+                  f"{len(metadata['bands'])} bands")
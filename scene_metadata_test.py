@@ -0,0 +1,49 @@
+# Scene metadata cache test script
+# Checks that cached headers are re-read when a band file is rewritten in place, even though
+# its folder's mtime stays the same.
+# Run with: python -m pytest scene_metadata_test.py  (or python scene_metadata_test.py)
+
+import os
+import tempfile
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from scene_metadata import SceneMetadataCache, band_files
+
+
+def write_band(path, width=64, height=48, value=1000):
+    """Small georeferenced single-band raster (a horizontal ramp from `value`) standing in for a Sentinel-2 JP2"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with rasterio.open(path, "w", driver="GTiff", width=width, height=height, count=1, dtype="uint16",
+                       crs="EPSG:32620", transform=from_origin(300000, 5000000, 10, 10)) as dst:
+        dst.write(np.broadcast_to(value + np.arange(width, dtype=np.uint16), (1, height, width)))
+
+
+def make_eo_safe(safe_dir, **band_kwargs):
+    """SAFE folder with B02/B03/B04 in GRANULE/<tile>/IMG_DATA; returns the IMG_DATA path"""
+    img_data = os.path.join(safe_dir, "GRANULE", "L1C_T20TMP_A047960_20240904T151651", "IMG_DATA")
+    for band, value in (("B02", 800), ("B03", 1000), ("B04", 1200)):
+        write_band(os.path.join(img_data, f"T20TMP_20240904T151651_{band}.jp2"), value=value, **band_kwargs)
+    return img_data
+
+
+def test_band_rewritten_in_place_is_reread():
+    with tempfile.TemporaryDirectory() as tmp:
+        safe_dir = os.path.join(tmp, "S2A_MSIL1C_TEST.SAFE")
+        img_data = make_eo_safe(safe_dir)
+        cache = SceneMetadataCache(os.path.join(tmp, "scene_metadata.sqlite"))
+        assert cache.dimensions(safe_dir) == (64, 48)
+
+        folder_mtimes = {d: os.stat(d).st_mtime_ns for d in (safe_dir, img_data)}
+        write_band(band_files(safe_dir)["B04"], width=80, height=60)
+        for folder, mtime in folder_mtimes.items():
+            os.utime(folder, ns=(mtime, mtime))
+        assert cache.dimensions(safe_dir) == (80, 60)
+        cache.close()
+
+
+if __name__ == "__main__":
+    test_band_rewritten_in_place_is_reread()
+    print("✅ Band files rewritten in place invalidate the cached headers")
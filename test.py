@@ -2,11 +2,17 @@ import pandas as pd
 import json
 import os
 import pyproj  # For projecting coordinates
+import numpy as np
+
+from detection_format import EXTENSION, load_detections, read_detections, read_header, write_detections
+from scene_metadata import SceneMetadataCache
 
 # --- 1. SET YOUR FILE PATHS ---
 csv_path = r"/Users/devanshkedia/Desktop/NCCIPC/CODE/Imagery_details_for_vessel_detection_and_AIS_correlation.csv"
 json_path = r"/Users/devanshkedia/Desktop/NCCIPC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/RGB_outputs/detections_postNMS,S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.json"
 output_json_path = r"/Users/devanshkedia/Desktop/S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.json"  # New output file name
+# SAFE folder of the scene; its band geotransform (EO) or GCP grid (SAR) gives exact coordinates
+safe_dir = r"/Users/devanshkedia/Desktop/NCCIPC/CODE/PS-09---AI-tools-for-Maritime-Domain-Awareness-/copernicus_data/S2C_MSIL1C_20250315T160531_N0511_R054_T17RPH_20250315T192720.SAFE"
 
 # --- 2. DEFINE THE STANDARD SENTINEL-2 TILE SIZE ---
 STANDARD_GEO_WIDTH_METERS = 109800.0  # 109.8km
@@ -40,106 +46,153 @@ def convert_pixel_to_geo(px, py, center_lon, center_lat, pixel_center_x, pixel_c
     return [final_lat, final_lon]
 
 
-# --- 4. SCRIPT LOGIC ---
-try:
-    # --- Part A: Get Image Center from CSV ---
-    df = pd.read_csv(csv_path, header=1)
-    df.columns = df.columns.str.strip()
-    center_lat = df.iloc[0]['image_centre_latitude']
-    center_lon = df.iloc[0]['image_centre_longitude']
-    print(f"Found Image Center: Lat={center_lat}, Lon={center_lon}")
-
-    # --- Part B: Get Manual Pixel Dimensions ---
-    print("\n--- Image Dimension Input ---")
-    try:
-        image_width_px = int(input("Enter the TOTAL WIDTH of the image in pixels (e.g., 10980): "))
-        image_height_px = int(input("Enter the TOTAL HEIGHT of the image in pixels (e.g., 10980): "))
-        if image_width_px <= 0 or image_height_px <= 0:
-            raise ValueError("Dimensions must be positive")
-    except ValueError as e:
-        print(f"Invalid input. {e}")
-        exit()
-
-    # --- Part C: Calculate Scale and Process Detections ---
+def convert_pixels_to_geo(px, py, center_lon, center_lat, pixel_center_x, pixel_center_y, meters_per_pixel_x,
+                          meters_per_pixel_y, geod):
+    """
+    Vectorized convert_pixel_to_geo: converts arrays of pixel coordinates to (lat, lon) arrays
+    with two array-based geod.fwd calls, whatever the number of points.
+    """
+    px = np.asarray(px, dtype=np.float64).ravel()
+    py = np.asarray(py, dtype=np.float64).ravel()
+    n = px.size
+
+    delta_meters_x = (px - pixel_center_x) * meters_per_pixel_x  # East/West offset
+    delta_meters_y = (py - pixel_center_y) * meters_per_pixel_y  # North/South offset
+
+    # Same two moves as convert_pixel_to_geo: East/West from the centre, then North/South
+    temp_lon, temp_lat, _ = geod.fwd(np.full(n, center_lon, dtype=np.float64),
+                                     np.full(n, center_lat, dtype=np.float64),
+                                     np.full(n, 90.0), delta_meters_x)
+    final_lon, final_lat, _ = geod.fwd(temp_lon, temp_lat, np.zeros(n), -delta_meters_y)
+
+    return np.asarray(final_lat), np.asarray(final_lon)
+
+
+def georeference_boxes(bboxes, center_lon, center_lat, image_width_px, image_height_px, geod=None):
+    """
+    Georeferences an (N, 4) array of post-NMS xyxy pixel bboxes in one batch.
+
+    Returns:
+        (centroids, corners): (N, 2) and (N, 4, 2) arrays of [lat, lon]; corners are ordered
+        top_left, top_right, bottom_left, bottom_right.
+    """
     meters_per_pixel_x = STANDARD_GEO_WIDTH_METERS / image_width_px
     meters_per_pixel_y = STANDARD_GEO_HEIGHT_METERS / image_height_px
-    print("\n--- Scale Calculation ---")
-    print(f"  Meters per pixel (X): {meters_per_pixel_x:.6f}")
-    print(f"  Meters per pixel (Y): {meters_per_pixel_y:.6f}")
-
     pixel_center_x = image_width_px / 2.0
     pixel_center_y = image_height_px / 2.0
+    g = geod or pyproj.Geod(ellps='WGS84')
 
-    g = pyproj.Geod(ellps='WGS84')
-
-    with open(json_path, 'r') as f:
-        detections = json.load(f)
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    x_min, y_min, x_max, y_max = bboxes.T
 
-    print(f"\nProcessing {len(detections)} detections...")
-    new_detections = []
+    # (N, 5) points: centroid, top_left, top_right, bottom_left, bottom_right
+    px = np.stack([(x_min + x_max) / 2.0, x_min, x_max, x_min, x_max], axis=1)
+    py = np.stack([(y_min + y_max) / 2.0, y_min, y_min, y_max, y_max], axis=1)
 
-    for detection in detections:
-        bbox = detection['bbox']
-        y_min, x_min, y_max, x_max = bbox
-
-        # Calculate pixel centroid
-        pixel_x_cen = (x_min + x_max) / 2.0
-        pixel_y_cen = (y_min + y_max) / 2.0
-
-        # --- Create a dictionary of all points to convert ---
-        points_to_convert = {
-            "centroid": (pixel_x_cen, pixel_y_cen),
-            "top_left": (x_min, y_min),
-            "top_right": (x_max, y_min),
-            "bottom_left": (x_min, y_max),
-            "bottom_right": (x_max, y_max)
-        }
+    lat, lon = convert_pixels_to_geo(px, py, center_lon, center_lat, pixel_center_x, pixel_center_y,
+                                     meters_per_pixel_x, meters_per_pixel_y, g)
+    points = np.stack([lat, lon], axis=1).reshape(-1, 5, 2)
+    return points[:, 0], points[:, 1:]
 
-        geo_coords = {}
 
-        # --- Convert all points ---
-        for name, (px, py) in points_to_convert.items():
-            geo_coords[name] = convert_pixel_to_geo(
-                px, py,
-                center_lon, center_lat,
-                pixel_center_x, pixel_center_y,
-                meters_per_pixel_x, meters_per_pixel_y,
-                g
-            )
+def georeference_detections(detections, center_lon, center_lat, image_width_px, image_height_px, geod=None):
+    """
+    Adds 'geo_centroid_wgs84' and 'geo_corners_wgs84' ([lat, lon]) to every post-NMS detection,
+    assuming a standard Sentinel-2 tile extent centred on (center_lat, center_lon).
+    """
+    bboxes = [detection['bbox'] for detection in detections]
+    centroids, corners = georeference_boxes(bboxes, center_lon, center_lat, image_width_px, image_height_px, geod)
+    centroids = centroids.tolist()
+    corners = corners.tolist()
 
+    new_detections = []
+    for detection, centroid, (top_left, top_right, bottom_left, bottom_right) in zip(detections, centroids, corners):
         # Add the new coordinates to the detection data
         new_detection_data = detection.copy()
-        new_detection_data['geo_centroid_wgs84'] = geo_coords["centroid"]
+        new_detection_data['geo_centroid_wgs84'] = centroid
         new_detection_data['geo_corners_wgs84'] = {
-            "top_left": geo_coords["top_left"],
-            "top_right": geo_coords["top_right"],
-            "bottom_left": geo_coords["bottom_left"],
-            "bottom_right": geo_coords["bottom_right"]
+            "top_left": top_left,
+            "top_right": top_right,
+            "bottom_left": bottom_left,
+            "bottom_right": bottom_right
         }
         new_detections.append(new_detection_data)
 
-    # Save the new list of detections to the output JSON file
-    with open(output_json_path, 'w') as f:
-        json.dump(new_detections, f, indent=4)
-
-    print("\n--- ✅ SUCCESS ---")
-    print(f"Saved {len(new_detections)} detections with all coordinates to:")
-    print(output_json_path)
-
-    # Print a sample
-    print("\nSample output:")
-    print(json.dumps(new_detections[0], indent=4))
-
-except FileNotFoundError as e:
-    print(f"\n--- ❌ ERROR: FILE NOT FOUND ---")
-    print(f"Could not find file: {e.filename}")
-except ImportError:
-    print("\n--- ❌ ERROR: Missing Libraries ---")
-    print("Please install the required libraries first by running:")
-    print("pip install pandas pyproj")
-except KeyError as e:
-    print(f"\n--- ❌ ERROR: 'KeyError' ---")
-    print(f"Could not find the column: {e}.")
-    print("Please check your CSV file's headers. Required: 'image_centre_latitude', 'image_centre_longitude'")
-except Exception as e:
-    print(f"\nAn unexpected error occurred: {e}")
\ No newline at end of file
+    return new_detections
+
+
+# --- 4. SCRIPT LOGIC ---
+if __name__ == "__main__":
+    try:
+        # Accepts the legacy JSON dump or the binary .mdd detection file
+        detections = load_detections(json_path)
+        print(f"\nProcessing {len(detections)} detections...")
+
+        # Scene CRS/transform/GCPs come from the metadata cache (headers are read once per scene)
+        geo = None
+        if os.path.isdir(safe_dir):
+            metadata_cache = SceneMetadataCache(os.path.join(os.path.dirname(safe_dir), "scene_metadata.sqlite"))
+            try:
+                geo = metadata_cache.georeferencer(safe_dir)
+            except FileNotFoundError:
+                geo = None
+
+        if geo is not None:
+            # --- Exact: CRS + geotransform or GCPs of the scene ---
+            print(f"Georeferencing from scene metadata ({geo.width}x{geo.height})")
+            new_detections = geo.georeference_detections(detections)
+        else:
+            # --- Fallback: approximate from the image centre and the standard tile extent ---
+            df = pd.read_csv(csv_path, header=1)
+            df.columns = df.columns.str.strip()
+            center_lat = df.iloc[0]['image_centre_latitude']
+            center_lon = df.iloc[0]['image_centre_longitude']
+            print(f"⚠️  No scene raster found, approximating from image centre: Lat={center_lat}, Lon={center_lon}")
+
+            scene = read_header(json_path)["scene"] if os.path.splitext(json_path)[1] == EXTENSION else {}
+            image_width_px = scene.get("width", 10980)
+            image_height_px = scene.get("height", 10980)
+            new_detections = georeference_detections(detections, center_lon, center_lat,
+                                                     image_width_px, image_height_px)
+
+        # Save the new list of detections to the output JSON file
+        with open(output_json_path, 'w') as f:
+            json.dump(new_detections, f, indent=4)
+
+        # Binary inputs also get a georeferenced binary copy, with the coordinates as extra columns
+        if os.path.splitext(json_path)[1] == EXTENSION:
+            table = read_detections(json_path, mmap=False)
+            if geo is not None:
+                centroids, corners = geo.georeference_boxes(table.boxes)
+            else:
+                centroids, corners = georeference_boxes(table.boxes, center_lon, center_lat,
+                                                        image_width_px, image_height_px)
+            geo_path = os.path.splitext(output_json_path)[0] + EXTENSION
+            write_detections(
+                geo_path, table.boxes, table.scores, table.class_ids, table.names,
+                scene=table.scene, stage=table.header["stage"], bbox_int=table.header["bbox_int"],
+                extra={"geo_centroid": centroids, "geo_corners": corners}
+            )
+            print(f"Saved georeferenced detection file: {geo_path}")
+
+        print("\n--- ✅ SUCCESS ---")
+        print(f"Saved {len(new_detections)} detections with all coordinates to:")
+        print(output_json_path)
+
+        # Print a sample
+        print("\nSample output:")
+        print(json.dumps(new_detections[0], indent=4))
+
+    except FileNotFoundError as e:
+        print(f"\n--- ❌ ERROR: FILE NOT FOUND ---")
+        print(f"Could not find file: {e.filename}")
+    except ImportError:
+        print("\n--- ❌ ERROR: Missing Libraries ---")
+        print("Please install the required libraries first by running:")
+        print("pip install pandas pyproj")
+    except KeyError as e:
+        print(f"\n--- ❌ ERROR: 'KeyError' ---")
+        print(f"Could not find the column: {e}.")
+        print("Please check your CSV file's headers. Required: 'image_centre_latitude', 'image_centre_longitude'")
+    except Exception as e:
+        print(f"\nAn unexpected error occurred: {e}")
\ No newline at end of file
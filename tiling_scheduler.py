@@ -0,0 +1,214 @@
+import json
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+import final_json
+
+# One detector window in padded full-resolution pixels. kind is "fine" (high
+# overlap around a candidate) or "coarse" (low overlap open-water coverage).
+Tile = namedtuple("Tile", ["x", "y", "size", "kind"])
+
+
+class TilePlan:
+    """Tiles scheduled for one scene, plus the candidates that produced them"""
+
+    def __init__(self, tiles, height, width, tile_size, fine_stride, coarse_stride, candidates):
+        self.tiles = tiles
+        self.height = height
+        self.width = width
+        self.tile_size = tile_size
+        self.fine_stride = fine_stride
+        self.coarse_stride = coarse_stride
+        self.candidates = candidates
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def windows(self):
+        """(x, y) of every tile, in the order final_json.run_sliding_window expects"""
+        return [(t.x, t.y) for t in self.tiles]
+
+    def dense_count(self):
+        """Number of tiles the fixed fine-stride sliding window would run"""
+        rows = (self.height - self.tile_size) // self.fine_stride + 1
+        cols = (self.width - self.tile_size) // self.fine_stride + 1
+        return rows * cols
+
+    def summary(self):
+        fine = sum(1 for t in self.tiles if t.kind == "fine")
+        dense = self.dense_count()
+        return {
+            "tiles": len(self.tiles),
+            "fine_tiles": fine,
+            "coarse_tiles": len(self.tiles) - fine,
+            "dense_tiles": dense,
+            "reduction": 1 - len(self.tiles) / dense if dense else 0.0,
+            "candidates": len(self.candidates),
+        }
+
+    def to_dict(self):
+        return {
+            "height": self.height,
+            "width": self.width,
+            "tile_size": self.tile_size,
+            "fine_stride": self.fine_stride,
+            "coarse_stride": self.coarse_stride,
+            "candidates": np.asarray(self.candidates).tolist(),
+            "tiles": [t._asdict() for t in self.tiles],
+            "summary": self.summary(),
+        }
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def _grid(length, tile_size, stride, fine_stride):
+    """Window starts every `stride` px, snapped to the fine grid, always reaching the far edge"""
+    last = max(length - tile_size, 0)
+    starts = list(range(0, last + 1, stride))
+    if starts[-1] != last:
+        starts.append(last)
+    return sorted({s // fine_stride * fine_stride for s in starts} | {last})
+
+
+def _boxes_from_mask(mask, factor, min_area=1):
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    stats = stats[1:count]
+    stats = stats[stats[:, cv2.CC_STAT_AREA] >= min_area]
+    x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    w, h = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    return (np.stack([x, y, x + w, y + h], axis=1) * factor).astype(np.float32).reshape(-1, 4)
+
+
+def _anomaly_boxes(pooled, factor, window, z_threshold):
+    """Boxes (full-resolution xyxy) of pixels standing out from their local mean/std"""
+    pooled = pooled.astype(np.float32)
+    mean = cv2.blur(pooled, (window, window))
+    sq_mean = cv2.blur(pooled * pooled, (window, window))
+    std = np.sqrt(np.maximum(sq_mean - mean * mean, 1.0))
+    return _boxes_from_mask((pooled - mean) / std > z_threshold, factor)
+
+
+def contrast_candidates(image, factor=4, window=31, z_threshold=4.0):
+    """
+    Bright local anomalies on a max-pooled copy of the scene.
+
+    Max pooling (rather than averaging) keeps small bright hulls visible after
+    downsampling; each pooled pixel is compared with its local mean/std.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    H, W = gray.shape
+    Hc, Wc = H // factor, W // factor
+    pooled = gray[:Hc * factor, :Wc * factor].reshape(Hc, factor, Wc, factor).max(axis=(1, 3))
+    return _anomaly_boxes(pooled, factor, window, z_threshold)
+
+
+def overview_candidates(cache, factor=4, window=31, z_threshold=4.0):
+    """
+    contrast_candidates on a stored overview level of a raster cache instead of the
+    full-resolution scene, so the screening pass decodes ~1/factor² of the pixels.
+    Caches built with resampling="max" match contrast_candidates most closely.
+    """
+    level = cache.level_for(factor=factor)
+    pooled = cache.read(level).astype(np.float32)
+    if pooled.ndim == 3:
+        # R, G, B composite -> luma, as cv2.COLOR_BGR2GRAY; other stacks are averaged
+        pooled = 0.299 * pooled[0] + 0.587 * pooled[1] + 0.114 * pooled[2] if len(pooled) == 3 \
+            else pooled.mean(axis=0)
+    return _anomaly_boxes(pooled, cache.level_factor(level), window, z_threshold)
+
+
+def detector_candidates(image, backend, factor=4, tile_size=final_json.tile_size, conf_threshold=0.05):
+    """Run the detector over a downsampled scene with half-tile overlap and scale boxes back up"""
+    H, W = image.shape[:2]
+    small = cv2.resize(image, (max(W // factor, 1), max(H // factor, 1)), interpolation=cv2.INTER_AREA)
+    stride = tile_size // 2
+    small_padded = final_json.pad_image(small, tile_size, stride)
+    detections = final_json.run_sliding_window(small_padded, backend, tile_size, stride, conf_threshold)
+    boxes = np.array([d["global_bbox"] for d in detections], dtype=np.float32).reshape(-1, 4)
+    return boxes * factor
+
+
+def screen_candidates(image, backend=None, factor=4, conf_threshold=0.05, z_threshold=4.0, overview=None):
+    """
+    Low-resolution pass: candidate boxes (full-resolution xyxy) from contrast and, optionally, the detector.
+    With `overview` (a raster_cache.RasterCache of the scene) the contrast pass reads its stored pyramid.
+    """
+    if overview is not None:
+        boxes = [overview_candidates(overview, factor, z_threshold=z_threshold)]
+    else:
+        boxes = [contrast_candidates(image, factor, z_threshold=z_threshold)]
+    if backend is not None:
+        boxes.append(detector_candidates(image, backend, factor, conf_threshold=conf_threshold))
+    return np.concatenate(boxes, axis=0)
+
+
+def plan_tiles(height, width, candidates, tile_size=final_json.tile_size, fine_stride=final_json.stride,
+               coarse_stride=512, margin=32, center_radius=192):
+    """
+    Build the tile plan for a padded scene.
+
+    Coarse tiles cover the whole scene every `coarse_stride` px. Around every candidate,
+    the fine-grid windows that contain the candidate box (grown by `margin`) and whose
+    centre lies within `center_radius` px of it are added, giving dense-style overlap
+    only where it matters. Every tile sits on the fine grid, so cached outputs from
+    dense runs are reused.
+    """
+    tiles = {}
+    for y in _grid(height, tile_size, coarse_stride, fine_stride):
+        for x in _grid(width, tile_size, coarse_stride, fine_stride):
+            tiles[(x, y)] = "coarse"
+
+    max_x = max(width - tile_size, 0)
+    max_y = max(height - tile_size, 0)
+    half = tile_size / 2
+    for x1, y1, x2, y2 in np.asarray(candidates, dtype=np.float64).reshape(-1, 4):
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        x1, y1 = max(x1 - margin, 0), max(y1 - margin, 0)
+        x2, y2 = min(x2 + margin, width), min(y2 + margin, height)
+        # windows [x, x + tile_size) that contain [x1, x2); if the box is wider than a
+        # tile, fall back to windows that overlap it
+        lo_x, hi_x = sorted((x2 - tile_size, x1))
+        lo_y, hi_y = sorted((y2 - tile_size, y1))
+        lo_x, hi_x = max(lo_x, cx - half - center_radius), min(hi_x, cx - half + center_radius)
+        lo_y, hi_y = max(lo_y, cy - half - center_radius), min(hi_y, cy - half + center_radius)
+        xs = range(int(np.ceil(max(lo_x, 0) / fine_stride)) * fine_stride,
+                   int(min(hi_x, max_x)) + 1, fine_stride)
+        ys = range(int(np.ceil(max(lo_y, 0) / fine_stride)) * fine_stride,
+                   int(min(hi_y, max_y)) + 1, fine_stride)
+        for y in ys:
+            for x in xs:
+                tiles[(x, y)] = "fine"
+
+    ordered = [Tile(x, y, tile_size, kind) for (x, y), kind in sorted(tiles.items(), key=lambda kv: (kv[0][1], kv[0][0]))]
+    return TilePlan(ordered, height, width, tile_size, fine_stride, coarse_stride,
+                    np.asarray(candidates, dtype=np.float32).reshape(-1, 4))
+
+
+def schedule(image_padded, backend=None, factor=4, tile_size=final_json.tile_size,
+             fine_stride=final_json.stride, coarse_stride=512, margin=32, center_radius=192, z_threshold=4.0,
+             overview=None):
+    """Screen a padded scene at low resolution and return its TilePlan"""
+    candidates = screen_candidates(image_padded, backend, factor, z_threshold=z_threshold, overview=overview)
+    H_pad, W_pad = image_padded.shape[:2]
+    return plan_tiles(H_pad, W_pad, candidates, tile_size, fine_stride, coarse_stride, margin, center_radius)
+
+
+if __name__ == "__main__":
+    from benchmark_detection import StubBackend, make_synthetic_scene, recall_at
+
+    image, gt_boxes = make_synthetic_scene(5120, n_ships=20, seed=0)
+    image_padded = final_json.pad_image(image)
+    backend = StubBackend()
+
+    plan = schedule(image_padded)
+    print(json.dumps(plan.summary(), indent=2))
+
+    dense = final_json.run_sliding_window(image_padded, backend)
+    adaptive = final_json.run_sliding_window(image_padded, backend, windows=plan.windows())
+    names = backend.names
+    print(f"Dense recall:    {recall_at(final_json.apply_nms(dense, names), gt_boxes):.3f}")
+    print(f"Adaptive recall: {recall_at(final_json.apply_nms(adaptive, names), gt_boxes):.3f}")
@@ -0,0 +1,202 @@
+import numpy as np
+
+
+def chip_origins(boxes, chip_size):
+    """Top-left (x, y) of a chip_size x chip_size window centred on each xyxy box"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    cx = (boxes[:, 0] + boxes[:, 2]) / 2
+    cy = (boxes[:, 1] + boxes[:, 3]) / 2
+    return (np.floor(cx).astype(np.int64) - chip_size // 2,
+            np.floor(cy).astype(np.int64) - chip_size // 2)
+
+
+def extract_chips(image, boxes, chip_size=64, origins=None, offset=(0, 0)):
+    """
+    Gather all chips at once with fancy indexing: (N, chip_size, chip_size) float32.
+
+    Works on in-memory arrays and np.memmap alike (only the touched pages are read).
+    Multi-band images are averaged over their channels chip by chip, after gathering,
+    so the scene itself is never converted. Pixels outside the image repeat the edge
+    value. `offset` is the (x, y) of image[0, 0] in scene pixels, for when `image` is
+    a window of the scene.
+    """
+    H, W = image.shape[:2]
+    x0, y0 = chip_origins(boxes, chip_size) if origins is None else origins
+    steps = np.arange(chip_size)
+    rows = np.clip(y0[:, None] + steps[None, :] - offset[1], 0, H - 1)
+    cols = np.clip(x0[:, None] + steps[None, :] - offset[0], 0, W - 1)
+    chips = image[rows[:, :, None], cols[:, None, :]]  # (N, S, S) or (N, S, S, C)
+    if chips.ndim == 4:
+        return chips.mean(axis=3, dtype=np.float32)
+    return np.asarray(chips, dtype=np.float32)
+
+
+def read_chips(raster_path, boxes, chip_size=64, band=1, strip_rows=2048):
+    """
+    Chips for every box using windowed reads of a large raster.
+
+    Boxes are grouped into horizontal strips; each strip is read once (only the
+    columns its chips span) and all of its chips are gathered in one vectorized step,
+    so I/O is per strip rather than per chip.
+    """
+    import rasterio
+    from rasterio.windows import Window
+
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x0, y0 = chip_origins(boxes, chip_size)
+    chips = np.empty((len(boxes), chip_size, chip_size), dtype=np.float32)
+    if len(boxes) == 0:
+        return chips
+
+    with rasterio.open(raster_path) as src:
+        strip_ids = np.clip(y0, 0, None) // strip_rows
+        for strip in np.unique(strip_ids):
+            idx = np.nonzero(strip_ids == strip)[0]
+            top = max(int(y0[idx].min()), 0)
+            bottom = min(int(y0[idx].max()) + chip_size, src.height)
+            left = max(int(x0[idx].min()), 0)
+            right = min(int(x0[idx].max()) + chip_size, src.width)
+            window = Window(left, top, max(right - left, 1), max(bottom - top, 1))
+            data = src.read(band, window=window, boundless=False)
+            chips[idx] = extract_chips(data, boxes[idx], chip_size, origins=(x0[idx], y0[idx]),
+                                       offset=(left, top))
+    return chips
+
+
+def box_masks(boxes, origins, chip_size, margin=2):
+    """(N, S, S) boolean masks of each detection box (grown by `margin`) inside its chip"""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x0, y0 = origins
+    steps = np.arange(chip_size) + 0.5
+    xs = x0[:, None] + steps[None, :]
+    ys = y0[:, None] + steps[None, :]
+    in_x = (xs >= boxes[:, 0:1] - margin) & (xs <= boxes[:, 2:3] + margin)
+    in_y = (ys >= boxes[:, 1:2] - margin) & (ys <= boxes[:, 3:4] + margin)
+    return in_y[:, :, None] & in_x[:, None, :]
+
+
+def vessel_masks(chips, region=None, level=0.5):
+    """
+    Threshold each chip at `level` between its background (median) and peak, so bright
+    hulls are kept regardless of scene brightness. `region` limits the peak search
+    and the mask to the detection box.
+    """
+    background = np.median(chips, axis=(1, 2))
+    masked = chips if region is None else np.where(region, chips, -np.inf)
+    peak = masked.max(axis=(1, 2))
+    threshold = background + level * (peak - background)
+    mask = chips > threshold[:, None, None]
+    if region is not None:
+        mask &= region
+    return mask
+
+
+def second_moments(mask):
+    """
+    Per-chip centroid and central second moments of a stack of masks.
+
+    Returns:
+        (count, cx, cy, mu20, mu02, mu11) arrays, coordinates in chip pixels.
+    """
+    w = mask.astype(np.float64)
+    S = mask.shape[1]
+    coords = np.arange(S) + 0.5
+    count = w.sum(axis=(1, 2))
+    safe = np.maximum(count, 1)
+    row_sum = w.sum(axis=2)  # (N, S) mass per row
+    col_sum = w.sum(axis=1)  # (N, S) mass per column
+    cx = col_sum @ coords / safe
+    cy = row_sum @ coords / safe
+    dx = coords[None, :] - cx[:, None]
+    dy = coords[None, :] - cy[:, None]
+    mu20 = (col_sum * dx ** 2).sum(axis=1) / safe
+    mu02 = (row_sum * dy ** 2).sum(axis=1) / safe
+    mu11 = np.einsum("nij,ni,nj->n", w, dy, dx) / safe
+    return count, cx, cy, mu20, mu02, mu11
+
+
+def estimate_geometry(chips, origins=None, boxes=None, pixel_size=10.0, transform=None, level=0.5):
+    """
+    Length, width and heading for a stack of chips, fully vectorized across chips.
+
+    Length/width are the extents of a rectangle with the same second moments as the
+    vessel mask (sqrt(12 * eigenvalue)). Heading is the long-axis bearing in degrees
+    clockwise from north, in [0, 180) since bow and stern cannot be told apart.
+
+    Parameters:
+        chips (array): (N, S, S) chips from extract_chips/read_chips.
+        origins, boxes: chip origins and detection boxes; when given, the mask is limited to the box.
+        pixel_size (float): Metres per pixel for north-up imagery without a transform.
+        transform (tuple): Affine (a, b, c, d, e, f) of the scene; gives metres per pixel and
+            map north for rotated grids. Without it, pixel rows are assumed to run north -> south.
+    """
+    chips = np.asarray(chips, dtype=np.float32)
+    region = None
+    if origins is not None and boxes is not None:
+        region = box_masks(boxes, origins, chips.shape[1])
+
+    mask = vessel_masks(chips, region, level)
+    count, cx, cy, mu20, mu02, mu11 = second_moments(mask)
+
+    half_trace = (mu20 + mu02) / 2
+    spread = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+    major = half_trace + spread
+    minor = np.maximum(half_trace - spread, 0)
+    theta = 0.5 * np.arctan2(2 * mu11, mu20 - mu02)  # long axis, radians from +x towards +y (down)
+
+    if transform is None:
+        a, b, d, e = pixel_size, 0.0, 0.0, -pixel_size
+    else:
+        a, b, _, d, e, _ = transform[:6]
+
+    def map_vector(ux, uy):
+        return a * ux + b * uy, d * ux + e * uy
+
+    # unit vectors along both axes, mapped to (east, north) metres
+    east_l, north_l = map_vector(np.cos(theta), np.sin(theta))
+    east_w, north_w = map_vector(-np.sin(theta), np.cos(theta))
+    scale_l = np.hypot(east_l, north_l)
+    scale_w = np.hypot(east_w, north_w)
+
+    length_m = np.sqrt(12 * major) * scale_l
+    width_m = np.sqrt(12 * minor) * scale_w
+    heading = np.degrees(np.arctan2(east_l, north_l)) % 180.0
+
+    valid = count >= 3
+    result = {
+        "length_m": np.where(valid, length_m, np.nan),
+        "width_m": np.where(valid, width_m, np.nan),
+        "heading_deg": np.where(valid, heading, np.nan),
+        "pixel_count": count.astype(np.int64),
+    }
+    if origins is not None:
+        result["centroid_px"] = np.column_stack([origins[0] + cx, origins[1] + cy])
+    return result
+
+
+def estimate_vessel_geometry(image, boxes, chip_size=64, pixel_size=10.0, transform=None, batch_size=4096):
+    """
+    Chip extraction + geometry for all detections of a scene.
+
+    `image` is an in-memory array / np.memmap, or a raster path (read with windowed strips).
+    Chips are processed in fixed-size batches to bound memory; within a batch every
+    step is vectorized.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    keys = ("length_m", "width_m", "heading_deg", "pixel_count", "centroid_px")
+    parts = {key: [] for key in keys}
+    for start in range(0, len(boxes), batch_size):
+        batch = boxes[start:start + batch_size]
+        origins = chip_origins(batch, chip_size)
+        if isinstance(image, str):
+            chips = read_chips(image, batch, chip_size)
+        else:
+            chips = extract_chips(image, batch, chip_size, origins)
+        geometry = estimate_geometry(chips, origins, batch, pixel_size, transform)
+        for key in keys:
+            parts[key].append(geometry[key])
+
+    if not len(boxes):
+        return {"length_m": np.zeros(0), "width_m": np.zeros(0), "heading_deg": np.zeros(0),
+                "pixel_count": np.zeros(0, dtype=np.int64), "centroid_px": np.zeros((0, 2))}
+    return {key: np.concatenate(values) for key, values in parts.items()}
@@ -0,0 +1,23 @@
+# Vessel geometry test script
+# Checks that chips gathered from a multi-band scene equal chips of its channel mean,
+# without the scene itself being converted.
+# Run with: python -m pytest vessel_geometry_test.py  (or python vessel_geometry_test.py)
+
+import numpy as np
+
+from vessel_geometry import extract_chips
+
+
+def test_multiband_chips_match_channel_mean():
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (300, 400, 3), dtype=np.uint8)
+    # boxes inside the scene and running off every edge
+    boxes = np.array([[100.0, 120.0, 130.0, 140.0], [-10.0, -5.0, 8.0, 6.0], [390.0, 290.0, 410.0, 310.0]])
+    chips = extract_chips(image, boxes, chip_size=32)
+    assert chips.shape == (3, 32, 32) and chips.dtype == np.float32
+    assert np.array_equal(chips, extract_chips(image.mean(axis=2, dtype=np.float32), boxes, chip_size=32))
+
+
+if __name__ == "__main__":
+    test_multiband_chips_match_channel_mean()
+    print("✅ Multi-band chips are averaged per chip, matching the scene's channel mean")
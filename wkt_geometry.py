@@ -0,0 +1,178 @@
+"""
+Bulk parsing of WKT POLYGON strings (annotation bboxes) into flat arrays.
+
+All polygons of a file are parsed together into one (V, 2) coordinate array plus
+offsets: ring_offsets[r]:ring_offsets[r + 1] are the vertices of ring r and
+polygon_offsets[p]:polygon_offsets[p + 1] the rings of polygon p (the first one is
+the exterior, any others are holes). Centroids, bounds and areas are then computed
+for every polygon at once. Coordinates keep WKT order, i.e. x = lon, y = lat.
+"""
+import re
+
+import numpy as np
+
+_RING = re.compile(r"\(([^()]*)\)")
+
+
+def _parse_rings(wkt):
+    """Rings of a single POLYGON as a list of (n, 2) arrays, or [] if it is empty or malformed"""
+    if not isinstance(wkt, str):
+        return []
+    rings = _RING.findall(wkt)
+    if len(rings) != max(wkt.count("(") - 1, 0):
+        return []
+    parsed = []
+    for ring in rings:
+        try:
+            values = np.fromstring(ring.replace(",", " "), sep=" ")
+        except ValueError:
+            return []
+        if values.size == 0 or values.size != 2 * (ring.count(",") + 1):
+            return []
+        parsed.append(values.reshape(-1, 2))
+    return parsed
+
+
+class PolygonArray:
+    """Many polygons stored as flat coordinates plus ring and polygon offsets"""
+
+    def __init__(self, coords, ring_offsets, polygon_offsets):
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.polygon_offsets = polygon_offsets
+
+    def __len__(self):
+        return len(self.polygon_offsets) - 1
+
+    @property
+    def valid(self):
+        """Polygons that parsed to at least one ring"""
+        return np.diff(self.polygon_offsets) > 0
+
+    def _vertex_offsets(self):
+        return self.ring_offsets[self.polygon_offsets]
+
+    def _origins(self):
+        """(P, 2) first vertex of each polygon (NaN for empty polygons)"""
+        out = np.full((len(self), 2), np.nan)
+        valid = self.valid
+        out[valid] = self.coords[self._vertex_offsets()[:-1][valid]]
+        return out
+
+    def _ring_moments(self):
+        """
+        Per ring (area, x moment, y moment), signed so exteriors count positive and holes
+        negative. Moments are taken about each polygon's first vertex: with raw lon/lat
+        the cross products would be large and nearly cancel, losing precision.
+        """
+        starts, ends = self.ring_offsets[:-1], self.ring_offsets[1:]
+        if not len(starts):
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+        vertex_offsets = self._vertex_offsets()
+        relative = self.coords - np.repeat(self._origins()[self.valid], np.diff(vertex_offsets)[self.valid], axis=0)
+        x, y = relative[:, 0], relative[:, 1]
+        # next vertex around the ring; the last vertex wraps to the first, so rings
+        # need not repeat their first vertex
+        nxt = np.arange(1, len(x) + 1)
+        nxt[ends - 1] = starts
+        cross = x * y[nxt] - x[nxt] * y
+        area = np.add.reduceat(cross, starts) / 2
+        mx = np.add.reduceat((x + x[nxt]) * cross, starts) / 6
+        my = np.add.reduceat((y + y[nxt]) * cross, starts) / 6
+        exterior = np.zeros(len(starts), dtype=bool)
+        exterior[self.polygon_offsets[:-1][self.valid]] = True
+        sign = np.where(area < 0, -1.0, 1.0) * np.where(exterior, 1.0, -1.0)
+        return area * sign, mx * sign, my * sign
+
+    def _per_polygon(self, ring_values):
+        """Sum per-ring values over the rings of each polygon (NaN for empty polygons)"""
+        out = np.full(len(self), np.nan)
+        valid = self.valid
+        if valid.any():
+            out[valid] = np.add.reduceat(ring_values, self.polygon_offsets[:-1][valid])
+        return out
+
+    def areas(self):
+        """(P,) planar area in squared coordinate units (exterior minus holes)"""
+        area, _, _ = self._ring_moments()
+        return self._per_polygon(area)
+
+    def bounds(self):
+        """(P, 4) minx, miny, maxx, maxy of each polygon (NaN for empty polygons)"""
+        out = np.full((len(self), 4), np.nan)
+        valid = self.valid
+        if valid.any():
+            starts = self._vertex_offsets()[:-1][valid]
+            out[valid, :2] = np.minimum.reduceat(self.coords, starts, axis=0)
+            out[valid, 2:] = np.maximum.reduceat(self.coords, starts, axis=0)
+        return out
+
+    def centroids(self):
+        """
+        (P, 2) area-weighted centroid (x, y) of each polygon. Degenerate polygons (zero
+        area, e.g. a single point or a line) fall back to the mean of their vertices;
+        empty or malformed ones are NaN.
+        """
+        area, mx, my = (self._per_polygon(v) for v in self._ring_moments())
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = self._origins() + np.stack([mx / area, my / area], axis=1)
+        degenerate = self.valid & ~(np.abs(area) > 0)
+        if degenerate.any():
+            vertex_offsets = self._vertex_offsets()
+            starts, stops = vertex_offsets[:-1][degenerate], vertex_offsets[1:][degenerate]
+            cumulative = np.concatenate([np.zeros((1, 2)), np.cumsum(self.coords, axis=0)])
+            sums = cumulative[stops] - cumulative[starts]
+            out[degenerate] = sums / (stops - starts)[:, None]
+        return out
+
+
+def parse_polygons(wkts):
+    """
+    Parse an iterable of WKT POLYGON strings in one pass.
+
+    Parameters:
+        wkts (iterable of str): e.g. "POLYGON((x1 y1, x2 y2, ..., x1 y1))". Holes are
+            supported; anything that is not a parseable POLYGON (None, "POLYGON EMPTY",
+            garbage) becomes an empty polygon.
+
+    Returns:
+        PolygonArray with one polygon per input string, in input order.
+    """
+    wkts = [w if isinstance(w, str) else "" for w in wkts]
+    # Fast path: find every ring in one joined string and convert all numbers at once
+    rings = _RING.findall(";".join(wkts))
+    rings_per_polygon = [max(w.count("(") - 1, 0) for w in wkts]
+    vertices_per_ring = [ring.count(",") + 1 for ring in rings]
+    try:
+        values = np.fromstring(" ".join(rings).replace(",", " "), sep=" ")
+    except ValueError:
+        values = None
+    if (values is None or sum(rings_per_polygon) != len(rings)
+            or values.size != 2 * sum(vertices_per_ring) or 0 in vertices_per_ring):
+        # Something is malformed: parse polygon by polygon so only the bad ones are dropped
+        parsed = [_parse_rings(w) for w in wkts]
+        rings_per_polygon = [len(p) for p in parsed]
+        ring_arrays = [ring for p in parsed for ring in p]
+        vertices_per_ring = [len(ring) for ring in ring_arrays]
+        values = np.concatenate(ring_arrays) if ring_arrays else np.zeros((0, 2))
+    coords = values.reshape(-1, 2)
+    ring_offsets = np.zeros(len(vertices_per_ring) + 1, dtype=np.int64)
+    np.cumsum(vertices_per_ring, out=ring_offsets[1:])
+    polygon_offsets = np.zeros(len(rings_per_polygon) + 1, dtype=np.int64)
+    np.cumsum(rings_per_polygon, out=polygon_offsets[1:])
+    return PolygonArray(coords, ring_offsets, polygon_offsets)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    rng = random.Random(0)
+    wkts = []
+    for _ in range(200000):
+        x, y, w, h = rng.uniform(-180, 180), rng.uniform(-90, 90), rng.uniform(1e-4, 1e-2), rng.uniform(1e-4, 1e-2)
+        wkts.append(f"POLYGON(({x} {y}, {x + w} {y}, {x + w} {y + h}, {x} {y + h}, {x} {y}))")
+    start = time.perf_counter()
+    polygons = parse_polygons(wkts)
+    centroids = polygons.centroids()
+    print(f"✅ {len(polygons)} polygons parsed and reduced in {time.perf_counter() - start:.2f}s")
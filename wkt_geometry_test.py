@@ -0,0 +1,42 @@
+# WKT geometry test script
+# Checks bulk-parsed centroids, areas and bounds against hand-computed values, including
+# polygons with holes and degenerate, empty and malformed ones.
+# Run with: python -m pytest wkt_geometry_test.py  (or python wkt_geometry_test.py)
+
+import numpy as np
+
+from wkt_geometry import parse_polygons
+
+WKTS = [
+    "POLYGON((46.3238 12.5412, 46.3255 12.5412, 46.3255 12.5420, 46.3238 12.5420, 46.3238 12.5412))",
+    "POLYGON EMPTY",
+    "POLYGON((0 0, 10 0, 10 10, 0 10, 0 0), (2 2, 2 4, 4 4, 4 2, 2 2))",
+    "POLYGON((5 5, 1 1, 5 5))",
+    None,
+    "POLYGON((0 0, 0 6, 3 0))",
+]
+
+
+def test_valid():
+    assert parse_polygons(WKTS).valid.tolist() == [True, False, True, True, False, True]
+
+
+def test_centroids():
+    centroids = parse_polygons(WKTS).centroids()
+    assert np.allclose(centroids[0], [(46.3238 + 46.3255) / 2, (12.5412 + 12.5420) / 2])
+    assert np.allclose(centroids[2], [(5 * 100 - 3 * 4) / 96] * 2)  # the hole pulls it off-centre
+    assert np.allclose(centroids[3], [11 / 3, 11 / 3])  # zero area: mean of the vertices
+    assert np.allclose(centroids[5], [1, 2])  # unclosed ring
+
+
+def test_areas_and_bounds():
+    polygons = parse_polygons(WKTS)
+    assert np.isclose(polygons.areas()[2], 100 - 4) and np.isclose(polygons.areas()[5], 9)
+    assert np.allclose(polygons.bounds()[2], [0, 0, 10, 10]) and np.isnan(polygons.bounds()[1]).all()
+
+
+if __name__ == "__main__":
+    test_valid()
+    test_centroids()
+    test_areas_and_bounds()
+    print("✅ Centroids, areas and bounds (holes, degenerate, empty and malformed polygons)")